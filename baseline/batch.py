@@ -0,0 +1,163 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import argparse
+import csv
+import math
+import numpy
+
+from cost_analyzer import (INPUT_FILE_A, calculate_asp, calculate_assy_scrap, calculate_cost, calculate_gross_margin,
+                           calculate_gross_margin_percent, calculate_misc_cost, calculate_total_cost, calculate_total_unit_cost)
+from reader import calculate_row, meta_data_row
+from writer import write_batch_results
+
+# Columns of the scenario table, every other column overrides a value of the base file:
+#   <Column>       the metadata row
+#   <SN>:<Column>  the die with that SN
+#   *:<Column>     every die
+SCENARIO_COLUMN = 'Scenario'
+FILE_COLUMN = 'File'
+ALL_DIES = '*'
+
+# Columns which define the structure of a file, the same in all its scenarios, the counts
+# of the assembly and redundancy are integers as in the reader
+STRUCTURE_COLUMNS = ['SN', 'DeviceType', 'YieldModel', 'AssemblySteps', 'RecBaseline', 'RecSpares', 'RecArea']
+
+
+def to_float(value):
+    return float(value) if value else math.nan
+
+
+def read_base(fileName):
+    """Rows of a cost file and its numeric columns as (rows, 1) arrays, nan where a cell is empty."""
+    with open('inputs/' + fileName) as file:
+        rows = list(csv.DictReader(file))
+
+    columns = {}
+    for col in rows[0].keys():
+        if not col or col in STRUCTURE_COLUMNS:
+            continue
+        try:
+            columns[col] = numpy.array([[to_float(row[col])] for row in rows])
+        except ValueError:
+            # text column, not used by the model
+            continue
+    return rows, columns
+
+
+def read_scenarios(fileName):
+    with open('inputs/' + fileName) as file:
+        return list(csv.DictReader(file))
+
+
+def override_rows(rows, target):
+    # row indices of the target of an override column
+    if target is None:
+        return [0]
+    if target == ALL_DIES:
+        return [i for (i, row) in enumerate(rows) if not meta_data_row(row)]
+    indices = [i for (i, row) in enumerate(rows) if not meta_data_row(row) and row['SN'] == target]
+    if not indices:
+        raise Exception(f'No die with SN {target}')
+    return indices
+
+
+def apply_overrides(rows, columns, scenarios):
+    """Columns of the base file with the overrides of the `scenarios`.
+
+    Only the overridden columns are widened to (rows, scenarios) arrays, the
+    others keep broadcasting their (rows, 1) base values. An empty cell of the
+    scenario table keeps the base value.
+    """
+    columns = dict(columns)
+    for key in scenarios[0].keys():
+        if not key or key in [SCENARIO_COLUMN, FILE_COLUMN]:
+            continue
+        (target, col) = key.split(':', 1) if ':' in key else (None, key)
+        if col in STRUCTURE_COLUMNS:
+            raise Exception(f'Column {col} defines the structure of the file and cannot be overridden')
+        if col not in columns:
+            raise Exception(f'Column {col} does not exists!')
+
+        values = numpy.array([to_float(scenario[key]) for scenario in scenarios])
+        if numpy.all(numpy.isnan(values)):
+            continue
+        if columns[col].shape[1] != len(scenarios):
+            columns[col] = numpy.repeat(columns[col], len(scenarios), axis=1)
+        for i in override_rows(rows, target):
+            columns[col][i] = numpy.where(numpy.isnan(values), columns[col][i], values)
+    return columns
+
+
+def evaluate_scenarios(rows, columns, numOfYears):
+    """Total cost, total unit cost and gross margin of every scenario, a (scenarios,) array per year.
+
+    Every cell of the rows is the array of its column in all scenarios, so
+    readFile and the cost functions of cost_analyzer.main evaluate all
+    scenarios in one pass.
+    """
+    input = []
+    for (i, row) in enumerate(rows):
+        row = dict(row, **{col: values[i] for (col, values) in columns.items()})
+        input.append(calculate_row(input, row, numOfYears))
+
+    total_costs = calculate_total_cost(input, calculate_misc_cost(input, numOfYears), calculate_assy_scrap(input, numOfYears),
+                                       calculate_cost(input, 'MatCostYr', numOfYears), calculate_cost(input, 'QualityCostYr', numOfYears),
+                                       calculate_cost(input, 'OpCostYr', numOfYears), calculate_cost(input, 'TotalIpInterfaceCostYr', numOfYears),
+                                       calculate_cost(input, 'TestCostYr', numOfYears))
+    total_unit_costs = calculate_total_unit_cost(input, total_costs, numOfYears)
+    asps = calculate_asp(input, numOfYears)
+    gross_margins = calculate_gross_margin(total_unit_costs, asps)
+    results = {'total_costs': total_costs, 'total_unit_costs': total_unit_costs, 'gross_margins': gross_margins,
+               'gross_margin_percents': calculate_gross_margin_percent(gross_margins, asps)}
+
+    count = max(values.shape[1] for values in columns.values())
+    return {key: [numpy.broadcast_to(value, (count,)) for value in values] for (key, values) in results.items()}
+
+
+def run_batch(scenarioFile, numOfYears, baseFile=INPUT_FILE_A):
+    """Results of every scenario of the table, the scenarios of each base file are evaluated together."""
+    scenarios = read_scenarios(scenarioFile)
+    files = {}
+    for (i, scenario) in enumerate(scenarios):
+        files.setdefault(scenario.get(FILE_COLUMN) or baseFile, []).append(i)
+
+    results = [None] * len(scenarios)
+    for (fileName, indices) in files.items():
+        print(f'Evaluating {len(indices)} scenarios of {fileName}')
+        (rows, columns) = read_base(fileName)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            file_results = evaluate_scenarios(rows, apply_overrides(rows, columns, [scenarios[i] for i in indices]), numOfYears)
+        for (k, i) in enumerate(indices):
+            result = {'Scenario': scenarios[i].get(SCENARIO_COLUMN) or str(i + 1), 'File': fileName}
+            for year in range(1, numOfYears + 1):
+                result[f'TotalCostYr{year}($)'] = file_results['total_costs'][year - 1][k]
+                result[f'TotalUnitCostYr{year}($)'] = file_results['total_unit_costs'][year - 1][k]
+                result[f'GrossMarginYr{year}($)'] = file_results['gross_margins'][year - 1][k]
+                result[f'GrossMarginYr{year}(%)'] = file_results['gross_margin_percents'][year - 1][k]
+            results[i] = result
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Evaluate every scenario of a scenario table in one pass')
+    parser.add_argument('scenarios', help = 'Scenario table in the inputs folder, one scenario per row')
+    parser.add_argument('T', type = int, help = 'Total number of years of forecast')
+    parser.add_argument('--base', default = INPUT_FILE_A, help = 'Cost file of the scenarios without a File')
+    args = parser.parse_args()
+    results = run_batch(args.scenarios, args.T, args.base)
+    write_batch_results(results, args.T)
+    print(f'Completed the analysis of {len(results)} scenarios')
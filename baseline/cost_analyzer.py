@@ -15,11 +15,11 @@
  """
 
 import locale
-import numpy as numpy
+import numpy
 import argparse
 from matplotlib import pyplot as plt
 
-from reader import DEVICE_TYPE_SUBSTRATE, meta_data_row, readFile
+from reader import DEVICE_TYPE_SUBSTRATE, choose, given_or, meta_data_row, number, readFile
 from writer import write_to_file
 
 locale.setlocale(locale.LC_ALL, '')
@@ -43,13 +43,12 @@ def calculate_assy_scrap(input, numberOfYears = 5):
     for i in range(1, numOfAssemblySteps + 1):
         assy_col = f'AssemblySeq{i}'
         # only the assembly sequence with dimension should be considered
-        assy_i = list(map(lambda row: int(row[assy_col]) if float(row['DimensionX']) > 0 and float(row['DimensionY']) > 0 else 0, filter_metadata_row(input)))
+        assy_i = list(map(lambda row: choose((number(row['DimensionX']) > 0) & (number(row['DimensionY']) > 0), lambda: number(row[assy_col], type=int), lambda: 0), filter_metadata_row(input)))
         assy.append(assy_i)
 
         # assy and assy_per_step_yield should have same column numbers
         # if assy_yield is provided, then do not calculate it
-        input_assy_yield = input[0][f'AssyYield{i}']
-        assy_yield_i = float(input_assy_yield) if input_assy_yield else float(input[0][f'AssyPerStepYield{i}']) ** sum(assy_i)
+        assy_yield_i = given_or(input[0][f'AssyYield{i}'], lambda: number(input[0][f'AssyPerStepYield{i}']) ** sum(assy_i))
         assy_yield.append(assy_yield_i)
 
     assy_scraps = []
@@ -62,7 +61,7 @@ def calculate_assy_scrap(input, numberOfYears = 5):
         for j in range(0, assy_len):
             assy_j = assy[j]
             assy_yield_j = assy_yield[j]
-            assy_scrap += numpy.dot(mat_cost, assy_j) * (1 - assy_yield_j)
+            assy_scrap += sum(cost * assy for (cost, assy) in zip(mat_cost, assy_j)) * (1 - assy_yield_j)
 
         assy_scraps.append(assy_scrap)
 
@@ -71,13 +70,13 @@ def calculate_assy_scrap(input, numberOfYears = 5):
 
 def calculate_nre(input, numOfYrs):
     nre = [0] * numOfYrs
-    nre[0] = sum(list(map(lambda input: float(input['NRE($)'] or '0'), input)))
+    nre[0] = sum(list(map(lambda input: number(input['NRE($)'], 0), input)))
     return nre
 
 
 def calculate_total_mask_set_cost(input, numOfYears):
     mask_costs = [0] * numOfYears
-    mask_costs[0] = sum(list(map(lambda input: float(input['MaskSetCost'] or '0'), input)))
+    mask_costs[0] = sum(list(map(lambda input: number(input['MaskSetCost'], 0), input)))
     return mask_costs
 
 
@@ -95,8 +94,8 @@ def calculate_misc_cost(input, numberOfYears = 5):
     misc_costs = []
     substrate_row = list(filter(lambda row: row['DeviceType'] == DEVICE_TYPE_SUBSTRATE, input))[0]
     for year in range (1, numberOfYears + 1):
-        package_assy_cost = float(input[0][f'PackageAssemblyCostYr{year}($)'] or '0')
-        forecast_demand = int(substrate_row[f'ForecastDemandYr{year}'])
+        package_assy_cost = number(input[0][f'PackageAssemblyCostYr{year}($)'], 0)
+        forecast_demand = number(substrate_row[f'ForecastDemandYr{year}'], type=int)
         misc_cost = package_assy_cost * forecast_demand
         misc_costs.append(misc_cost)
 
@@ -114,11 +113,11 @@ def calculate_total_cost(input, misc_costs, assy_scraps, total_mat_costs, total_
     for i in range(0, years):
         # calculate substrate cost
         yield_adjusted_fup = substrate_row[f'ForecastUnitPriceYr{i + 1}($)']
-        subs_demand = int(substrate_row[f'ForecastDemandYr{i + 1}'])
+        subs_demand = number(substrate_row[f'ForecastDemandYr{i + 1}'], type=int)
         subs_cost = yield_adjusted_fup * subs_demand
 
-        fpty = float(input[0][f'FinalPackageTestYieldYr{i + 1}'])
-        slt = float(input[0][f'SLTYieldYr{i + 1}'])
+        fpty = number(input[0][f'FinalPackageTestYieldYr{i + 1}'])
+        slt = number(input[0][f'SLTYieldYr{i + 1}'])
    
         total_cost = misc_costs[i] + test_costs[i] + total_mask_cost[i] + total_nre[i] + assy_scraps[i] + (1 + (1 - fpty) + (1 - slt) * fpty) * (total_mat_costs[i] + subs_cost) + total_op_costs[i] + total_ip_costs[i] + total_quality_costs[i]
         total_costs.append(total_cost)
@@ -152,7 +151,7 @@ def calculate_total_unit_cost(input, total_cost, numOfYrs):
     total_unit_costs = []
 
     for year in range(1, numOfYrs + 1):
-        total_unit_costs.append(total_cost[year - 1]/ int(input[1][f'ForecastDemandYr{year}']))
+        total_unit_costs.append(total_cost[year - 1]/ number(input[1][f'ForecastDemandYr{year}'], type=int))
 
     return total_unit_costs
 
@@ -196,7 +195,7 @@ def calculate_asp(input, numOfYears):
     asps = []
     for year in range(1, numOfYears + 1):
         aspCol = f'AspYr{year}($)'
-        asps.append(float(input[0][aspCol]))
+        asps.append(number(input[0][aspCol]))
 
     return asps
 
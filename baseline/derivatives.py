@@ -0,0 +1,176 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import argparse
+import numpy
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+from batch import evaluate_scenarios, read_base
+from cost_analyzer import INPUT_FILE_A, INPUT_FILE_B
+from reader import meta_data_row
+from writer import write_derivatives
+
+# Functions of the values only, constant between their steps, their derivative is 0
+CONSTANT_UFUNCS = [numpy.isnan, numpy.equal, numpy.not_equal, numpy.less, numpy.less_equal, numpy.greater,
+                   numpy.greater_equal, numpy.logical_and, numpy.logical_or, numpy.logical_not, numpy.invert,
+                   numpy.bitwise_and, numpy.bitwise_or, numpy.trunc, numpy.floor, numpy.ceil, numpy.rint, numpy.sign]
+
+
+class Dual(NDArrayOperatorsMixin):
+    """Array of values with their derivatives with respect to a set of inputs (forward mode).
+
+    The derivative has a leading axis of the inputs followed by the shape of
+    the value. NumPy arithmetic, ufuncs and numpy.where/sum/broadcast_to/round
+    propagate both, so the vectorized model of batch.py evaluates the values
+    and all derivatives in one pass.
+    """
+
+    def __init__(self, value, derivative):
+        self.value = numpy.asarray(value, dtype=float)
+        self.derivative = derivative
+
+    @property
+    def shape(self):
+        return self.value.shape
+
+    def __getitem__(self, index):
+        index = index if isinstance(index, tuple) else (index,)
+        return Dual(self.value[index], self.derivative[(slice(None),) + index])
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        # the in-place operators return a new Dual as the immutable numbers do
+        if isinstance(kwargs.get('out'), tuple) and all(isinstance(x, Dual) for x in kwargs['out']):
+            kwargs.pop('out')
+        if method != '__call__' or kwargs:
+            return NotImplemented
+        values = [x.value if isinstance(x, Dual) else numpy.asarray(x) for x in inputs]
+        if ufunc in CONSTANT_UFUNCS:
+            return ufunc(*values)
+
+        value = ufunc(*values)
+        ndim = numpy.ndim(value)
+        derivatives = [aligned_derivative(x, ndim) for x in inputs]
+        if ufunc is numpy.negative:
+            derivative = -derivatives[0]
+        elif ufunc is numpy.exp:
+            derivative = scaled(value, derivatives[0])
+        elif ufunc is numpy.sqrt:
+            derivative = scaled(0.5 / value, derivatives[0])
+        elif ufunc is numpy.log:
+            derivative = scaled(1 / values[0], derivatives[0])
+        elif ufunc is numpy.add:
+            derivative = derivatives[0] + derivatives[1]
+        elif ufunc is numpy.subtract:
+            derivative = derivatives[0] - derivatives[1]
+        elif ufunc is numpy.multiply:
+            derivative = scaled(values[1], derivatives[0]) + scaled(values[0], derivatives[1])
+        elif ufunc is numpy.true_divide:
+            derivative = scaled(1 / values[1], derivatives[0]) - scaled(value / values[1], derivatives[1])
+        elif ufunc is numpy.power:
+            (x, y) = values
+            derivative = scaled(numpy.where(y == 0, 0, y * x ** (y - 1)), derivatives[0]) + scaled(value * numpy.log(x), derivatives[1])
+        else:
+            return NotImplemented
+        return Dual(value, numpy.broadcast_to(derivative, (self.derivative.shape[0],) + numpy.shape(value)))
+
+    def __array_function__(self, func, types, args, kwargs):
+        if func is numpy.where:
+            (condition, x, y) = args
+            value = numpy.where(condition, value_of(x), value_of(y))
+            ndim = numpy.ndim(value)
+            derivative = numpy.where(condition, aligned_derivative(x, ndim), aligned_derivative(y, ndim))
+            return Dual(value, numpy.broadcast_to(derivative, (self.derivative.shape[0],) + value.shape))
+        if func is numpy.sum:
+            axis = kwargs.get('axis', args[1] if len(args) > 1 else None)
+            if axis is None:
+                return Dual(self.value.sum(), self.derivative.reshape(self.derivative.shape[0], -1).sum(axis=1))
+            return Dual(self.value.sum(axis=axis), self.derivative.sum(axis=axis % self.value.ndim + 1))
+        if func is numpy.broadcast_to:
+            shape = tuple(args[1] if len(args) > 1 else kwargs['shape'])
+            return Dual(numpy.broadcast_to(self.value, shape),
+                        numpy.broadcast_to(aligned_derivative(self, len(shape)), (self.derivative.shape[0],) + shape))
+        if func in [numpy.round, numpy.around]:
+            return func(self.value, *args[1:], **kwargs)
+        return NotImplemented
+
+
+def value_of(x):
+    return x.value if isinstance(x, Dual) else x
+
+
+def aligned_derivative(x, ndim):
+    # derivative of x broadcastable against the derivative of a result of ndim dimensions, 0 for a constant
+    if not isinstance(x, Dual):
+        return 0
+    return x.derivative.reshape(x.derivative.shape[:1] + (1,) * (ndim - x.value.ndim) + x.value.shape)
+
+
+def scaled(factor, derivative):
+    # chain rule term, 0 where the derivative is 0 even if the factor is infinite or nan
+    if numpy.ndim(derivative) == 0 and derivative == 0:
+        return 0
+    return numpy.where(derivative == 0, 0, factor * derivative)
+
+
+def seed_inputs(rows, columns):
+    """The columns with a derivative for every non empty numeric cell of the dies.
+
+    Returns the columns and the (row index, column) of every input, in the
+    order of the derivative axis. Columns without an input stay arrays.
+    """
+    inputs = [(i, col) for col in columns for i in range(0, len(rows))
+              if not meta_data_row(rows[i]) and not numpy.isnan(columns[col][i, 0])]
+    seeded = {}
+    for (k, (i, col)) in enumerate(inputs):
+        if col not in seeded:
+            seeded[col] = Dual(columns[col], numpy.zeros((len(inputs),) + columns[col].shape))
+        seeded[col].derivative[k, i] = 1
+    return dict(columns, **seeded), inputs
+
+
+def calculate_derivatives(fileName, numOfYears):
+    """Derivative and elasticity of the total unit cost of every year with respect to every input of every die.
+
+    All derivatives come from one evaluation of the model, elasticity is the
+    relative change of the unit cost per relative change of the input.
+    """
+    (rows, columns) = read_base(fileName)
+    (columns, inputs) = seed_inputs(rows, columns)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        unit_costs = evaluate_scenarios(rows, columns, numOfYears)['total_unit_costs']
+
+    derivatives = []
+    for (k, (i, col)) in enumerate(inputs):
+        value = columns[col].value[i, 0]
+        row = {'File': fileName, 'SN': rows[i]['SN'], 'Column': col, 'Value': value}
+        for year in range(1, numOfYears + 1):
+            unit_cost = unit_costs[year - 1]
+            row[f'DerivativeYr{year}'] = unit_cost.derivative[k, 0]
+            row[f'ElasticityYr{year}'] = unit_cost.derivative[k, 0] * value / unit_cost.value[0]
+        derivatives.append(row)
+    return derivatives
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local sensitivities of the total unit cost to every input of every die')
+    parser.add_argument('T', type = int, help = 'Total number of years of forecast')
+    parser.add_argument('--files', nargs = '+', default = [INPUT_FILE_A, INPUT_FILE_B], help = 'Cost files in the inputs folder')
+    args = parser.parse_args()
+    derivatives = []
+    for fileName in args.files:
+        derivatives += calculate_derivatives(fileName, args.T)
+    write_derivatives(derivatives, args.T)
+    print(f'Completed the derivatives of {len(derivatives)} inputs')
@@ -0,0 +1,92 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from batch import run_batch
+from cost_analyzer import (calculate_assy_scrap, calculate_cost, calculate_misc_cost, calculate_total_cost,
+                           calculate_total_unit_cost)
+from reader import readFile
+
+YEARS = 5
+
+
+def total_unit_costs(fileName):
+    input = readFile(fileName, YEARS)
+    total_costs = calculate_total_cost(input, calculate_misc_cost(input, YEARS), calculate_assy_scrap(input, YEARS),
+                                       calculate_cost(input, 'MatCostYr', YEARS), calculate_cost(input, 'QualityCostYr', YEARS),
+                                       calculate_cost(input, 'OpCostYr', YEARS), calculate_cost(input, 'TotalIpInterfaceCostYr', YEARS),
+                                       calculate_cost(input, 'TestCostYr', YEARS))
+    return calculate_total_unit_cost(input, total_costs, YEARS)
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        # the inputs folder with a copy of the cost files
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(self.cwd, 'inputs'), os.path.join(self.directory, 'inputs'))
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def write_csv(self, fileName, rows):
+        with open('inputs/' + fileName, 'w') as file:
+            writer = csv.DictWriter(file, rows[0].keys())
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def test_scenarios_match_analysis(self):
+        # unit prices computed from the wafer prices and yields
+        with open('inputs/chiplet_cost1.csv') as file:
+            rows = list(csv.DictReader(file))
+        for row in rows[1:]:
+            for year in range(1, YEARS + 1):
+                row[f'ForecastUnitPriceYr{year}($)'] = ''
+        self.write_csv('computed.csv', rows)
+        # and a copy with the overrides of the scenario
+        rows[2]['WaferPriceYr1($)'] = '20000'
+        rows[0]['AspYr3($)'] = '1200'
+        for row in rows[1:]:
+            row['ForecastDemandYr1'] = '50000'
+        self.write_csv('modified.csv', rows)
+
+        self.write_csv('scenarios.csv', [
+            {'Scenario': 'computed', 'File': '', '1:WaferPriceYr1($)': '', 'AspYr3($)': '', '*:ForecastDemandYr1': ''},
+            {'Scenario': 'option2', 'File': 'chiplet_cost2.csv', '1:WaferPriceYr1($)': '', 'AspYr3($)': '', '*:ForecastDemandYr1': ''},
+            {'Scenario': 'modified', 'File': '', '1:WaferPriceYr1($)': '20000', 'AspYr3($)': '1200', '*:ForecastDemandYr1': '50000'}
+        ])
+        results = run_batch('scenarios.csv', YEARS, 'computed.csv')
+
+        self.assertEqual(['computed', 'option2', 'modified'], [result['Scenario'] for result in results])
+        for (result, fileName) in zip(results, ['computed.csv', 'chiplet_cost2.csv', 'modified.csv']):
+            expected = total_unit_costs(fileName)
+            numpy.testing.assert_allclose([result[f'TotalUnitCostYr{year}($)'] for year in range(1, YEARS + 1)], expected, rtol=1e-12)
+        self.assertAlmostEqual(1000 - results[0]['TotalUnitCostYr3($)'], results[0]['GrossMarginYr3($)'])
+        self.assertAlmostEqual(1200 - results[2]['TotalUnitCostYr3($)'], results[2]['GrossMarginYr3($)'])
+        self.assertNotAlmostEqual(results[0]['TotalUnitCostYr1($)'], results[2]['TotalUnitCostYr1($)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import unittest
+
+import numpy
+
+from batch import apply_overrides, evaluate_scenarios, read_base
+from derivatives import Dual, calculate_derivatives, seed_inputs
+
+YEARS = 5
+
+
+class TestDerivatives(unittest.TestCase):
+    def test_dual_arithmetic(self):
+        x = Dual([2.0, 3.0], numpy.eye(2))
+        y = numpy.where([True, False], x ** 2 / x + numpy.exp(x), numpy.sqrt(x) * 4)
+
+        numpy.testing.assert_allclose(y.value, [2 + numpy.exp(2), 4 * numpy.sqrt(3)])
+        numpy.testing.assert_allclose(y.derivative, [[1 + numpy.exp(2), 0], [0, 2 / numpy.sqrt(3)]])
+        self.assertAlmostEqual(numpy.sum(y).derivative[1], 2 / numpy.sqrt(3))
+
+    def test_derivatives_match_finite_differences(self):
+        (rows, columns) = read_base('chiplet_cost1.csv')
+        # unit prices computed from the wafer prices and yields
+        for year in range(1, YEARS + 1):
+            columns[f'ForecastUnitPriceYr{year}($)'] = numpy.where(numpy.arange(len(rows))[:, None] > 0, numpy.nan,
+                                                                  columns[f'ForecastUnitPriceYr{year}($)'])
+        (seeded, inputs) = seed_inputs(rows, columns)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            unit_costs = evaluate_scenarios(rows, seeded, YEARS)['total_unit_costs']
+
+        for (sn, col) in [('1', 'WaferPriceYr1($)'), ('1', 'WaferPriceAnnualDiscountFactor(%)'), ('2', 'DefectDensityYr3(Defects/cm^2)'),
+                          ('0', 'ForecastDemandYr2'), ('3', 'OperatingUnitCostYr4($)'), ('1', 'N')]:
+            k = inputs.index((int(sn) + 1, col))
+            value = float(columns[col][int(sn) + 1, 0])
+            step = abs(value) * 1e-4
+            scenarios = [{f'{sn}:{col}': str(value + step)}, {f'{sn}:{col}': str(value - step)}]
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                shifted = evaluate_scenarios(rows, apply_overrides(rows, columns, scenarios), YEARS)['total_unit_costs']
+            for year in range(1, YEARS + 1):
+                expected = (shifted[year - 1][0] - shifted[year - 1][1]) / (2 * step)
+                self.assertAlmostEqual(expected, unit_costs[year - 1].derivative[k, 0], delta=1e-3 * abs(expected) + 1e-9)
+
+    def test_elasticities(self):
+        derivatives = calculate_derivatives('chiplet_cost1.csv', YEARS)
+
+        # the unit cost is the total cost over the demand of the package
+        demand = [row for row in derivatives if row['SN'] == '0' and row['Column'] == 'ForecastDemandYr1'][0]
+        self.assertLess(demand['ElasticityYr1'], 0)
+        self.assertEqual(0, demand['DerivativeYr2'])
+        nre = [row for row in derivatives if row['SN'] == '1' and row['Column'] == 'NRE($)'][0]
+        self.assertAlmostEqual(1 / 100000, nre['DerivativeYr1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
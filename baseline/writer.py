@@ -32,3 +32,31 @@ def write_to_file(summary, numOfYears):
         writer = csv.DictWriter(file, field_names)
         writer.writeheader()
         writer.writerows(summary)
+
+
+def write_batch_results(results, numOfYears):
+    with open('outputs/batch_output.csv', 'w') as file:
+
+        field_names = ['Scenario', 'File']
+
+        for name in ['TotalCostYr{}($)', 'TotalUnitCostYr{}($)', 'GrossMarginYr{}($)', 'GrossMarginYr{}(%)']:
+            for year in range(1, numOfYears + 1):
+                field_names.append(name.format(year))
+
+        writer = csv.DictWriter(file, field_names)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def write_derivatives(derivatives, numOfYears):
+    with open('outputs/derivatives_output.csv', 'w') as file:
+
+        field_names = ['File', 'SN', 'Column', 'Value']
+
+        for name in ['DerivativeYr{}', 'ElasticityYr{}']:
+            for year in range(1, numOfYears + 1):
+                field_names.append(name.format(year))
+
+        writer = csv.DictWriter(file, field_names)
+        writer.writeheader()
+        writer.writerows(derivatives)
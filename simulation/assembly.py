@@ -0,0 +1,86 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import csv
+
+import numpy as np
+from distributions import compile_value
+
+# Assembly tree input columns, Dies is a space separated list of SN
+TREE_NODE = 'Node'
+TREE_PARENT = 'Parent'
+TREE_YIELD = 'Yield'
+TREE_DIES = 'Dies'
+
+
+class AssemblyTree(object):
+    """Multi-level assembly, e.g. dies stacked on an interposer on a substrate.
+
+    Every node is a bond step with a yield, which bonds its own dies and the
+    sub-assemblies of its child nodes. A failure at a node scraps every die
+    below it, so the tree is compiled into a closure incidence matrix
+    (nodes x dies) used like the incidence matrix of the flat assembly
+    sequence. Node yields are constants, they can't be ranged.
+    """
+
+    def __init__(self, records):
+        self.nodes = [record[TREE_NODE] for record in records]
+        self.parents = [record[TREE_PARENT] or None for record in records]
+        self.yields = [compile_value(record[TREE_YIELD]) for record in records]
+        self.dies = [(record[TREE_DIES] or '').split() for record in records]
+
+        index = {node: n for (n, node) in enumerate(self.nodes)}
+        if len(index) != len(self.nodes):
+            raise Exception(f'Assembly tree nodes should be unique: {self.nodes}')
+        for (record, node, parent, node_yield) in zip(records, self.nodes, self.parents, self.yields):
+            if parent is not None and parent not in index:
+                raise Exception(f'Unknown parent {parent} of assembly tree node {node}')
+            if not isinstance(node_yield, float):
+                # the sampling plan only draws the cells of the input rows, a tree yield could not be correlated nor analysed
+                raise Exception(f"Yield of assembly tree node {node} should be a number, ranged assembly tree yields "
+                                f"are not supported: {record[TREE_YIELD]}")
+
+        # closure[n, m] is 1 if node m is in the sub-tree of node n (itself included)
+        self.closure = np.identity(len(self.nodes))
+        for m in range(0, len(self.nodes)):
+            visited = {m}
+            parent = self.parents[m]
+            while parent is not None:
+                n = index[parent]
+                if n in visited:
+                    raise Exception(f'Assembly tree has a cycle through node {parent}')
+                visited.add(n)
+                self.closure[n, m] = 1
+                parent = self.parents[n]
+
+    def incidence(self, sns):
+        """Closure incidence matrix (nodes x dies in the order of `sns`) and the node yields."""
+        column = {sn: k for (k, sn) in enumerate(sns)}
+        bonded = np.zeros((len(self.nodes), len(sns)))
+        for (n, dies) in enumerate(self.dies):
+            for sn in dies:
+                if sn not in column:
+                    raise Exception(f'Unknown die SN {sn} in assembly tree node {self.nodes[n]}')
+                bonded[n, column[sn]] = 1
+
+        if np.any(bonded.sum(axis=0) > 1):
+            raise Exception('Every die should be bonded by a single assembly tree node')
+        return self.closure @ bonded, list(self.yields)
+
+
+def read_assembly_tree(fileName):
+    with open('inputs/' + fileName) as file:
+        return AssemblyTree(list(csv.DictReader(file)))
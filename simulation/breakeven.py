@@ -0,0 +1,156 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import numpy as np
+
+from distributions import is_distribution
+from preprocessor import is_constant_column
+from processor import calculate_summary
+from reader import year_column
+from sampling import SamplingPlan
+from scenario import as_scenario
+from sensitivity import OPTION_NAMES
+
+# Default input of the break-even solver, the demand of every die and the package
+BREAK_EVEN_COLUMN = 'ForecastDemand'
+# The break-even scale of the input is searched in [1 / BREAK_EVEN_BRACKET, BREAK_EVEN_BRACKET]
+BREAK_EVEN_BRACKET = 100.0
+# Tolerance on the log of the scale, and the maximum number of root finding iterations
+BREAK_EVEN_TOLERANCE = 1e-6
+BREAK_EVEN_MAX_ITERATIONS = 60
+
+
+def break_even_column(read, attribute, year):
+    # 'ForecastDemand' is 'ForecastDemandYr2' in year 2, columns without a year apply to every year
+    col = year_column(attribute, year)
+    if col in read[0]:
+        return col
+    if attribute in read[0]:
+        return attribute
+    raise Exception(f'Unknown break-even input: {attribute}')
+
+
+def draw_samples(read, plan, n, rng):
+    # sampled value of every cell, (1, n) samples for the ranged cells, numbers for the other cells
+    z = rng.standard_normal((len(plan), 1, n))
+    if plan.cholesky is not None:
+        z = np.tensordot(plan.cholesky, z, axes=1)
+    return plan.samples(z)
+
+
+def scaled_cells(read, draws, col):
+    """{row index: sampled value} of the non zero cells of `col` below the metadata row."""
+    cells = {}
+    for i in range(1, len(read)):
+        value = draws.get((i, col), read[i].get(col))
+        if is_distribution(value) or value is None or isinstance(value, str):
+            continue
+        if np.any(value != 0):
+            cells[i] = value
+    return cells
+
+
+def evaluate_unit_cost(read, draws, cells, col, scale, year, model=None):
+    """Unit cost of `year` for every sample, with the cells of `col` scaled by `scale` (n,).
+
+    The costs of a year don't depend on the later years, only the years up
+    to `year` are evaluated.
+    """
+    n = len(scale)
+    changes = dict(draws)
+    for (i, value) in cells.items():
+        changes[(i, col)] = value * scale.reshape(1, n)
+    summary = calculate_summary(as_scenario(read).overlay(changes).rows(), dict(model or {}, years=year, steps=1, simulations=n))
+    return np.broadcast_to(summary['total_unit_cost_arr'][year - 1], (1, n))[0]
+
+
+def solve_break_even(f, low, high, tolerance=BREAK_EVEN_TOLERANCE, max_iterations=BREAK_EVEN_MAX_ITERATIONS):
+    """Root of f in [low, high] for every sample at once, by the Illinois method.
+
+    `f` maps an array of n points to the n values of the samples, each sample
+    has its own point so one call advances all n searches. Returns (roots,
+    found), the root of a sample without a sign change in the bracket is nan.
+    """
+    a = np.asarray(low, dtype=float)
+    b = np.asarray(high, dtype=float)
+    fa = f(a)
+    fb = f(b)
+    found = np.sign(fa) * np.sign(fb) <= 0
+
+    for iteration in range(0, max_iterations):
+        if np.all(((np.abs(b - a) < tolerance) | (fb == 0))[found]):
+            break
+        # secant point, bisection where both values are equal
+        c = np.where(fb != fa, b - fb * (b - a) / np.where(fb != fa, fb - fa, 1), 0.5 * (a + b))
+        c = np.where(found, c, b)
+        fc = f(c)
+        # keep the bracket [a, b] around the root, halve the retained end point value (Illinois)
+        crossed = np.sign(fc) * np.sign(fb) < 0
+        a, fa = np.where(crossed, b, a), np.where(crossed, fb, 0.5 * fa)
+        b, fb = c, fc
+
+    roots = np.where(fb == 0, b, np.where(fa == 0, a, 0.5 * (a + b)))
+    return np.where(found, roots, np.nan), found
+
+
+def calculate_break_even(readA, readB, years, attribute=BREAK_EVEN_COLUMN, options=(0, 1), n=1000, correlations=None,
+                         bracket=BREAK_EVEN_BRACKET, rng=None, model=None):
+    """Distribution of the value of an input at which both options cost the same per unit.
+
+    For every sample of the ranged inputs the cells of `attribute` (e.g.
+    'ForecastDemand' or 'WaferPrice($)') of the given `options` are scaled by
+    a common factor until CostDiffYr{n} is 0, all samples are solved at once.
+    The break-even value of an option in a sample is that factor times the
+    sampled value of its first scaled cell (the row with the lowest index,
+    e.g. the substrate for the package volume).
+
+    Returns a list per year and scaled option of {'name', 'option', 'sn',
+    'values', 'scales', 'found'} with the break-even value of the cell of
+    row `sn` and the scale of every sample (nan if the costs don't cross
+    within the bracket of scales) and the fraction found.
+    """
+    rng = rng or np.random.default_rng()
+    reads = [readA, readB]
+    plans = [SamplingPlan(read, years, correlations) for read in reads]
+    n = n if any(len(plan) > 0 for plan in plans) else 1
+    draws = [draw_samples(read, plan, n, rng) for (read, plan) in zip(reads, plans)]
+
+    results = []
+    for year in range(1, years + 1):
+        cols = [break_even_column(read, attribute, year) for read in reads]
+        if any(is_constant_column(col) for col in cols):
+            raise Exception(f'The break-even input {attribute} defines the structure and cannot be scaled')
+        cells = [scaled_cells(read, option_draws, col) if option in options else {}
+                 for (option, (read, option_draws, col)) in enumerate(zip(reads, draws, cols))]
+        # the unit cost of an option without scaled cells stays the same
+        fixed = [evaluate_unit_cost(read, option_draws, {}, col, np.ones(n), year, model) if not cells[option] else None
+                 for (option, (read, option_draws, col)) in enumerate(zip(reads, draws, cols))]
+
+        def cost_diff(log_scale):
+            unit_costs = [fixed[option] if fixed[option] is not None else
+                          evaluate_unit_cost(reads[option], draws[option], cells[option], cols[option], np.exp(log_scale), year, model)
+                          for option in range(0, 2)]
+            return unit_costs[1] - unit_costs[0]
+
+        log_scales, found = solve_break_even(cost_diff, np.full(n, -np.log(bracket)), np.full(n, np.log(bracket)))
+        scales = np.exp(log_scales)
+        for option in options:
+            if not cells[option]:
+                continue
+            i = min(cells[option])
+            results.append({'name': cols[option], 'option': OPTION_NAMES[option], 'sn': reads[option][i]['SN'],
+                            'values': scales * np.broadcast_to(cells[option][i], (1, n))[0], 'scales': scales, 'found': np.mean(found)})
+    return results
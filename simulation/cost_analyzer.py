@@ -16,7 +16,14 @@
  limitations under the License.
  """
 
+import argparse
+import hashlib
 import locale
+import os
+import signal
+import threading
+import uuid
+from datetime import datetime, timezone
 from re import S
 import numpy as np
 import pandas as pd
@@ -24,11 +31,21 @@ import seaborn as sns
 import time
 import multiprocessing as mp
 
-from reader import readFile
-from preprocessor import simulation, validate
+from breakeven import BREAK_EVEN_COLUMN, calculate_break_even
+from distributions import is_distribution
+from distributed import AUTHKEY_ENV, Coordinator, calculate_distributed_summaries, parse_address, start_local_workers
+from engine import DEFAULT_BATCH_SIZE, Checkpoint, calculate_batched_summaries
+from gdpw import GDPW_APPROXIMATE, GDPW_CACHE_FILE, GDPW_METHODS
+from reader import assembly_tree_files, readFile
+from preprocessor import model_options, simulation, validate
 from plotter import plot_df, plot_graph, plot_tornado
-from processor import calculate_summary, find_x_mean, find_xy_mean, write_summary
-from copy import deepcopy
+from processor import calculate_summary, calculate_unit_cost_diff, create_summary, find_unit_cost_diff_distribution, find_x_mean, find_xy_mean, write_summary
+from samples import MANIFEST_FILE, load_samples, sampled, save_samples
+from scenario import Scenario
+from sensitivity import calculate_sobol_indices, estimate_tornado_input, find_ranged_cells
+from tail_risk import estimate_tail_risk
+from writer import RESULT_FORMATS, tidy_distributions, tidy_sobol_indices, tidy_summary, tidy_tornado, write_results, write_sobol_indices
+from writer import OUTPUT_DIRECTORY, output_path, set_output_directory, write_break_even, write_tail_risk
 
 sns.set_style('whitegrid')
 locale.setlocale(locale.LC_ALL, '')
@@ -37,22 +54,33 @@ INPUT_FILE_A = 'data_option1.csv'
 INPUT_FILE_B = 'data_option2.csv'
 TEMPLATE_FILE = 'input_template.csv'
 PARAMS_INPUT_FILE = "params.csv"
+TORNADO_COLUMNS = ['ForecastDemand{year}', 'Asp{year}($)', 'WaferYield{year}', 'WaferPrice{year}($)', 'DefectDensity{year}(Defects/cm^2)']
+CORRELATIONS_INPUT_FILE = "correlations.csv"
+# Run metadata hashing the inputs of the model, the results of seeded runs with the same hashes are the same
+INPUT_HASHES = ['option1_sha256', 'option2_sha256', 'option1_assembly_sha256', 'option2_assembly_sha256', 'correlations_sha256']
 
 
 def take_read(read, col, years, type):
-    def map_val(val):
-        if "-" not in val:
-            return val
-        first, second = val.split("-")
-        return first if type == 'High' else second
-
-    def map_row(row):
+    # overlay of the scenario, only the stochastic cells of the column are recorded
+    changes = {}
+    for (i, row) in enumerate(read):
         for year in range(1, years + 1):
             colName = col.replace("{year}", f'Yr{year}')
-            row[colName] = map_val(row[colName])
-        return row
+            val = row[colName]
+            if is_distribution(val):
+                first, second = val.bounds
+                changes[(i, colName)] = first if type == 'High' else second
+
+    return read.overlay(changes)
 
-    return list(map(lambda row: map_row(row), read))
+
+def tornado_columns(readA, readB, years):
+    # the usual columns first, then any other stochastic column e.g. a test cell rate
+    cols = list(TORNADO_COLUMNS)
+    for (_, template, _) in find_ranged_cells(readA, years) + find_ranged_cells(readB, years):
+        if template not in cols:
+            cols.append(template)
+    return cols
 
 
 def create_tornado_input(readA, readB, summaryA, summaryB, years, cols, args):
@@ -61,55 +89,26 @@ def create_tornado_input(readA, readB, summaryA, summaryB, years, cols, args):
         tornado_input.append([])
 
     for col in cols:
-        inputA_fd_high = take_read(deepcopy(readA), col, years, 'High')
-        inputA_fd_low = take_read(deepcopy(readA), col, years, 'Low')
-        summaryA_fd_high = calculate_summary(inputA_fd_high, args)
-        summaryA_fd_low = calculate_summary(inputA_fd_low, args)
-        total_ucd_high = find_xy_mean(np.array(summaryA_fd_high['total_unit_cost_arr']) - np.array(summaryB['total_unit_cost_arr']))
-        total_ucd_low = find_xy_mean(np.array(summaryA_fd_low['total_unit_cost_arr']) - np.array(summaryB['total_unit_cost_arr']))
+        inputA_fd_high = take_read(readA, col, years, 'High')
+        inputA_fd_low = take_read(readA, col, years, 'Low')
+        summaryA_fd_high = calculate_summary(inputA_fd_high.rows(), args)
+        summaryA_fd_low = calculate_summary(inputA_fd_low.rows(), args)
+        total_ucd_high = find_xy_mean(calculate_unit_cost_diff(summaryB, summaryA_fd_high))
+        total_ucd_low = find_xy_mean(calculate_unit_cost_diff(summaryB, summaryA_fd_low))
         for year in range(0, years):
             tornado_input[year].append({'name': f'Option1 {col}', 'high': total_ucd_high[year], 'low': total_ucd_low[year]})
         
-        inputB_fd_high = take_read(deepcopy(readB), col, years, 'High')
-        inputB_fd_low = take_read(deepcopy(readB), col, years, 'Low')
-        summaryB_fd_high = calculate_summary(inputB_fd_high, args)
-        summaryB_fd_low = calculate_summary(inputB_fd_low, args)
-        total_ucd_high = find_xy_mean(np.array(summaryA['total_unit_cost_arr']) - np.array(summaryB_fd_high['total_unit_cost_arr']))
-        total_ucd_low = find_xy_mean(np.array(summaryA['total_unit_cost_arr']) - np.array(summaryB_fd_low['total_unit_cost_arr']))
+        inputB_fd_high = take_read(readB, col, years, 'High')
+        inputB_fd_low = take_read(readB, col, years, 'Low')
+        summaryB_fd_high = calculate_summary(inputB_fd_high.rows(), args)
+        summaryB_fd_low = calculate_summary(inputB_fd_low.rows(), args)
+        total_ucd_high = find_xy_mean(calculate_unit_cost_diff(summaryB_fd_high, summaryA))
+        total_ucd_low = find_xy_mean(calculate_unit_cost_diff(summaryB_fd_low, summaryA))
         for year in range(0, years):
             tornado_input[year].append({'name': f'Option2 {col}', 'high': total_ucd_high[year], 'low': total_ucd_low[year]})
     return tornado_input
 
-def main():
-    print('Starting to read ' + INPUT_FILE_A)
-    readA = readFile(INPUT_FILE_A)
-    print('Completead reading ' + INPUT_FILE_A)
-    print('################')
-
-    print('Starting to read ' + INPUT_FILE_B)
-    readB = readFile(INPUT_FILE_B)
-    print('Completead reading ' + INPUT_FILE_B)
-
-    print('Validating inputs against template...')
-    params = readFile(PARAMS_INPUT_FILE)
-    years = int(params[0]['NumOfYears'])
-
-    print('Total Number of years for forecast: ', years)
-
-    template = readFile(TEMPLATE_FILE)
-    validate(readA, template, years)
-    validate(readB, template, years)
-
-    print('Running analysis...')
-
-    start = time.time()
-
-    # plot sensitivity graph if current run requires simulation
-    requires_simulation = simulation(readA, years) or simulation(readB, years)
-    args = {'years': years, 'steps': int(params[0]['NumOfSteps']), 'simulations': int(params[0]['NumOfSimulation'])}
- 
-    summaryA = calculate_summary(deepcopy(readA), args)
-    summaryB = calculate_summary(deepcopy(readB), args)
+def write_outputs(summaryA, summaryB, years, requires_simulation):
     write_summary(summaryA, summaryB, years)
     # plot graph
     plot_graph(years, summaryA['total_costs'], summaryB['total_costs'], 'Total Cost')
@@ -119,8 +118,7 @@ def main():
         cost_diff_cols = []
         for year in range(1, years + 1):
             cost_diff_cols.append(f'CostDiffYr{year}')
-        total_unit_cost_diff = np.array(summaryB['total_unit_cost_arr']) - np.array(summaryA['total_unit_cost_arr'])
-        df_data = np.transpose(find_x_mean(total_unit_cost_diff))
+        df_data = np.transpose(find_unit_cost_diff_distribution(summaryA, summaryB))
         total_unit_cost_diff_df = pd.DataFrame(
             data=df_data, columns=cost_diff_cols)
         print()
@@ -169,24 +167,320 @@ def main():
         # 95%         243.84       191.19       135.56       107.87        62.92
         # max         276.14       217.07       154.26       121.66        63.19
 
-        total_unit_cost_diff_df.describe(percentiles=[0.05, 0.5, 0.95]).round(2).to_csv("outputs/stochastic_analysis.csv")
+        total_unit_cost_diff_df.describe(percentiles=[0.05, 0.5, 0.95]).round(2).to_csv(output_path("stochastic_analysis.csv"))
         # print(total_unit_cost_diff_df.describe(percentiles=[0.05, 0.5, 0.95]).round(2))
         plot_df(total_unit_cost_diff_df)
 
+
+def create_run(args, files):
+    # metadata attached to the tidy results of the run, {name: file or list of files} are hashed into name_sha256
+    run = {'run_id': uuid.uuid4().hex, 'created': datetime.now(timezone.utc).isoformat(),
+           'years': args['years'], 'steps': args.get('steps'), 'simulations': args.get('simulations')}
+    for (name, paths) in files.items():
+        run[f'{name}_sha256'] = files_sha256([paths] if isinstance(paths, str) else paths)
+    return run
+
+
+def files_sha256(paths):
+    # hash of the contents of the files in order, None without any file
+    if len(paths) == 0:
+        return None
+    sha256 = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            sha256.update(f.read())
+    return sha256.hexdigest()
+
+
+def run_files(fileA, fileB, args):
+    # every input of the model read by a run, the option files, the assembly trees they name and the correlations
+    files = {'option1': 'inputs/' + fileA, 'option2': 'inputs/' + fileB}
+    for (option, fileName) in [('option1', fileA), ('option2', fileB)]:
+        files[f'{option}_assembly'] = ['inputs/' + tree for tree in assembly_tree_files(fileName)]
+    files['correlations'] = ['inputs/' + CORRELATIONS_INPUT_FILE] if 'correlations' in args else []
+    return files
+
+
+def tidy_results(summaryA, summaryB, years, requires_simulation, run, tornado_input=None, sobol_indices=None):
+    # {table name: records} of the results of a run, each record carries the run_id
+    run_id = run['run_id']
+    tables = {'summary': tidy_summary(create_summary(summaryA, summaryB, years), years, run_id)}
+    if requires_simulation:
+        tables['distributions'] = tidy_distributions({
+            'CostDiff': find_unit_cost_diff_distribution(summaryA, summaryB),
+            'Option1 TotalUnitCost': find_x_mean(summaryA['total_unit_cost_arr']),
+            'Option2 TotalUnitCost': find_x_mean(summaryB['total_unit_cost_arr'])
+        }, run_id)
+    if tornado_input is not None:
+        tables['tornado'] = tidy_tornado(tornado_input, run_id)
+    if sobol_indices is not None:
+        tables['sobol_indices'] = tidy_sobol_indices(sobol_indices, run_id)
+    return tables
+
+
+def write_tidy_results(summaryA, summaryB, years, requires_simulation, run, formats, tornado_input=None, sobol_indices=None):
+    write_results(tidy_results(summaryA, summaryB, years, requires_simulation, run, tornado_input, sobol_indices), run, formats)
+
+
+def resummarize(directory, results_formats=None):
+    # rebuild the outputs from saved samples, without running the model again
+    print('Loading samples from ' + directory)
+    summaryA, summaryB, years = load_samples(directory)
+    requires_simulation = sampled(summaryA) or sampled(summaryB)
+    write_outputs(summaryA, summaryB, years, requires_simulation)
+    if results_formats:
+        run = create_run({'years': years}, {'samples': os.path.join(directory, MANIFEST_FILE)})
+        write_tidy_results(summaryA, summaryB, years, requires_simulation, run, results_formats)
+
+
+def calculate_seeded_summaries(readA, readB, args, run, options):
+    # reproducible run in batches of simulations, optionally checkpointed
+    seed = options.seed
+    if seed is None and options.checkpoint and options.resume:
+        seed = Checkpoint.stored_seed(options.checkpoint)
+    if seed is None:
+        # fresh seed within int64, it is stored in the run metadata and the tidy result tables
+        seed = int(np.random.SeedSequence().generate_state(1, np.uint64)[0] >> np.uint64(1))
+    batch_size = options.batch_size or DEFAULT_BATCH_SIZE
+    print(f'Seed: {seed}, batch size: {batch_size}')
+    run['seed'] = seed
+
+    if options.workers or options.listen:
+        return calculate_summaries_on_workers(readA, readB, args, seed, batch_size, options)
+
+    checkpoint = None
+    if options.checkpoint:
+        config = {'seed': seed, 'batch_size': batch_size, 'years': args['years'], 'steps': args['steps'], 'simulations': args['simulations'],
+                  'gdpw': args.get('gdpw', GDPW_APPROXIMATE)}
+        config.update({key: run[key] for key in INPUT_HASHES})
+        checkpoint = Checkpoint(options.checkpoint, config, options.resume)
+
+    # the first Ctrl-C stops after the current batch, the outputs of the batches done are still written
+    cancel = threading.Event()
+    def request_cancel(signum, frame):
+        print('Cancelling after the current batch, press Ctrl-C again to abort')
+        cancel.set()
+        signal.signal(signal.SIGINT, handler)
+    handler = signal.signal(signal.SIGINT, request_cancel)
+    try:
+        summaryA, summaryB = calculate_batched_summaries([readA.rows, readB.rows], args, seed, batch_size, checkpoint, print_progress, cancel.is_set)
+    finally:
+        signal.signal(signal.SIGINT, handler)
+    if cancel.is_set():
+        run['simulations'] = summaryA['simulations']
+        run['cancelled'] = True
+    return summaryA, summaryB
+
+
+def calculate_summaries_on_workers(readA, readB, args, seed, batch_size, options):
+    # workers on other hosts connect with `python3 distributed.py --connect HOST:PORT` and the same key
+    address = parse_address(options.listen) if options.listen else ('localhost', 0)
+    authkey = os.environ[AUTHKEY_ENV].encode() if AUTHKEY_ENV in os.environ else None
+    coordinator = Coordinator(address, authkey)
+    print(f'Coordinator listening on {coordinator.address[0]}:{coordinator.address[1]}')
+    try:
+        start_local_workers(coordinator.address, coordinator.authkey, options.workers)
+        # workers of other hosts can't attach the shared memory of this one
+        return calculate_distributed_summaries([readA.rows, readB.rows], args, seed, coordinator, batch_size, shared_memory=not options.listen)
+    finally:
+        coordinator.close()
+
+
+def print_progress(progress):
+    eta = f", ETA {progress['eta']:.0f}sec" if progress['eta'] is not None else ''
+    print(f"{progress['stage']}: {progress['done']}/{progress['total']} simulations{eta}")
+    print('  ' + ', '.join(f"{estimate['name']} {estimate['mean']:.2f} [{estimate['low']:.2f}, {estimate['high']:.2f}]" for estimate in progress['cost_diff']))
+
+
+def read_scenario(fileName, cache=None):
+    # parsed inputs are kept in `cache` by the batch runner, keyed by file and modification time, and those of its assembly trees
+    key = ('input', fileName, os.path.getmtime('inputs/' + fileName),
+           tuple((tree, os.path.getmtime('inputs/' + tree)) for tree in assembly_tree_files(fileName)))
+    if cache is not None and key in cache:
+        print('Reusing ' + fileName)
+        return cache[key]
+    print('Starting to read ' + fileName)
+    read = Scenario(readFile(fileName))
+    print('Completead reading ' + fileName)
+    if cache is not None:
+        cache[key] = read
+    return read
+
+
+def seeded_summaries(readA, readB, args, run, options, cache=None):
+    # summaries of a seeded run are reused by the later runs of a batch with the same inputs, seed and batch size
+    reusable = cache is not None and options.seed is not None and not (options.checkpoint or options.workers or options.listen)
+    key = ('summaries', *[run[key] for key in INPUT_HASHES], args['years'], args['steps'], args['simulations'],
+           args.get('gdpw'), options.seed, options.batch_size or DEFAULT_BATCH_SIZE)
+    if reusable and key in cache:
+        print(f'Reusing the summaries of seed {options.seed}')
+        run['seed'] = options.seed
+        return cache[key]
+
+    summaries = calculate_seeded_summaries(readA, readB, args, run, options)
+    if reusable and not run.get('cancelled'):
+        cache[key] = summaries
+    return summaries
+
+
+def main(options, files=(INPUT_FILE_A, INPUT_FILE_B), overrides=None, cache=None):
+    """Run the analysis of the two option files of the inputs folder.
+
+    `overrides` replace values of params.csv. The batch runner passes the
+    same `cache` dict to all its jobs, which then share the parsed inputs
+    and the summaries of seeded runs. Returns the tidy result tables
+    {name: records} and the run metadata.
+    """
+    (fileA, fileB) = files
+    readA = read_scenario(fileA, cache)
+    print('################')
+    readB = read_scenario(fileB, cache)
+
+    print('Validating inputs against template...')
+    params = readFile(PARAMS_INPUT_FILE)
+    params[0].update(overrides or {})
+    years = int(params[0]['NumOfYears'])
+
+    print('Total Number of years for forecast: ', years)
+
+    template = readFile(TEMPLATE_FILE)
+    validate(readA, template, years)
+    validate(readB, template, years)
+
+    print('Running analysis...')
+
+    start = time.time()
+
+    # plot sensitivity graph if current run requires simulation
+    requires_simulation = simulation(readA, years) or simulation(readB, years)
+    args = {'years': years, 'steps': int(params[0]['NumOfSteps']), 'simulations': int(params[0]['NumOfSimulation']), 'gdpw': options.gdpw}
+    # optional correlations between the ranged inputs, independent draws otherwise
+    if os.path.exists('inputs/' + CORRELATIONS_INPUT_FILE):
+        args['correlations'] = readFile(CORRELATIONS_INPUT_FILE)
+ 
+    run = create_run(args, run_files(fileA, fileB, args))
+
+    if options.seed is not None or options.batch_size or options.checkpoint or options.workers or options.listen:
+        summaryA, summaryB = seeded_summaries(readA, readB, args, run, options, cache)
+    else:
+        summaryA = calculate_summary(readA.rows(), args)
+        summaryB = calculate_summary(readB.rows(), args)
+    write_outputs(summaryA, summaryB, years, requires_simulation)
+    if options.save_samples:
+        print('Saving samples to ' + options.save_samples)
+        save_samples(summaryA, summaryB, years, options.save_samples)
+
+    tornado_input = None
+    sobol_indices = None
+    if run.get('cancelled'):
+        print(f"Run cancelled after {run['simulations']} simulations, skipping the sensitivity analysis")
+    elif requires_simulation:
         # plot tornado chart
         # evaluate value for low for all years for a variable
         # [[{name: FD, low: 10, high: 40}, {name: Yield, low: 10, high: 40}], [{name: FD, low: 10, high: 40}], [{}]
         # FD as variable
-        args['steps'] = 1
-        args['simulations'] = 1
-        tornado_input = create_tornado_input(deepcopy(readA), deepcopy(readB), summaryA, summaryB, years, ['ForecastDemand{year}', 'Asp{year}($)', 'WaferYield{year}', 'WaferPrice{year}($)', 'DefectDensity{year}(Defects/cm^2)'], args)
+        tornado_cols = tornado_columns(readA, readB, years)
+        if options.tornado_from_samples:
+            # reuse the input draws of the main run instead of re-running per column
+            tornado_input = estimate_tornado_input(readA, readB, summaryA, summaryB, years, tornado_cols)
+        else:
+            args['steps'] = 1
+            args['simulations'] = 1
+            tornado_input = create_tornado_input(readA, readB, summaryA, summaryB, years, tornado_cols, args)
         plot_tornado(tornado_input)
 
+        if options.sobol_samples > 0:
+            # global sensitivity, shares the sample blocks across all inputs of both options
+            print('Computing Sobol indices...')
+            sobol_indices = calculate_sobol_indices(readA, readB, years, options.sobol_samples, model=model_options(args))
+            write_sobol_indices(sobol_indices)
+
+        if options.tail_level is not None:
+            # importance sampling of the extreme quantiles and exceedance probabilities of the cost difference
+            print('Estimating tail risk...')
+            tail_risk = estimate_tail_risk(readA, readB, years, options.tail_level, options.tail_threshold, options.tail_lower,
+                                           options.tail_samples, args.get('correlations'), model=model_options(args))
+            write_tail_risk(tail_risk)
+
+    if options.break_even and not run.get('cancelled'):
+        # demand (or other input) at which both options cost the same, solved for all samples at once
+        print(f'Solving the break-even {options.break_even}...')
+        break_even = calculate_break_even(readA, readB, years, options.break_even, [option - 1 for option in options.break_even_option],
+                                          options.break_even_samples, args.get('correlations'), model=model_options(args))
+        write_break_even(break_even)
+
+    tables = tidy_results(summaryA, summaryB, years, requires_simulation, run, tornado_input, sobol_indices)
+    if options.results_format:
+        print('Writing tidy results...')
+        write_results(tables, run, options.results_format)
+
     print()
     print(f'Time taken: {(time.time() - start)}sec')
+    return tables, run
+
+
+def create_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sobol-samples', type = int, default = 0,
+                        help = 'Base sample size for the Sobol indices of all ranged inputs, written to outputs/sobol_indices.csv (0 to skip)')
+    parser.add_argument('--tornado-from-samples', action = 'store_true',
+                        help = 'Estimate the tornado chart from the Monte Carlo samples instead of re-running the model per input')
+    parser.add_argument('--save-samples', metavar = 'DIR',
+                        help = 'Save the per option, category and year sample arrays as memory mappable .npy files to DIR')
+    parser.add_argument('--resummarize', metavar = 'DIR',
+                        help = 'Rebuild the summary, stochastic analysis and plots from samples saved with --save-samples')
+    parser.add_argument('--results-format', choices = RESULT_FORMATS, action = 'append',
+                        help = 'Also write the summary, distributions and sensitivity results as tidy tables with the run metadata (repeatable)')
+    parser.add_argument('--seed', type = int,
+                        help = 'Seed of a reproducible run, simulated in batches with an independent random stream each')
+    parser.add_argument('--batch-size', type = int,
+                        help = f'Number of simulations per batch of a seeded run (default {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--checkpoint', metavar = 'DIR',
+                        help = 'Save every completed batch of a seeded run to DIR')
+    parser.add_argument('--resume', action = 'store_true',
+                        help = 'Continue the run checkpointed in --checkpoint DIR, skipping its completed batches')
+    parser.add_argument('--workers', type = int, default = 0,
+                        help = 'Run the batches of a seeded run on this many local worker processes')
+    parser.add_argument('--listen', metavar = 'HOST:PORT',
+                        help = f'Also accept workers from other hosts on this address, they need the key in {AUTHKEY_ENV}')
+    parser.add_argument('--tail-level', type = float,
+                        help = 'Estimate the quantile of CostDiffYr{n} at this level (e.g. 0.999) by importance sampling, written to outputs/tail_risk.csv')
+    parser.add_argument('--tail-threshold', type = float,
+                        help = 'Also estimate the probability that CostDiffYr{n} exceeds this value (falls below it with --tail-lower)')
+    parser.add_argument('--tail-lower', action = 'store_true',
+                        help = 'Estimate the lower tail of CostDiffYr{n} instead of the upper tail')
+    parser.add_argument('--tail-samples', type = int, default = 2000,
+                        help = 'Importance samples per year of the tail risk estimate, after tuning the proposal')
+    parser.add_argument('--break-even', metavar = 'INPUT', nargs = '?', const = BREAK_EVEN_COLUMN,
+                        help = f'Solve the value of INPUT (default {BREAK_EVEN_COLUMN}) at which both options cost the same per year, written to outputs/break_even.csv')
+    parser.add_argument('--break-even-option', type = int, choices = [1, 2], action = 'append',
+                        help = 'Only scale INPUT of this option (repeatable, both options by default)')
+    parser.add_argument('--break-even-samples', type = int, default = 1000,
+                        help = 'Samples of the ranged inputs solved for the break-even distribution')
+    parser.add_argument('--gdpw', choices = GDPW_METHODS, default = GDPW_APPROXIMATE,
+                        help = f'Gross die per wafer from the closed form approximation, or the exact count of whole dies cached in {GDPW_CACHE_FILE}')
+    return parser
+
+
+def check_options(parser, options):
+    if options.tail_level is not None and not 0.5 < options.tail_level < 1:
+        parser.error('--tail-level should be between 0.5 and 1')
+    options.break_even_option = sorted(set(options.break_even_option or [1, 2]))
+    if options.resume and not options.checkpoint:
+        parser.error('--resume requires --checkpoint')
+    if options.checkpoint and (options.workers or options.listen):
+        parser.error('--checkpoint is not supported with --workers or --listen')
+    if options.listen and AUTHKEY_ENV not in os.environ:
+        parser.error(f'--listen requires the key shared with the workers in {AUTHKEY_ENV}')
 
 
 if __name__ == "__main__":
+    parser = create_parser()
+    options = parser.parse_args()
+    check_options(parser, options)
     print("cpu ", mp.cpu_count())
-    main()
+    if options.resummarize:
+        resummarize(options.resummarize, options.results_format)
+    else:
+        main(options)
     print('Completed the analysis')
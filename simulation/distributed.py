@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import argparse
+import os
+import queue
+import threading
+import time
+from multiprocessing import Process, resource_tracker
+from multiprocessing.connection import Client, Listener
+
+from engine import DEFAULT_BATCH_SIZE, batch_sizes, combine_batches, run_batch
+from shared import SharedBatches, shared_rows, write_batch
+
+# Shared secret of the coordinator and its workers on other hosts
+AUTHKEY_ENV = 'COST_MODEL_AUTHKEY'
+# Seconds a run waits for a worker to connect while none is left, and between its checks
+NO_WORKERS_TIMEOUT = 60
+WAIT_INTERVAL = 1
+
+
+def parse_address(address):
+    host, port = address.rsplit(':', 1)
+    return (host, int(port))
+
+
+class Coordinator(object):
+    """Hands out work units to the workers connected to it and collects their results.
+
+    A worker takes one unit at a time and stays connected between runs. When
+    its connection breaks before the result is back (the worker died or its
+    host went away) the unit is put back in the queue for the next worker,
+    so every unit completes as long as one worker is left. A run fails once
+    no worker has been connected for `timeout` seconds.
+    """
+
+    def __init__(self, address=('localhost', 0), authkey=None, timeout=NO_WORKERS_TIMEOUT):
+        self.timeout = timeout
+        self.authkey = authkey or os.urandom(32)
+        self.listener = Listener(address, authkey=self.authkey)
+        self.address = self.listener.address
+        # (job, unit index) to run, None stops a worker
+        self.pending = queue.Queue()
+        self.workers = 0
+        self.closed = False
+        self.lock = threading.Lock()
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError):
+                # refused authentication, or the listener was closed
+                if self.closed:
+                    return
+                continue
+            with self.lock:
+                self.workers += 1
+            threading.Thread(target=self.serve, args=(connection,), daemon=True).start()
+
+    def serve(self, connection):
+        with connection:
+            while True:
+                item = self.pending.get()
+                if item is None:
+                    try:
+                        connection.send(None)
+                    except OSError:
+                        pass
+                    return
+
+                (job, k) = item
+                if job['done'].is_set():
+                    # the rest of a failed job
+                    continue
+                try:
+                    connection.send(job['units'][k])
+                    result = connection.recv()
+                except (EOFError, OSError):
+                    # reissue the unit of a lost worker
+                    with self.lock:
+                        self.workers -= 1
+                    self.pending.put(item)
+                    return
+                with self.lock:
+                    if isinstance(result, Exception):
+                        job['error'] = result
+                    job['results'][k] = result
+                    if 'error' in job or len(job['results']) == len(job['units']):
+                        job['done'].set()
+
+    def run(self, units):
+        """Results of all `units`, in the same order."""
+        job = {'units': units, 'results': {}, 'done': threading.Event()}
+        for k in range(0, len(units)):
+            self.pending.put((job, k))
+        idle = None
+        while not job['done'].wait(WAIT_INTERVAL):
+            with self.lock:
+                if self.workers > 0:
+                    idle = None
+                    continue
+                idle = idle or time.monotonic()
+                if time.monotonic() - idle >= self.timeout:
+                    # the units left in the queue are skipped by the next worker
+                    job['error'] = Exception(f'No worker connected for {self.timeout}s, {len(units) - len(job["results"])} of {len(units)} units pending')
+                    job['done'].set()
+        if 'error' in job:
+            raise job['error']
+        return [job['results'][k] for k in range(0, len(units))]
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            for n in range(0, self.workers):
+                self.pending.put(None)
+        self.listener.close()
+
+
+def run_worker(address, authkey):
+    """Run the units of a coordinator until it stops the worker."""
+    with Client(address, authkey=authkey) as connection:
+        while True:
+            try:
+                unit = connection.recv()
+            except EOFError:
+                return
+            if unit is None:
+                return
+            try:
+                result = run_unit(unit)
+            except Exception as e:
+                # an input error would fail on any worker, it is reported instead of reissued
+                result = Exception(f'{type(e).__name__}: {e}')
+            connection.send(result)
+
+
+def run_unit(unit):
+    # the views of the shared rows are gone once it returns, so the segments of the run can be closed
+    buffers = unit.get('buffers')
+    if not buffers:
+        return run_batch(unit['rows'], unit['args'], unit['seed'], unit['option'], unit['batch'], unit['simulations'])
+    result = run_batch(shared_rows(buffers), unit['args'], unit['seed'], unit['option'], unit['batch'], unit['simulations'])
+    return write_batch(result, buffers)
+
+
+def start_local_workers(address, authkey, workers):
+    # workers share the tracker of the shared memory segments of this process, which unlinks them
+    resource_tracker.ensure_running()
+    processes = [Process(target=run_worker, args=(address, authkey), daemon=True) for n in range(0, workers)]
+    for process in processes:
+        process.start()
+    return processes
+
+
+def create_units(reads, args, seed, batch_size, shared=None):
+    """One unit per (option, batch).
+
+    The scenario rows of the option travel with every unit, or with
+    `shared` (SharedBatches, local workers only) the unit only carries the
+    descriptors of the shared rows, pre-drawn inputs and result buffers.
+    """
+    units = []
+    offset = 0
+    for (batch, simulations) in enumerate(batch_sizes(args['simulations'], batch_size)):
+        for (option, read) in enumerate(reads):
+            unit = {'option': option, 'batch': batch, 'simulations': simulations, 'seed': seed, 'args': args}
+            if shared is not None:
+                unit['buffers'] = shared.unit_buffers(option, offset, simulations)
+            else:
+                unit['rows'] = [dict(row) for row in read()]
+            units.append(unit)
+        offset += simulations
+    return units
+
+
+def combine_results(units, results, years, shared=None):
+    batches = [[] for option in range(0, 2)]
+    for (unit, result) in zip(units, results):
+        if shared is not None:
+            result = shared.batch(unit['option'], unit['buffers']['offset'], result)
+        batches[unit['option']].append(result)
+    # copies the samples out of the shared buffers
+    return tuple(combine_batches(option_batches, years) for option_batches in batches)
+
+
+def calculate_distributed_summaries(reads, args, seed, coordinator, batch_size=DEFAULT_BATCH_SIZE, shared_memory=False):
+    """Summaries of both options with the batches run by the workers of `coordinator`.
+
+    Every unit draws from the random stream of its (option, batch), so the
+    summaries are the same as calculate_batched_summaries with the same seed
+    and batch size, whichever worker ran each unit. With `shared_memory`,
+    for workers on this host, the rows, the standard normal blocks of the
+    ranged inputs and the samples are passed in shared memory segments
+    instead of being pickled with every unit and result.
+    """
+    if not shared_memory:
+        units = create_units(reads, args, seed, batch_size)
+        return combine_results(units, coordinator.run(units), args['years'])
+
+    shared = SharedBatches(reads, args, seed, batch_size)
+    try:
+        units = create_units(reads, args, seed, batch_size, shared)
+        return combine_results(units, coordinator.run(units), args['years'], shared)
+    finally:
+        shared.release()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Worker of a distributed cost_analyzer.py run')
+    parser.add_argument('--connect', metavar='HOST:PORT', required=True,
+                        help='Address the coordinator listens on, see cost_analyzer.py --listen')
+    options = parser.parse_args()
+    if AUTHKEY_ENV not in os.environ:
+        parser.error(f'{AUTHKEY_ENV} should hold the key shared with the coordinator')
+    run_worker(parse_address(options.connect), os.environ[AUTHKEY_ENV].encode())
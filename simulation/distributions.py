@@ -0,0 +1,176 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import re
+from abc import ABC, abstractmethod
+
+import numpy as np
+from scipy.special import betaincinv, ndtr
+
+# z value of the 5th and 95th percentile, bounds of the unbounded distributions
+BOUNDS_Z = 1.6448536269514722
+
+# Legacy range "low-high", either value may be negative e.g. "-10--5"
+NUMBER_PATTERN = r'-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+RANGE_PATTERN = re.compile(rf'^\s*({NUMBER_PATTERN})\s*-\s*({NUMBER_PATTERN})\s*$')
+# Explicit distribution e.g. "Triangular(0.05, 0.07, 0.1)"
+DISTRIBUTION_PATTERN = re.compile(r'^\s*([A-Za-z]+)\s*\((.*)\)\s*$')
+
+
+class Distribution(ABC):
+    """Distribution of a stochastic input cell.
+
+    Samples are drawn through the standard normal (Gaussian copula), so the
+    sampling plan can draw and correlate one standard normal block for all
+    cells whatever their family. `bounds` are the (low, high) values used
+    for the tornado chart.
+    """
+
+    @abstractmethod
+    def from_standard_normal(self, z):
+        """Values of the distribution at the standard normal samples `z`."""
+
+    def sample(self, size, rng=None):
+        return self.from_standard_normal((rng or np.random).standard_normal(size))
+
+    def __eq__(self, other):
+        return type(self) == type(other) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({", ".join(str(value) for value in vars(self).values())})'
+
+
+class Normal(Distribution):
+    def __init__(self, mean, sd, bounds=None):
+        if sd < 0:
+            raise Exception(f'Normal standard deviation should not be negative: {sd}')
+        self.mean = mean
+        self.sd = sd
+        self.bounds = bounds or (mean - BOUNDS_Z * sd, mean + BOUNDS_Z * sd)
+
+    def from_standard_normal(self, z):
+        return self.mean + self.sd * z
+
+
+class Uniform(Distribution):
+    def __init__(self, low, high):
+        if low > high:
+            raise Exception(f'Uniform low should not be above high: {low}, {high}')
+        self.low = low
+        self.high = high
+        self.bounds = (low, high)
+
+    def from_standard_normal(self, z):
+        return self.low + (self.high - self.low) * ndtr(z)
+
+
+class Triangular(Distribution):
+    def __init__(self, low, mode, high):
+        if not low <= mode <= high or low == high:
+            raise Exception(f'Triangular should have low <= mode <= high and low < high: {low}, {mode}, {high}')
+        self.low = low
+        self.mode = mode
+        self.high = high
+        self.bounds = (low, high)
+
+    def from_standard_normal(self, z):
+        u = ndtr(z)
+        width = self.high - self.low
+        split = (self.mode - self.low) / width
+        return np.where(u < split,
+                        self.low + np.sqrt(u * width * (self.mode - self.low)),
+                        self.high - np.sqrt((1 - u) * width * (self.high - self.mode)))
+
+
+class LogNormal(Distribution):
+    # mu and sigma of the underlying normal distribution
+    def __init__(self, mu, sigma):
+        if sigma < 0:
+            raise Exception(f'LogNormal sigma should not be negative: {sigma}')
+        self.mu = mu
+        self.sigma = sigma
+        self.bounds = (np.exp(mu - BOUNDS_Z * sigma), np.exp(mu + BOUNDS_Z * sigma))
+
+    def from_standard_normal(self, z):
+        return np.exp(self.mu + self.sigma * z)
+
+
+class Pert(Distribution):
+    def __init__(self, low, mode, high):
+        if not low <= mode <= high or low == high:
+            raise Exception(f'PERT should have low <= mode <= high and low < high: {low}, {mode}, {high}')
+        self.low = low
+        self.mode = mode
+        self.high = high
+        self.bounds = (low, high)
+
+    def from_standard_normal(self, z):
+        # Beta(a, b) on [low, high] with the mean (low + 4 * mode + high) / 6
+        a = 1 + 4 * (self.mode - self.low) / (self.high - self.low)
+        b = 1 + 4 * (self.high - self.mode) / (self.high - self.low)
+        return self.low + (self.high - self.low) * betaincinv(a, b, ndtr(z))
+
+
+# Distribution and its number of parameters by (lower case) name
+DISTRIBUTIONS = {
+    'normal': (Normal, 2),
+    'uniform': (Uniform, 2),
+    'triangular': (Triangular, 3),
+    'lognormal': (LogNormal, 2),
+    'pert': (Pert, 3),
+}
+
+
+def legacy_range(low, high):
+    # "low-high" is a normal distribution around the mid point with sd = 10% of it
+    avg = (low + high) / 2
+    return Normal(avg, abs(avg) / 10, (low, high))
+
+
+def is_distribution(val):
+    return isinstance(val, Distribution)
+
+
+def compile_value(val):
+    """Compile a raw input cell.
+
+    Blank cells become None, numbers float and ranges or explicit
+    distributions a Distribution. Any other text is returned unchanged.
+    """
+    if val is None or val.strip() == '':
+        return None
+
+    try:
+        return float(val)
+    except ValueError:
+        pass
+
+    match = RANGE_PATTERN.match(val)
+    if match:
+        return legacy_range(float(match.group(1)), float(match.group(2)))
+
+    match = DISTRIBUTION_PATTERN.match(val)
+    if match and match.group(1).lower() in DISTRIBUTIONS:
+        distribution, num_of_args = DISTRIBUTIONS[match.group(1).lower()]
+        try:
+            args = [float(arg) for arg in match.group(2).split(',')]
+        except ValueError:
+            args = []
+        if len(args) != num_of_args:
+            raise Exception(f'{distribution.__name__} takes {num_of_args} numeric parameters: {val}')
+        return distribution(*args)
+
+    return val
@@ -0,0 +1,220 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import json
+import os
+import time
+
+import numpy as np
+from processor import SAMPLE_CATEGORIES, calculate_summary, find_x_mean, summarize_samples
+from samples import OPTIONS, sample_file, to_json_list
+
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# Default number of simulations per batch
+DEFAULT_BATCH_SIZE = 1000
+# z value of the 95% confidence band of the interim estimates
+CONFIDENCE_Z = 1.959963984540054
+
+STAGE_SIMULATION = 'simulation'
+
+
+def batch_sizes(simulations, batch_size):
+    return [min(batch_size, simulations - start) for start in range(0, simulations, batch_size)]
+
+
+def batch_rng(seed, option, batch):
+    # independent stream per (option, batch), the same whatever ran before it
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(option, batch)))
+
+
+def run_batch(read, args, seed, option, batch, simulations):
+    """Samples of one batch of simulations of an option, see calculate_summary."""
+    summary = calculate_summary(read, dict(args, simulations=simulations, rng=batch_rng(seed, option, batch)))
+    return {
+        'simulations': simulations,
+        'samples': summary['samples'],
+        'input_draws': summary['input_draws'],
+        'mask_costs': summary['mask_costs'],
+        'nre': summary['nre'],
+        'asp': summary['asp']
+    }
+
+
+def concatenate_samples(values):
+    # scalars of a deterministic option are the same for every batch
+    if all(np.ndim(value) == 0 for value in values):
+        return values[0]
+    # (steps x simulations) matrices, batches are appended along the simulations
+    return np.concatenate(values, axis=-1)
+
+
+def weighted_mean(values, weights):
+    if all(value == values[0] for value in values):
+        return values[0]
+    return sum(value * weight for (value, weight) in zip(values, weights)) / sum(weights)
+
+
+def combine_batches(batches, years):
+    """Summary of the batches of an option, as if they were run in one go."""
+    weights = [batch['simulations'] for batch in batches]
+    samples = {category: [concatenate_samples([batch['samples'][category][year] for batch in batches]) for year in range(0, years)]
+               for category in SAMPLE_CATEGORIES}
+    scalars = {key: [weighted_mean([batch[key][year] for batch in batches], weights) for year in range(0, years)]
+               for key in ['mask_costs', 'nre', 'asp']}
+    summary = summarize_samples(samples, scalars['mask_costs'], scalars['nre'], scalars['asp'])
+    summary['input_draws'] = {cell: concatenate_samples([batch['input_draws'][cell] for batch in batches]) for cell in batches[0]['input_draws']}
+    return summary
+
+
+class Checkpoint(object):
+    """Completed batches of a run, saved to a directory after every batch.
+
+    The run configuration (seed, batch size, steps, simulations, years and
+    the inputs) is kept in checkpoint.json, a resumed run has to match it.
+    Every batch draws from its own stream derived from the seed, so resuming
+    gives exactly the result of an uninterrupted run.
+    """
+
+    def __init__(self, directory, config, resume=False):
+        self.directory = directory
+        self.state = {'config': config, 'batches': {option: {} for option in OPTIONS}}
+        file = os.path.join(directory, CHECKPOINT_FILE)
+        if resume and os.path.exists(file):
+            with open(file) as f:
+                state = json.load(f)
+            if state['config'] != config:
+                raise Exception(f'Checkpoint in {directory} was written by a run with another configuration: {state["config"]}')
+            self.state = state
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def stored_seed(directory):
+        # seed of an earlier run, so --resume does not need it again
+        file = os.path.join(directory, CHECKPOINT_FILE)
+        if not os.path.exists(file):
+            return None
+        with open(file) as f:
+            return json.load(f)['config']['seed']
+
+    def completed(self, option, batch):
+        return str(batch) in self.state['batches'][OPTIONS[option]]
+
+    def save(self, option, batch, result):
+        directory = os.path.join(self.directory, OPTIONS[option], f'batch{batch}')
+        os.makedirs(directory, exist_ok=True)
+        years = len(result['nre'])
+        for category in SAMPLE_CATEGORIES:
+            for year in range(1, years + 1):
+                np.save(os.path.join(directory, sample_file('', category, year)), np.asarray(result['samples'][category][year - 1]))
+        cells = list(result['input_draws'])
+        np.savez(os.path.join(directory, 'input_draws.npz'), *[result['input_draws'][cell] for cell in cells])
+
+        self.state['batches'][OPTIONS[option]][str(batch)] = {
+            'simulations': result['simulations'],
+            'cells': [list(cell) for cell in cells],
+            'mask_costs': to_json_list(result['mask_costs']),
+            'nre': to_json_list(result['nre']),
+            'asp': to_json_list(result['asp'])
+        }
+        # replace the state file only once the batch files are complete
+        file = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(file + '.tmp', 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(file + '.tmp', file)
+
+    def load(self, option, batch):
+        entry = self.state['batches'][OPTIONS[option]][str(batch)]
+        directory = os.path.join(self.directory, OPTIONS[option], f'batch{batch}')
+        years = len(entry['nre'])
+        samples = {category: [np.load(os.path.join(directory, sample_file('', category, year))) for year in range(1, years + 1)]
+                   for category in SAMPLE_CATEGORIES}
+        draws = np.load(os.path.join(directory, 'input_draws.npz'))
+        input_draws = {tuple(cell): draws[f'arr_{k}'] for (k, cell) in enumerate(entry['cells'])}
+        return dict(entry, samples=samples, input_draws=input_draws)
+
+
+def interim_cost_diff(diffs):
+    """Mean unit cost difference per year with its 95% confidence band.
+
+    `diffs` holds a list per year of the per simulation differences of each
+    completed batch.
+    """
+    estimates = []
+    for (year, batches) in enumerate(diffs):
+        values = np.concatenate([np.atleast_1d(diff) for diff in batches])
+        mean = np.mean(values)
+        half_width = CONFIDENCE_Z * np.std(values, ddof=1) / np.sqrt(len(values)) if len(values) > 1 else 0.0
+        estimates.append({'name': f'CostDiffYr{year + 1}', 'mean': mean, 'low': mean - half_width, 'high': mean + half_width})
+    return estimates
+
+
+def batch_cost_diff(batchA, batchB):
+    # per year and simulation unit cost difference (option 2 - option 1) of a batch
+    return [np.broadcast_to(meanB - meanA, np.broadcast_shapes(meanA.shape, meanB.shape))
+            for (meanA, meanB) in zip(find_x_mean(batchA['samples']['total_unit_cost']), find_x_mean(batchB['samples']['total_unit_cost']))]
+
+
+def calculate_batched_summaries(reads, args, seed, batch_size=DEFAULT_BATCH_SIZE, checkpoint=None, progress=None, cancelled=None):
+    """Summaries of both options, simulated in batches of `batch_size` simulations.
+
+    `reads` holds a function per option returning fresh rows for a run. With
+    a checkpoint the completed batches are saved and, when resuming, loaded
+    instead of being simulated again.
+
+    `progress` is called after every batch with a dict of the stage, the
+    simulations done out of the total, the elapsed time and ETA in seconds
+    and the interim CostDiff estimates. When `cancelled()` returns True the
+    remaining batches are skipped and the summaries of the completed ones
+    are returned, check the 'simulations' of the summaries for how many ran.
+    """
+    years = args['years']
+    sizes = batch_sizes(args['simulations'], batch_size)
+    batches = [[], []]
+    diffs = [[] for year in range(0, years)]
+    start = time.time()
+    ran = 0
+    for (batch, simulations) in enumerate(sizes):
+        if cancelled is not None and cancelled():
+            break
+
+        for option in range(0, 2):
+            if checkpoint is not None and checkpoint.completed(option, batch):
+                batches[option].append(checkpoint.load(option, batch))
+                continue
+
+            result = run_batch(reads[option](), args, seed, option, batch, simulations)
+            ran += simulations
+            if checkpoint is not None:
+                checkpoint.save(option, batch, result)
+            batches[option].append(result)
+
+        for (year, diff) in enumerate(batch_cost_diff(batches[0][-1], batches[1][-1])):
+            diffs[year].append(diff)
+        if progress is not None:
+            done = sum(sizes[:batch + 1])
+            elapsed = time.time() - start
+            # only the batches simulated by this run tell how long the rest takes
+            remaining = 2 * (args['simulations'] - done)
+            progress({'stage': STAGE_SIMULATION, 'done': done, 'total': args['simulations'], 'elapsed': elapsed,
+                      'eta': elapsed / ran * remaining if ran else None, 'cost_diff': interim_cost_diff(diffs)})
+
+    if not batches[0]:
+        raise Exception('The run was cancelled before any batch completed')
+    summaries = combine_batches(batches[0], years), combine_batches(batches[1], years)
+    for (summary, option_batches) in zip(summaries, batches):
+        summary['simulations'] = sum(batch['simulations'] for batch in option_batches)
+    return summaries
@@ -0,0 +1,124 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import json
+import math
+import os
+import tempfile
+
+import numpy as np
+
+# Gross die per wafer methods, the closed form approximation or the count of the dies placed on the wafer
+GDPW_APPROXIMATE = 'approximate'
+GDPW_EXACT = 'exact'
+GDPW_METHODS = [GDPW_APPROXIMATE, GDPW_EXACT]
+
+# Edge exclusion (mm) on each side of the wafer, the Wfr - 6 of the approximation
+EDGE_EXCLUSION = 3.0
+# Grid offsets searched along each axis, within one die pitch
+GDPW_OFFSETS = 64
+
+# Persistent cache of the exact counts
+GDPW_CACHE_FILE = 'outputs/gdpw_cache.json'
+
+
+def count_gross_dies(pitch_x, pitch_y, wafer_size, edge_exclusion=EDGE_EXCLUSION, offsets=GDPW_OFFSETS):
+    """Largest number of whole dies of a grid placed within the usable area of the wafer.
+
+    The die pitch includes the saw street. The grid is shifted by
+    `offsets` x `offsets` offsets within one pitch, all evaluated at once:
+    for every offset and grid column the dies fit between the chords of the
+    circle at both edges of the column.
+    """
+    radius = wafer_size / 2 - edge_exclusion
+    if radius <= 0 or pitch_x > 2 * radius or pitch_y > 2 * radius:
+        return 0
+
+    shift = np.arange(0, offsets) / offsets
+    offset_x = (shift * pitch_x)[:, None, None]
+    offset_y = (shift * pitch_y)[None, :, None]
+    columns = np.arange(-math.ceil(radius / pitch_x) - 1, math.ceil(radius / pitch_x) + 1)[None, None, :]
+
+    # column edges and the half height of the circle at the edge further from the centre
+    left = offset_x + columns * pitch_x
+    edge = np.maximum(np.abs(left), np.abs(left + pitch_x))
+    height = np.sqrt(np.clip(radius ** 2 - edge ** 2, 0, None))
+    # rows j with offset_y + j * pitch_y >= -height and offset_y + (j + 1) * pitch_y <= height
+    rows = np.floor((height - offset_y) / pitch_y) - np.ceil((-height - offset_y) / pitch_y)
+    rows = np.where(edge <= radius, np.clip(rows, 0, None), 0)
+    return int(rows.sum(axis=2).max())
+
+
+class GdpwCache(object):
+    """Exact gross die per wafer counts by die geometry, kept in a JSON file across runs.
+
+    Counts are memoized in memory, new geometries are counted once and kept
+    pending until `flush` writes them in one go. Other runs may share the
+    file: their entries are merged in before it is atomically replaced.
+    """
+
+    def __init__(self, file=GDPW_CACHE_FILE):
+        self.file = file
+        self.counts = None
+        self.pending = {}
+
+    @staticmethod
+    def key(dimension_x, dimension_y, saw_street, wafer_size, eff_area):
+        return f'{dimension_x!r}:{dimension_y!r}:{saw_street!r}:{wafer_size!r}:{eff_area!r}:{EDGE_EXCLUSION!r}:{GDPW_OFFSETS!r}'
+
+    def read(self):
+        if not os.path.exists(self.file):
+            return {}
+        with open(self.file) as f:
+            return json.load(f)
+
+    def load(self):
+        self.counts = dict(self.read(), **self.pending)
+
+    def save(self):
+        directory = os.path.dirname(self.file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # entries written by other runs since the load are kept
+        self.counts = dict(self.read(), **self.counts)
+        with tempfile.NamedTemporaryFile('w', dir=directory or '.', suffix='.tmp', delete=False) as f:
+            json.dump(self.counts, f, indent=2)
+        os.replace(f.name, self.file)
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+        self.save()
+        self.pending = {}
+
+    def get(self, dimension_x, dimension_y, saw_street, wafer_size, eff_area):
+        if self.counts is None:
+            self.load()
+        key = self.key(dimension_x, dimension_y, saw_street, wafer_size, eff_area)
+        if key not in self.counts:
+            self.counts[key] = self.pending[key] = exact_gdpw(dimension_x, dimension_y, saw_street, wafer_size, eff_area)
+        return self.counts[key]
+
+
+def exact_gdpw(dimension_x, dimension_y, saw_street, wafer_size, eff_area):
+    # the redundancy area of the effective area grows the pitch, keeping the aspect ratio of the die
+    pitch_x = dimension_x + saw_street
+    pitch_y = dimension_y + saw_street
+    scale = math.sqrt(eff_area / (pitch_x * pitch_y))
+    return count_gross_dies(pitch_x * scale, pitch_y * scale, wafer_size)
+
+
+gdpw_cache = GdpwCache()
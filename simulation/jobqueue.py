@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from multiprocessing import Pool
+
+from cost_analyzer import CORRELATIONS_INPUT_FILE, INPUT_FILE_A, INPUT_FILE_B, PARAMS_INPUT_FILE, TEMPLATE_FILE, create_parser
+from reader import assembly_tree_files
+from runner import STATUS_FAILED, parse_job, run_job
+from writer import OUTPUT_DIRECTORY, PERCENTILES
+
+QUEUE_FILE = os.path.join(OUTPUT_DIRECTORY, 'jobs.sqlite')
+# Output files of a queued job, by job id
+QUEUE_OUTPUT_DIRECTORY = os.path.join(OUTPUT_DIRECTORY, 'jobs')
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+
+# Seconds between the heartbeats of a worker's running jobs, a running job without one for STALE_AFTER seconds
+# belongs to a worker which died and is queued again
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = 300
+
+# Columns of the tidy result tables, see cost_analyzer.tidy_results
+RESULT_TABLES = {
+    'summary': ['run_id', 'category', 'option', 'year', 'value'],
+    'distributions': ['run_id', 'distribution', 'year', 'count', 'mean', 'std', 'min', 'max'] + [f'p{p}' for p in PERCENTILES],
+    'tornado': ['run_id', 'year', 'input', 'high', 'low'],
+    'sobol_indices': ['run_id', 'year', 'rank', 'input', 'first_order', 'total']
+}
+
+
+def connect(file=QUEUE_FILE):
+    """Connection to the queue database, created with its tables if needed."""
+    directory = os.path.dirname(file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(file, timeout=60, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, name TEXT, spec TEXT NOT NULL, status TEXT NOT NULL,
+        error TEXT, output TEXT, run_id TEXT, run TEXT, submitted REAL, started REAL, finished REAL, worker INTEGER, heartbeat REAL)''')
+    # queues created before the workers were recorded
+    columns = [column[1] for column in connection.execute('PRAGMA table_info(jobs)')]
+    for column in ['worker INTEGER', 'heartbeat REAL']:
+        if column.split()[0] not in columns:
+            connection.execute(f'ALTER TABLE jobs ADD COLUMN {column}')
+    for (table, columns) in RESULT_TABLES.items():
+        connection.execute(f'CREATE TABLE IF NOT EXISTS {table} (job_id INTEGER NOT NULL REFERENCES jobs(id), '
+                           f'{", ".join(columns)})')
+        connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_job ON {table} (job_id)')
+    return connection
+
+
+def file_hash(fileName):
+    path = 'inputs/' + fileName
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def input_files(job):
+    # every file of the inputs folder the job reads
+    options = [job.get('option1', INPUT_FILE_A), job.get('option2', INPUT_FILE_B)]
+    trees = [tree for fileName in options if os.path.exists('inputs/' + fileName) for tree in assembly_tree_files(fileName)]
+    return options + trees + [PARAMS_INPUT_FILE, CORRELATIONS_INPUT_FILE, TEMPLATE_FILE]
+
+
+def job_key(job, options):
+    """Hash of everything a job's results depend on, None for an unseeded job.
+
+    These are the contents of all the input files it reads (the options,
+    their assembly trees, params.csv, the correlations and the template),
+    its parameter overrides and its parsed `options`, where the seed is the
+    same whether it was given as the job's seed or as --seed in its args.
+    The output directory and name don't count. Every unseeded job is a new
+    random run, it has no key.
+    """
+    if options.seed is None:
+        return None
+    identity = {
+        'inputs': [file_hash(fileName) for fileName in input_files(job)],
+        'params': job.get('params', {}),
+        'options': vars(options)
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def submit(connection, jobs):
+    """Queue the `jobs` (manifest job dicts) unless an identical job was already requested.
+
+    Returns (job id, status, new) per job. A seeded job identical to a
+    queued, running or done one is not queued again, a failed one is
+    requeued. Unseeded jobs are always queued.
+    """
+    parser = create_parser()
+    submitted = []
+    for (n, job) in enumerate(jobs, 1):
+        # fails early on invalid arguments
+        parsed = parse_job(parser, job, f'job{n}')
+        name = parsed['name']
+        # a unique key for an unseeded job
+        key = job_key(job, parsed['options']) or uuid.uuid4().hex
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT id, status FROM jobs WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                cursor = connection.execute('INSERT INTO jobs (key, name, spec, status, submitted) VALUES (?, ?, ?, ?, ?)',
+                                            (key, name, json.dumps(job), STATUS_QUEUED, time.time()))
+                submitted.append((cursor.lastrowid, STATUS_QUEUED, True))
+            elif row[1] == STATUS_FAILED:
+                connection.execute('UPDATE jobs SET status = ?, error = NULL, submitted = ? WHERE id = ?', (STATUS_QUEUED, time.time(), row[0]))
+                submitted.append((row[0], STATUS_QUEUED, True))
+            else:
+                submitted.append((row[0], row[1], False))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+    return submitted
+
+
+def claim(connection, count, worker, stale=STALE_AFTER):
+    # marks up to `count` queued jobs as running on `worker`, in submission order, after requeuing the stale running ones
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        now = time.time()
+        connection.execute('UPDATE jobs SET status = ?, worker = NULL WHERE status = ? AND heartbeat < ?', (STATUS_QUEUED, STATUS_RUNNING, now - stale))
+        rows = connection.execute('SELECT id, spec FROM jobs WHERE status = ? ORDER BY submitted, id LIMIT ?', (STATUS_QUEUED, count)).fetchall()
+        connection.executemany('UPDATE jobs SET status = ?, started = ?, worker = ?, heartbeat = ? WHERE id = ?',
+                               [(STATUS_RUNNING, now, worker, now, id) for (id, spec) in rows])
+        connection.execute('COMMIT')
+    except Exception:
+        connection.execute('ROLLBACK')
+        raise
+    return [(id, json.loads(spec)) for (id, spec) in rows]
+
+
+def execute(item):
+    # runs in the worker process, the outputs files go to the job's own directory
+    (id, spec) = item
+    spec = dict(spec, output=os.path.join(QUEUE_OUTPUT_DIRECTORY, str(id)))
+    return id, run_job(parse_job(create_parser(), spec, f'job{id}'))
+
+
+def store(connection, id, status, worker):
+    """Record the status of a job and insert its result tables.
+
+    Returns False without storing anything if the job was requeued as stale
+    and is no longer `worker`'s.
+    """
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        if connection.execute('SELECT worker FROM jobs WHERE id = ?', (id,)).fetchone()[0] != worker:
+            connection.execute('ROLLBACK')
+            return False
+        run = None
+        if status['results'] is not None:
+            (tables, run) = status['results']
+            for (table, columns) in RESULT_TABLES.items():
+                records = tables.get(table, [])
+                connection.executemany(f'INSERT INTO {table} (job_id, {", ".join(columns)}) VALUES ({", ".join("?" * (len(columns) + 1))})',
+                                       [[id] + [record[column] for column in columns] for record in records])
+        connection.execute('UPDATE jobs SET status = ?, error = ?, output = ?, run_id = ?, run = ?, finished = ? WHERE id = ?',
+                           (status['status'], status['error'] or None, status['output'], run['run_id'] if run else None,
+                            json.dumps(run, default=str) if run else None, time.time(), id))
+        connection.execute('COMMIT')
+    except Exception:
+        connection.execute('ROLLBACK')
+        raise
+    return True
+
+
+def heartbeat(file, worker, stop, interval=HEARTBEAT_INTERVAL):
+    # runs in a thread of the worker, with its own connection, until `stop` is set
+    connection = connect(file)
+    try:
+        while not stop.wait(interval):
+            connection.execute('UPDATE jobs SET heartbeat = ? WHERE status = ? AND worker = ?', (time.time(), STATUS_RUNNING, worker))
+    finally:
+        connection.close()
+
+
+def work(connection, processes=1, poll=None):
+    """Run the queued jobs on a pool of at most `processes` processes.
+
+    Returns when the queue is empty, or with `poll` keeps waiting for new
+    jobs, checking every `poll` seconds. Returns the number of jobs run.
+    The running jobs of this worker (its pid) get a heartbeat every
+    HEARTBEAT_INTERVAL seconds, jobs of a worker which stopped sending them
+    are queued again by the next claim.
+    """
+    count = 0
+    worker = os.getpid()
+    stop = threading.Event()
+    file = connection.execute('PRAGMA database_list').fetchone()[2]
+    thread = threading.Thread(target=heartbeat, args=(file, worker, stop), daemon=True)
+    thread.start()
+    pool = Pool(processes) if processes > 1 else None
+    try:
+        while True:
+            items = claim(connection, processes, worker)
+            if not items:
+                if poll is None:
+                    return count
+                time.sleep(poll)
+                continue
+            results = pool.imap_unordered(execute, items) if pool is not None else map(execute, items)
+            for (id, status) in results:
+                if store(connection, id, status, worker):
+                    count += 1
+    finally:
+        stop.set()
+        thread.join()
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def print_rows(cursor):
+    writer = csv.writer(sys.stdout)
+    writer.writerow([column[0] for column in cursor.description])
+    writer.writerows(cursor)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local queue of cost_analyzer.py jobs with the results stored in SQLite')
+    parser.add_argument('--db', default=QUEUE_FILE, help='SQLite file of the queue and the results')
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('submit', help='Queue the jobs of a manifest (see runner.py), identical jobs are only run once')
+    command.add_argument('manifest')
+    command = commands.add_parser('work', help='Run the queued jobs')
+    command.add_argument('--processes', type=int, default=1, help='Maximum number of jobs run at the same time')
+    command.add_argument('--poll', type=float, help='Keep waiting for new jobs, checking every POLL seconds')
+    commands.add_parser('status', help='List the jobs')
+    command = commands.add_parser('query', help='Run a SQL query on the jobs and result tables, printed as CSV')
+    command.add_argument('sql')
+    options = parser.parse_args()
+
+    connection = connect(options.db)
+    if options.command == 'submit':
+        with open(options.manifest) as f:
+            jobs = json.load(f)['jobs']
+        for (id, status, new) in submit(connection, jobs):
+            print(f'Job {id}: {status}' + ('' if new else ' (identical to an earlier request)'))
+    elif options.command == 'work':
+        print(f'Ran {work(connection, options.processes, options.poll)} jobs')
+    elif options.command == 'status':
+        print_rows(connection.execute('SELECT id, name, status, error, output, run_id, submitted, started, finished, worker, heartbeat FROM jobs ORDER BY id'))
+    else:
+        print_rows(connection.execute(options.sql))
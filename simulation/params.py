@@ -15,14 +15,22 @@
  """
 
 
+from gdpw import GDPW_APPROXIMATE
+
 # Simulation parameters
 # In case if Monte Carlo analysis is required, then 
 # specify the values in input data options csv as 'NumOfSteps' and 'NumOfSimulations'
 
 class Params(object):
-    def __init__(self, steps, simulations):
+    def __init__(self, steps, simulations, deterministic=False, rng=None, gdpw=GDPW_APPROXIMATE):
         self.num_of_steps = steps
         self.num_of_simulations = simulations
+        # no input is ranged, constants are kept as scalars instead of matrices
+        self.deterministic = deterministic
+        # random generator of the run, the global numpy one if not set
+        self.rng = rng
+        # gross die per wafer method, see gdpw.py
+        self.gdpw = gdpw
 
     def __str__(self):
-        return f"steps: {self.num_of_steps}, simulations: {self.num_of_simulations}"
\ No newline at end of file
+        return f"steps: {self.num_of_steps}, simulations: {self.num_of_simulations}, deterministic: {self.deterministic}"
\ No newline at end of file
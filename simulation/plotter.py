@@ -22,6 +22,8 @@ import locale
 
 from matplotlib import pyplot as plt
 
+from writer import output_path
+
 locale.setlocale(locale.LC_ALL, '')
 
 def plot_graph(years, costsA, costsB, title):
@@ -32,7 +34,7 @@ def plot_graph(years, costsA, costsB, title):
     plt.plot(x, costsA, color='r', label='Option 1 (Chiplet)')
     plt.plot(x, costsB, color='g', label='Option 2 (2 SOC Chips)')
     plt.legend()
-    plt.savefig(f'outputs/{title.lower().replace(" ", "_")}.png')
+    plt.savefig(output_path(f'{title.lower().replace(" ", "_")}.png'))
     plt.clf()
 
 
@@ -44,7 +46,7 @@ def plot_df(df, suffix=''):
         plt.ylabel('Frequency')
         plt.xlabel('Unit Cost Diff (Option2 - Option1)')
         plt.hist(df[col], bins=25, histtype='stepfilled')
-        plt.savefig(f'outputs/{file_name}')
+        plt.savefig(output_path(file_name))
         plt.clf()
 
     # plot cost diff for all years in a single diagram
@@ -53,7 +55,7 @@ def plot_df(df, suffix=''):
     for ax in axarr.flatten():
         ax.set_ylabel('Frequency')
         ax.set_xlabel('Unit Cost Diff (Option2 - Option1)')
-    plt.savefig(f'outputs/cost_diff_summary.png')
+    plt.savefig(output_path('cost_diff_summary.png'))
     plt.clf()
 
 """
@@ -160,4 +162,4 @@ def plot_tornado_chart(cols, highs, lows, year):
                           tickfont_size=14
                       ),
                       bargap=0.20)
-    fig.write_image(file=f'outputs/tornado_yr{year}.png', format='png')
+    fig.write_image(file=output_path(f'tornado_yr{year}.png'), format='png')
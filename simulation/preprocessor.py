@@ -15,101 +15,142 @@
  """
 
 import math
+import re
 from operator import mod
-from scipy.special import comb
 
 import numpy as np
+from distributions import is_distribution
+from gdpw import GDPW_APPROXIMATE, GDPW_EXACT, gdpw_cache
 from params import Params
-
-# Yield model names
-MURPHY_MODEL = 'Murphy'
-BOSE_EINSTEIN_MODEL = 'Bose Einstein'
+from records import RECORD, Die, Metadata
+from scenario import ScenarioRows
+from yield_models import BOSE_EINSTEIN_MODEL, DEFAULT_CLUSTER_PARAMETER, MURPHY_MODEL
+from yield_models import calculate_model_yield, calculate_redundancy_yield, get_yield_kernel
 
 # Device Type
 DEVICE_TYPE_SUBSTRATE = 'Substrate'
 
+# Columns kept as text, all other columns are compiled to numbers or distributions
+TEXT_COLUMNS = ['SN', 'DeviceType', 'SiliconNode', 'YieldModel']
+# Columns which define the structure (die geometry, assembly, redundancy) and can't be stochastic
+CONSTANT_COLUMNS = ['DimensionX', 'DimensionY', 'WaferSize(mm)', 'SawStreet(mm)', 'N', 'AssemblySteps',
+                    'RecBaseline', 'RecSpares', 'RecArea', 'AssemblySeq{step}']
+
+# Optional metadata column, file name of the assembly tree which replaces the AssemblySeq{step} columns
+ASSEMBLY_TREE_COLUMN = 'AssemblyTree'
+
+# Columns required for every year and for every assembly step
+YEAR_COLUMNS = ['SubstrateUnitPrice{year}($)', 'DefectDensity{year}(Defects/cm^2)', 'WaferYield{year}', 'ForecastUnitPrice{year}($)',
+                'ForecastDemand{year}', 'PackageAssemblyCost{year}($)', 'FinalPackageTestCost{year}($)', 'FinalPackageTestYield{year}',
+                'SLTCost{year}($)', 'SLTYield{year}', 'Quality{year}', 'OperatingUnitCost{year}($)', 'IpInterfaceCost{year}($)',
+                'IpInterfaceCostAsp{year}']
+STEP_COLUMNS = ['AssyPerStepYield{step}', 'AssyYield{step}', 'AssemblySeq{step}']
+
+YEAR_PATTERN = re.compile(r'Yr(\d+)')
+
+# Run arguments which select how the model is evaluated, rather than its size
+MODEL_OPTIONS = ['gdpw']
+
+# Test parameters of the metadata row by Metadata field
+METADATA_TEST_COLUMNS = {
+    'ws_a': 'WSa($/hr)',    # Wafer sort automated test equipment loaded rate
+    'ws_h': 'WSh($/hr)',    # Wafer sort prober loaded rate ($/hr)
+    'ws_ci': 'WSci',        # Wafer Sort insertion per unit
+    'ws_di': 'WSdi',        # Probe (Wafer Sort) time duration per insertion
+    'ws_xi': 'WSxi',        # Wafer sort test coverage
+    'ws_ri': 'WSri',        # Wafer sort retest attempts for failing unit
+    'ft_a': 'FTa($/hr)',
+    'ft_h': 'FTh($/hr)',    # final test handler loaded rate
+    'ft_xi': 'FTxi',
+    'ft_di': 'FTdi',
+    'ft_ri': 'FTri',
+    'ft_ci': 'FTci',
+    'slt_a': 'SLTa($/hr)',
+    'slt_h': 'SLTh($/hr)',  # system level test handler loaded rate
+    'slt_di': 'SLTdi',      # system level test duration per unit
+}
+
+# Columns the Metadata and Die records are compiled from
+RECORD_COLUMNS = ['YieldModel', 'ClusterParameter', 'RecBaseline', 'RecSpares', 'RecArea', 'AssemblySteps', *METADATA_TEST_COLUMNS.values(),
+                  'SN', 'DeviceType', 'DimensionX', 'DimensionY', 'SawStreet(mm)', 'WaferSize(mm)', 'N',
+                  'ProbeCost($)', 'ProberRate($/hr)', 'Insrtn1', 'Sites1', 'Insrtn2', 'Sites2']
+
 params = Params(1, 1)
 
 def validate(reads, template, years):
     input_headers = set(reads[0].keys())
-    template_headers = set(template[0].keys())
 
-    missing_columns = template_headers - input_headers
-    if len(missing_columns) > 0:
-        raise Exception(f"Following columns are missing, please use the template file inside input folder: {missing_columns}")
-    
+    # all required columns are checked in one set difference
+    required_columns = set(template[0].keys())
+    required_columns.update(col.replace('{year}', f'Yr{year}') for col in YEAR_COLUMNS for year in range(1, years + 1))
     assembly_steps = int(reads[0]['AssemblySteps'])
-    for assembly_step in range(1, assembly_steps + 1):
-        validate_col(input_headers, f'AssyPerStepYield{assembly_step}')
-        validate_col(input_headers, f'AssyYield{assembly_step}')
-        validate_col(input_headers, f'AssemblySeq{assembly_step}')
-
-    for year in range(1, years + 1):
-        validate_col(input_headers, f'SubstrateUnitPriceYr{year}($)')
-        validate_col(input_headers, f'SubstrateUnitPriceYr{year}($)')
-        validate_col(input_headers, f'DefectDensityYr{year}(Defects/cm^2)')
-        validate_col(input_headers, f'WaferYieldYr{year}')
-        validate_col(input_headers, f'ForecastUnitPriceYr{year}($)')
-        validate_col(input_headers, f'ForecastDemandYr{year}')
-        validate_col(input_headers, f'PackageAssemblyCostYr{year}($)')
-        validate_col(input_headers, f'FinalPackageTestCostYr{year}($)')
-        validate_col(input_headers, f'FinalPackageTestYieldYr{year}')
-        validate_col(input_headers, f'SLTCostYr{year}($)')
-        validate_col(input_headers, f'SLTYieldYr{year}')
-        validate_col(input_headers, f'QualityYr{year}')
-        validate_col(input_headers, f'OperatingUnitCostYr{year}($)')
-        validate_col(input_headers, f'IpInterfaceCostYr{year}($)')
-        validate_col(input_headers, f'IpInterfaceCostYr{year}($)')
-        validate_col(input_headers, f'IpInterfaceCostAspYr{year}')
-        
-
-def validate_col(columns, column):
-    if column not in columns:
-        raise Exception(f"Following columns are missing, please use the template file inside input folder: {column}")
+    required_columns.update(col.replace('{step}', str(step)) for col in STEP_COLUMNS for step in range(1, assembly_steps + 1))
+
+    missing_columns = required_columns - input_headers
+    if len(missing_columns) > 0:
+        raise Exception(f"Following columns are missing, please use the template file inside input folder: {sorted(missing_columns)}")
+
+
+def model_options(args):
+    # options of a run which every evaluation of the model uses, e.g. the sensitivity and tail risk runs
+    return {key: args[key] for key in MODEL_OPTIONS if key in args}
+
+
+def update_params(args):
+    params.num_of_steps = args['steps']
+    params.num_of_simulations = args['simulations']
+    params.deterministic = args.get('deterministic', False)
+    params.rng = args.get('rng')
+    params.gdpw = args.get('gdpw', GDPW_APPROXIMATE)
 
 
 def cleanse(reads, args):
     input = []
     # Update the params values
-    params.num_of_steps = args['steps']
-    params.num_of_simulations = args['simulations']
+    update_params(args)
 
     years = args['years']
-    for row in reads:
+    for (row, record) in zip(reads, scenario_records(reads)):
         # Calculations not required for metadata row
         if meta_data_row(row):
             for year in range(1, years + 1):
                 row[f'AspYr{year}($)'] = get_asp(row, year)
+            metadata = record or compile_metadata(row)
+            row[RECORD] = metadata
             input.append(row)
             continue
 
-        row['EffA'] = calculate_effective_area(input, row)
-
-        # GDPW
-        row['GDPW'] = calculate_gdpw(row)
-
-        row['ProbeCost($)'] = float(
-            row['ProbeCost($)']) if row['ProbeCost($)'] else calculate_probe_cost(row)
+        # EffA, GDPW and probe cost
+        row[RECORD] = record or compile_die(metadata, row)
 
         for year in range(1, years + 1):
             # Wafer price
             row[f'WaferPriceYr{year}($)'] = calculate_wafer_price(row, year)
-            # Wafer Yield
-            row[f'WaferYieldYr{year}'] = calculate_wafer_yield(row, input[0], year)
+        input.append(row)
+    # exact counts of new die geometries written once per evaluation
+    gdpw_cache.flush()
 
+    # Wafer Yield for all dies and years in one batched call
+    calculate_wafer_yields(input, years)
+
+    for row in input:
+        if meta_data_row(row):
+            continue
+
+        for year in range(1, years + 1):
             # Forecast Unit Price ($) per die
             row[f'ForecastUnitPriceYr{year}($)'] = calculate_forcast_unit_price(row, year)
 
             row[f'ForecastDemandYr{year}'] = calculate_forcast_demand(row, year)
             # total operating cost
             forecast_demand = row[f'ForecastDemandYr{year}']
-            op_unit_cost = float(row[f'OperatingUnitCostYr{year}($)'])
+            op_unit_cost = get_value(row[f'OperatingUnitCostYr{year}($)'])
             row[f'OpCostYr{year}'] =  forecast_demand * op_unit_cost
 
             # Total IP Interface Cost
             # Total_Ip_Cost = IP_Cost + (IP_Pct_per_ASP * ASP) / 100 * FD
-            ip_cost = float(row[f'IpInterfaceCostYr{year}($)'])
-            ip_cost_per_asp = float(row[f'IpInterfaceCostAspYr{year}'])
+            ip_cost = get_value(row[f'IpInterfaceCostYr{year}($)'])
+            ip_cost_per_asp = get_value(row[f'IpInterfaceCostAspYr{year}'])
             asps = input[0][f'AspYr{year}($)']
             row[f'TotalIpInterfaceCostYr{year}'] =  calculate_total_ip_cost(ip_cost, ip_cost_per_asp, forecast_demand, asps)
 
@@ -119,7 +160,7 @@ def cleanse(reads, args):
             row[f'MatCostYr{year}'] = calculate_mat_cost(forecast_unit_prices, forecast_demand)
 
             # Field Quality Cost
-            field_quality_fr = float(row[f'QualityYr{year}'])
+            field_quality_fr = get_value(row[f'QualityYr{year}'])
             row[f'QualityCostYr{year}'] = calculate_quality_cost(field_quality_fr, forecast_unit_prices, forecast_demand)
 
             # mask set cost and nre
@@ -127,8 +168,7 @@ def cleanse(reads, args):
             # row[f'Nre{year}'] = get_nre(row, year)
 
             # test cost
-            row[f'TestCost{year}'] = get_test_cost(input, row[f'WaferYieldYr{year}'])
-        input.append(row)
+            row[f'TestCost{year}'] = get_test_cost(metadata, row[f'WaferYieldYr{year}'])
 
     return input
 
@@ -142,42 +182,69 @@ def calculate_total_ip_cost(ip_cost, ip_cost_per_asp, demands, asps):
     return (asps * ip_cost_per_asp) * demands + ip_cost
 
 def calculate_wafer_price(row, year):
-    if row['DeviceType'] == DEVICE_TYPE_SUBSTRATE:
+    if row[RECORD].device_type == DEVICE_TYPE_SUBSTRATE:
         return get_transformed_matrix(0)
 
     if year == 1:
-        if "-" not in row['WaferPriceYr1($)']:
-            return get_transformed_matrix(float(row['WaferPriceYr1($)']))
-        
-        return get_normal_distribution(row['WaferPriceYr1($)'])
+        return get_sampled_value(row['WaferPriceYr1($)'])
 
     wf_col = f'WaferPriceYr{year}($)'
-    if row[wf_col]:
-        if "-" not in row[wf_col]:
-            return get_transformed_matrix(float(row[wf_col]))
-        
-        return get_normal_distribution(row[wf_col])
+    if not is_blank(row[wf_col]):
+        return get_sampled_value(row[wf_col])
     
     wafer_prices = row[f'WaferPriceYr{year - 1}($)']
-    discount_rate = float(row['WaferPriceAnnualDiscountFactor(%)'])
+    discount_rate = get_value(row['WaferPriceAnnualDiscountFactor(%)'])
     return wafer_prices * (1 - discount_rate/100)
 
 def calculate_forcast_demand(row, year):
-    fd = row[f'ForecastDemandYr{year}']
-    if "-" not in fd:
-        return get_transformed_matrix(int(fd))
-    
-    return get_normal_distribution(row[f'ForecastDemandYr{year}'])
+    return get_sampled_value(row[f'ForecastDemandYr{year}'], int)
+
+
+def scenario_records(reads):
+    # records shared by all runs of a scenario and gdpw method, None for those compiled by each run
+    if isinstance(reads, ScenarioRows):
+        return reads.view.compiled((RECORD, params.gdpw), RECORD_COLUMNS, compile_records)
+    return [None] * len(reads)
+
 
+def compile_records(rows):
+    """Metadata or Die record of every row.
 
-def calculate_effective_area(input, row):
+    A record with a stochastic cell depends on the draws of each run, it is
+    None and left to cleanse, like the dies of a stochastic metadata row.
+    """
+    records = []
+    for row in rows:
+        if any(is_stochastic(row.get(col)) for col in RECORD_COLUMNS):
+            records.append(None)
+        elif meta_data_row(row):
+            records.append(compile_metadata(row))
+        else:
+            records.append(compile_die(records[0], row) if records[0] is not None else None)
+    gdpw_cache.flush()
+    return records
+
+
+def compile_metadata(row):
+    # numeric fields are parsed and looked up once per scenario instead of once per die and year
+    return Metadata(yield_model=row['YieldModel'], cluster_parameter=get_value(row.get('ClusterParameter'), DEFAULT_CLUSTER_PARAMETER),
+                    rec_baseline=int(row['RecBaseline']), rec_spares=int(row['RecSpares']), rec_area=int(row['RecArea']),
+                    assembly_steps=int(row['AssemblySteps']),
+                    **{name: get_value(row[col]) for (name, col) in METADATA_TEST_COLUMNS.items()})
+
+
+def compile_die(metadata, row):
+    die = Die(sn=row['SN'], device_type=row['DeviceType'], dimension_x=float(row['DimensionX']), dimension_y=float(row['DimensionY']),
+              saw_street=float(row['SawStreet(mm)']), wafer_size=float(row['WaferSize(mm)']), critical_layers=float(row['N'] or 1))
+    die.eff_area = calculate_effective_area(metadata, die)
+    die.gdpw = calculate_gdpw(die)
+    die.probe_cost = get_value(row['ProbeCost($)']) if not is_blank(row['ProbeCost($)']) else calculate_probe_cost(row, die)
+    return die
+
+
+def calculate_effective_area(metadata, die):
     # EffA = (L + ss ) x (W + ss ) + rec_area * rec_spares Effective Area of each die
-    L = float(row['DimensionX'])
-    W = float(row['DimensionY'])
-    ss = float(row['SawStreet(mm)'])
-    rec_spares = int(input[0]['RecSpares'])
-    rec_area = int(input[0]['RecArea'])
-    return (L + ss) * (W + ss) + rec_area * rec_spares
+    return (die.dimension_x + die.saw_street) * (die.dimension_y + die.saw_street) + metadata.rec_area * metadata.rec_spares
 
 
 def meta_data_row(row):
@@ -185,43 +252,65 @@ def meta_data_row(row):
     return device_type is None or device_type == ''
 
 # GDPW = ((Wfr - 6) * PI * (Wfr / (4 * EffA) - 1 / sqrt(2 * EffA)))
-def calculate_gdpw(row):
-    if float(row['DimensionX']) == 0 or float(row['DimensionY']) == 0:
+def calculate_gdpw(die):
+    if die.dimension_x == 0 or die.dimension_y == 0:
         return 0
-    wfr = float(row['WaferSize(mm)'])
-    return round((wfr - 6) * math.pi * ((wfr / (4 * row['EffA'])) - (1 / math.sqrt(2 * row['EffA']))), 0)
+    if params.gdpw == GDPW_EXACT:
+        # whole dies placed on the wafer, counted once per geometry
+        return gdpw_cache.get(die.dimension_x, die.dimension_y, die.saw_street, die.wafer_size, die.eff_area)
+    wfr = die.wafer_size
+    return round((wfr - 6) * math.pi * ((wfr / (4 * die.eff_area)) - (1 / math.sqrt(2 * die.eff_area))), 0)
 
 
-def calculate_probe_cost(row):
-    if row['DeviceType'] == DEVICE_TYPE_SUBSTRATE:
+def calculate_probe_cost(row, die):
+    if die.device_type == DEVICE_TYPE_SUBSTRATE:
         return 0
 
-    return float(row['ProberRate($/hr)']) * ((float(row['Insrtn1']) / 3600) / float(row['Sites1']) + (float(row['Insrtn2']) / 3600) / float(row['Sites2']))
+    return get_value(row['ProberRate($/hr)']) * ((get_value(row['Insrtn1']) / 3600) / get_value(row['Sites1']) + (get_value(row['Insrtn2']) / 3600) / get_value(row['Sites2']))
 
 
-def calculate_wafer_yield(row, metadata, year):
-    wafer_yield = row[f'WaferYieldYr{year}']
-    if wafer_yield:
-        if "-" not in wafer_yield:
-            return get_transformed_matrix(float(wafer_yield))
-        
-        return get_normal_distribution(wafer_yield)
-    
+def calculate_wafer_yields(input, years):
+    """Fill in `WaferYieldYr{year}` for every die and year.
+
+    Explicit yields are taken as given, the rest are modelled from the defect
+    density. Model yields for all dies, years and samples are evaluated by a
+    single kernel call on the stacked defect density samples.
+    """
+    metadata = input[0][RECORD]
+    modelled = []
+    for row in input[1:]:
+        for year in range(1, years + 1):
+            wafer_yield = row[f'WaferYieldYr{year}']
+            if is_blank(wafer_yield):
+                modelled.append((row, year))
+            else:
+                row[f'WaferYieldYr{year}'] = get_sampled_value(wafer_yield)
+
+    if len(modelled) == 0:
+        return
+
     model = get_yield_model(metadata)
-    defect_density = get_defect_density(row[f'DefectDensityYr{year}(Defects/cm^2)'])
-    model_yield_fn = calculate_murphy_yield if model == MURPHY_MODEL else calculate_bose_einstein_yield
-    model_yield = model_yield_fn(row, defect_density)
+    defect_density = np.stack(np.broadcast_arrays(*[get_defect_density(
+        row[f'DefectDensityYr{year}(Defects/cm^2)']) for (row, year) in modelled]))
+    # per die geometry, shaped to broadcast against the stacked samples
+    geometry_shape = (len(modelled),) + (1,) * (defect_density.ndim - 1)
+    eff_area = np.reshape([row[RECORD].eff_area for (row, _) in modelled], geometry_shape)
+    critical_layers = np.reshape([row[RECORD].critical_layers for (row, _) in modelled], geometry_shape)
+
+    model_yield = calculate_model_yield(model, defect_density, eff_area, critical_layers, metadata.cluster_parameter)
     rec_yield = calculate_rec_yield(metadata, defect_density)
-    
-    return model_yield + rec_yield
+    wafer_yields = model_yield + rec_yield
+
+    for i, (row, year) in enumerate(modelled):
+        row[f'WaferYieldYr{year}'] = wafer_yields[i]
 
 
-def calculate_murphy_yield(row, defect_density):
-    return ((1 - math.exp(-defect_density * row['EffA'] * 0.01)) / (defect_density * row['EffA'] * 0.01)) ** 2
+def calculate_murphy_yield(die, defect_density):
+    return calculate_model_yield(MURPHY_MODEL, defect_density, die.eff_area)
 
 
-def calculate_bose_einstein_yield(row, defect_density):
-    return (1.0 / (1 + defect_density * row['EffA'] * 0.01)) ** int(row['N'])
+def calculate_bose_einstein_yield(die, defect_density):
+    return calculate_model_yield(BOSE_EINSTEIN_MODEL, defect_density, die.eff_area, int(die.critical_layers))
 
 
 # Yield Adjusted Forcast Unit Price
@@ -229,14 +318,15 @@ def calculate_bose_einstein_yield(row, defect_density):
 # For Device Type = Substrace, FUP = SubsCost = SubsUnitPrice/WaferYield
 def calculate_forcast_unit_price(row, year):
     fup = row[f'ForecastUnitPriceYr{year}($)']
-    if fup:
-        return get_transformed_matrix(float(fup))
-    
-    return calculate_substrate_fup(row, year) if row['DeviceType'] == DEVICE_TYPE_SUBSTRATE else calculate_active_fup(row, year) + row['ProbeCost($)']
+    if not is_blank(fup):
+        return get_sampled_value(fup)
+
+    die = row[RECORD]
+    return calculate_substrate_fup(row, year) if die.device_type == DEVICE_TYPE_SUBSTRATE else calculate_active_fup(row, year) + die.probe_cost
 
 
 def calculate_active_fup(row, year):
-    gdpw = row['GDPW']
+    gdpw = row[RECORD].gdpw
     if gdpw == 0:
         return 0
     pWafer = row[f'WaferPriceYr{year}($)']
@@ -245,108 +335,111 @@ def calculate_active_fup(row, year):
 
 
 def calculate_substrate_fup(row, year):
-    subs_unit_price = get_transformed_matrix(float(row[f'SubstrateUnitPriceYr{year}($)'] or '0'))
+    subs_unit_price = get_sampled_value(row[f'SubstrateUnitPriceYr{year}($)'], default=0.0)
     subs_yield = row[f'WaferYieldYr{year}']
     return subs_unit_price/subs_yield
 
 
 def get_defect_density(dd):
-    if "-" not in dd:
-        return get_transformed_matrix(float(dd))
-    return get_normal_distribution(dd)
+    return get_sampled_value(dd)
 
 
 def get_asp(row, year):
-    asp = row[f'AspYr{year}($)']
-    if "-" not in asp:
-        return get_transformed_matrix(float(asp))
-    
-    return get_normal_distribution(row[f'AspYr{year}($)'])
+    return get_sampled_value(row[f'AspYr{year}($)'])
 
 
 def get_yield_model(metadata):
-    model = metadata['YieldModel']
-
-    if model != MURPHY_MODEL and model != BOSE_EINSTEIN_MODEL:
-        raise Exception('Yield model should be one of Murphy or Bose Einstein')
-
+    model = metadata.yield_model
+    # raises if the model is unknown
+    get_yield_kernel(model)
     return model
 
 
 def get_nre(row, year):
     nre = row['NRE($)']
-    if year > 1 or nre is None or nre == '':
+    if year > 1 or is_blank(nre):
         return 0.0
-    if "-" in nre:
-        return get_normal_distribution(nre)
-    return get_transformed_matrix(float(nre))
+    return get_sampled_value(nre)
 
 
 def get_mask_set_cost(row, year):
     if year > 1:
         return 0.0
-    return float(row['MaskSetCost'] or '0')
+    return get_value(row['MaskSetCost'], 0.0)
 
 
 def calculate_rec_yield(metadata, dd):
-    k = int(metadata['RecSpares'])
-    n = int(metadata['RecBaseline']) + int(metadata['RecSpares'])
-    p = int(metadata['RecArea']) / 100 * dd
-    return comb(n, k) * p**k * (1 - p)**(n - k)
-
-def wafer_sort_test_cost(input, yield_i):
-    ws_a = float(input[0]['WSa($/hr)']) # Wafer sort automated test equipment loaded rate
-    ws_h = float(input[0]['WSh($/hr)']) # Wafer sort prober loaded rate ($/hr)
-    ws_ci = float(input[0]['WSci'])     # Wafer Sort insertion per unit
-    ws_di = float(input[0]['WSdi'])     # Probe (Wafer Sort) time duration per insertion
-    ws_xi = float(input[0]['WSxi'])     # Wafer sort test coverage
-    ws_ri = float(input[0]['WSri'])     # Wafer sort retest attempts for failing unit
-    return ((ws_a + ws_h) / 3600) * (ws_di * ws_ci + (1 - yield_i * ws_xi) * ws_di * ws_ri)
-
-def final_test_cost(input, yield_i):
-    ft_a = float(input[0]['FTa($/hr)']) 
-    ft_h = float(input[0]['FTh($/hr)']) # final test handler loaded rate
-    ws_xi = float(input[0]['WSxi'])     # Wafer sort test coverage
-    ft_xi = float(input[0]['FTxi'])
-    ft_di = float(input[0]['FTdi'])
-    ft_ri = float(input[0]['FTri'])
-    ft_ci = float(input[0]['FTci'])
-    return ((ft_a + ft_h) / 3600) * (ft_ci * ft_di + (1 - yield_i * (ws_xi - ft_xi)) * (ft_ri * ft_di))
-
-def slt_test_cost(input, yield_i):
-    slt_a = float(input[0]['SLTa($/hr)']) 
-    slt_h = float(input[0]['SLTh($/hr)']) # final test handler loaded rate
-    slt_di = float(input[0]['SLTdi'])   # system level test duration per unit
-    ftx_i = float(input[0]['FTxi'])
-    return ((slt_a + slt_h) / 3600) * (slt_di * (yield_i + (1 - yield_i) * (1 - ftx_i)))
-
-def get_test_cost(input, yield_i):
-    return wafer_sort_test_cost(input, yield_i) + final_test_cost(input, yield_i) + slt_test_cost(input, yield_i)
-
-def get_normal_distribution(range_val):
-    first, second = range_val.split("-")
-    low, high = float(first), float(second)
-    avg = (low + high) / 2
-    sd = avg / 10
-    return np.random.normal(avg, sd, size = (params.num_of_steps, params.num_of_simulations))
+    return calculate_redundancy_yield(dd, metadata.rec_baseline, metadata.rec_spares, metadata.rec_area)
+
+def wafer_sort_test_cost(metadata, yield_i):
+    return ((metadata.ws_a + metadata.ws_h) / 3600) * (
+        metadata.ws_di * metadata.ws_ci + (1 - yield_i * metadata.ws_xi) * metadata.ws_di * metadata.ws_ri)
+
+def final_test_cost(metadata, yield_i):
+    return ((metadata.ft_a + metadata.ft_h) / 3600) * (
+        metadata.ft_ci * metadata.ft_di + (1 - yield_i * (metadata.ws_xi - metadata.ft_xi)) * (metadata.ft_ri * metadata.ft_di))
+
+def slt_test_cost(metadata, yield_i):
+    return ((metadata.slt_a + metadata.slt_h) / 3600) * (metadata.slt_di * (yield_i + (1 - yield_i) * (1 - metadata.ft_xi)))
+
+def get_test_cost(metadata, yield_i):
+    return wafer_sort_test_cost(metadata, yield_i) + final_test_cost(metadata, yield_i) + slt_test_cost(metadata, yield_i)
+
+def is_blank(val):
+    return val is None or (isinstance(val, str) and val == '')
+
+
+def is_stochastic(val):
+    # distributions are sampled on read, arrays are samples already drawn by the caller
+    return is_distribution(val) or isinstance(val, np.ndarray)
+
+
+def get_value(val, default=None):
+    """Numeric value of a cell, the samples if it is stochastic."""
+    if is_blank(val) and default is not None:
+        return default
+    if isinstance(val, np.ndarray):
+        return val
+    if is_distribution(val):
+        return val.sample((params.num_of_steps, params.num_of_simulations), params.rng)
+    return float(val)
+
+
+def get_sampled_value(val, cast=float, default=None):
+    if is_stochastic(val):
+        return get_value(val)
+    return get_transformed_matrix(cast(get_value(val, default)))
+
 
 def get_transformed_matrix(val):
+    if params.deterministic:
+        return val
     return np.array([[val] * params.num_of_simulations] * params.num_of_steps)
 
-def simulation(input, years):
-    for row in input:
-        if meta_data_row(row):
-            for year in range(1, years + 1):
-                asp = row[f'AspYr{year}($)']
-                if "-" in asp:
-                    return True
 
-        for year in range(1, years + 1):
-            dd = row[f'DefectDensityYr{year}(Defects/cm^2)']
-            wafer_yield = row[f'WaferYieldYr{year}']
-            wafer_price = row[f'WaferPriceYr{year}($)']
-            forecast_demad = row[f'ForecastDemandYr{year}']
+def column_year(col):
+    # year of a per year column e.g. 2 for 'WaferYieldYr2', None for other columns
+    match = YEAR_PATTERN.search(col)
+    return int(match.group(1)) if match else None
+
+
+def column_template(col):
+    return YEAR_PATTERN.sub('{year}', col, count=1)
+
+
+def is_constant_column(col):
+    return col in TEXT_COLUMNS or re.sub(r'\d+$', '{step}', col) in CONSTANT_COLUMNS
 
-            if "-" in dd or "-" in wafer_yield or "-" in wafer_price or "-" in forecast_demad:
-                return True
-    return False
\ No newline at end of file
+
+def stochastic_cells(input, years):
+    """(row index, column) of every stochastic cell within the horizon."""
+    cells = []
+    for (i, row) in enumerate(input):
+        for (col, val) in row.items():
+            if is_stochastic(val) and (column_year(col) or 0) <= years:
+                cells.append((i, col))
+    return cells
+
+
+def simulation(input, years):
+    return len(stochastic_cells(input, years)) > 0
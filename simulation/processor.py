@@ -15,12 +15,22 @@
  """
 
 import numpy as np
-from preprocessor import cleanse
-from preprocessor import DEVICE_TYPE_SUBSTRATE, meta_data_row
+from preprocessor import cleanse, simulation, update_params
+from preprocessor import ASSEMBLY_TREE_COLUMN, DEVICE_TYPE_SUBSTRATE, get_value, is_blank, meta_data_row
+from records import RECORD
+from sampling import draw_ranged_inputs
 from writer import create_row, write_to_file
 
+# Per year sample arrays kept in the summary
+SAMPLE_CATEGORIES = ['operating_cost', 'ip_interface_cost', 'misc_cost', 'quality_cost',
+                     'material_cost', 'assy_scrap', 'total_cost', 'total_unit_cost']
+
 def calculate_summary(read, args):
     years = args['years']
+    # evaluate on scalars instead of (steps x simulations) matrices when no input is ranged
+    args = dict(args, deterministic=not simulation(read, years))
+    update_params(args)
+    input_draws = draw_ranged_inputs(read, years, args.get('correlations'))
     input = cleanse(read, args)
 
     operating_cost = calculate_cost(input, 'OpCostYr', years)
@@ -49,77 +59,99 @@ def calculate_summary(read, args):
                                            mask_cost, nre, subs_cost, test_cost)
 
     total_unit_cost_arr = calculate_total_unit_cost(input, total_cost, years)
+    samples = {
+        'operating_cost': operating_cost,
+        'ip_interface_cost': ip_interface_cost,
+        'misc_cost': misc_cost,
+        'quality_cost': quality_cost,
+        'material_cost': material_cost,
+        'assy_scrap': assy_scrap,
+        'total_cost': total_cost,
+        'total_unit_cost': total_unit_cost_arr
+    }
+    summary = summarize_samples(samples, mask_cost, nre, asp)
+    summary['input_draws'] = input_draws
+    return summary
+
+
+def summarize_samples(samples, mask_cost, nre, asp):
     # Preparing values for summary output
+    # `samples` holds a list per year for each of SAMPLE_CATEGORIES, either
+    # computed by calculate_summary or memory mapped from an earlier run
     return {
-        'operating_costs': find_xy_mean(operating_cost),
-        'ip_interface_costs': find_xy_mean(ip_interface_cost),
-        'misc_costs': find_xy_mean(misc_cost),
-        'quality_costs': find_xy_mean(quality_cost),
-        'material_costs': find_xy_mean(material_cost),
-        'assy_scraps': find_xy_mean(assy_scrap),
-        'total_costs': find_xy_mean(total_cost),
-        'total_unit_cost_arr': total_unit_cost_arr,
-        'total_unit_costs': find_xy_mean(total_unit_cost_arr), 
-        'mask_costs': mask_cost,
-        'nre': nre,
-        'asp': asp
+        'operating_costs': find_xy_mean(samples['operating_cost']),
+        'ip_interface_costs': find_xy_mean(samples['ip_interface_cost']),
+        'misc_costs': find_xy_mean(samples['misc_cost']),
+        'quality_costs': find_xy_mean(samples['quality_cost']),
+        'material_costs': find_xy_mean(samples['material_cost']),
+        'assy_scraps': find_xy_mean(samples['assy_scrap']),
+        'total_costs': find_xy_mean(samples['total_cost']),
+        'total_unit_cost_arr': samples['total_unit_cost'],
+        'total_unit_costs': find_xy_mean(samples['total_unit_cost']),
+        'mask_costs': find_scalar_mean(mask_cost),
+        'nre': find_scalar_mean(nre),
+        'asp': asp,
+        'samples': samples
     }
 
 
 def filter_metadata_row(input):
     return filter(lambda row: meta_data_row(row) == False, input)
 
-def calculate_assy_scrap(input, years=5):
+def assembly_incidence(input):
+    """Assembly incidence matrix (assembly steps x dies) and the yield of each step.
 
-    assy = []
-    assy_yield = []
-    numOfAssemblySteps = int(input[0]['AssemblySteps'])
-    #  we create 2D matrix of assemby seq of (i x assembly_steps)
+    Only the dies with a dimension are assembled. With an assembly tree the
+    steps are the nodes of the tree.
+    """
+    dies = list(filter_metadata_row(input))
+    assembly_tree = input[0].get(ASSEMBLY_TREE_COLUMN)
+    if assembly_tree is not None:
+        incidence, assy_yield = assembly_tree.incidence([row[RECORD].sn for row in dies])
+        return incidence * [row[RECORD].assembled() for row in dies], assy_yield
+
+    numOfAssemblySteps = input[0][RECORD].assembly_steps
+    #  2D matrix of assembly seq of (assembly_steps x i)
     # [[ 1. 1 . . . to i]
     #  [ 1. 1 . . . to i]
-    #  [ 1. 1 . . . to i]
     #   . . . to num of assembly steps
     #  [ 1. 1 . . . to i]]
-    for i in range(1, numOfAssemblySteps + 1):
-        assy_col = f'AssemblySeq{i}'
-        # only the assembly sequence with dimension should be considered
-        assy_i = list(map(lambda row: int(row[assy_col]) if float(row['DimensionX']) > 0 and float(
-            row['DimensionY']) > 0 else 0, filter_metadata_row(input)))
-        assy.append(assy_i)
+    incidence = np.zeros((numOfAssemblySteps, len(dies)))
+    for (k, row) in enumerate(dies):
+        if row[RECORD].assembled():
+            incidence[:, k] = [int(row[f'AssemblySeq{i}']) for i in range(1, numOfAssemblySteps + 1)]
 
-        # assy and assy_per_step_yield should have same column numbers
+    assy_yield = []
+    for i in range(1, numOfAssemblySteps + 1):
         # if assy_yield is provided, then do not calculate it
         input_assy_yield = input[0][f'AssyYield{i}']
-        assy_yield_i = float(input_assy_yield) if input_assy_yield else float(
-            input[0][f'AssyPerStepYield{i}']) ** sum(assy_i)
+        assy_yield_i = get_value(input_assy_yield) if not is_blank(input_assy_yield) else get_value(
+            input[0][f'AssyPerStepYield{i}']) ** incidence[i - 1].sum()
         assy_yield.append(assy_yield_i)
 
-    assy_scraps = []
+    return incidence, assy_yield
 
-    for year in range(1, years + 1):
-        #  we create 3D matrix of material cost for each die (i x NUM_OF_STEPS x NUM_OF_SIMULATIONS)
-        # [[[ 3493250. 4863525. . . to NUM_OF_SIMULATIONS 22089000.], [ 3493250. 4863525. . . to NUM_OF_SIMULATIONS 22089000.]
-        #   [ 3493250. 4863525. . . to NUM_OF_SIMULATIONS 22089000.], [ 3493250. 4863525. . . to NUM_OF_SIMULATIONS 22089000.]
-        #    ..... to NUM of REPS],
-        #  [[ 3493250. 4863525. . . to NUM_OF_SIMULATIONS 22089000.], [ 3493250. 4863525. . . to NUM_OF_SIMULATIONS 22089000.]
-        #   [ 3493250. 4863525. . . to NUM_OF_SIMULATIONS 22089000.], [ 3493250. 4863525. . . to NUM_OF_SIMULATIONS 22089000.]
-        #    ..... to NUM of REPS]
-        #  ... to i ]
-        
-        mat_cost_col = f'MatCostYr{year}'
-        mat_cost = list(map(lambda row: row[mat_cost_col], filter_metadata_row(input)))
-        assy_scrap_t = []
-        # for each assembly sequence, find sum product and add to find scrap cost for given time t
-        for j in range(0, len(assy)):
-            assy_j = assy[j]
-                # [ 1. 1 . . . to NUM_OF_STEPS 0.], [ 1. 1 . . . to NUM_OF_STEPS 0.] ... to i
-            assy_yield_j = assy_yield[j]
-            assy_scrap_j = sum(list(mat_cost[k] * assy_seq for (k, assy_seq) in enumerate(assy_j))) * (1 - assy_yield_j)
-            assy_scrap_t.append(assy_scrap_j)
-
-        assy_scraps.append(sum(assy_scrap_t))
-
-    return assy_scraps
+
+def calculate_assy_scrap(input, years=5):
+    incidence, assy_yield = assembly_incidence(input)
+    # dies which are not assembled in any step don't add to the scrap
+    assembled = np.flatnonzero(incidence.any(axis=0))
+    if len(assembled) == 0:
+        return [0.0] * years
+
+    dies = list(filter_metadata_row(input))
+    #  material cost tensor of the assembled dies (i x years x NUM_OF_STEPS x NUM_OF_SIMULATIONS),
+    #  scalars in the deterministic case (i x years)
+    mat_cost = np.stack(np.broadcast_arrays(*[dies[k][f'MatCostYr{year}'] for k in assembled for year in range(1, years + 1)]))
+    mat_cost = mat_cost.reshape((len(assembled), years) + mat_cost.shape[1:])
+
+    # scrap = sum over steps of (1 - yield) * material cost of the dies assembled in the step,
+    # one contraction of the incidence matrix with the material cost tensor
+    step_mat_cost = np.tensordot(incidence[:, assembled], mat_cost, axes=1)
+    scrap_rate = np.stack(np.broadcast_arrays(*[1 - assy_yield_j for assy_yield_j in assy_yield]))
+    # steps x 1 (years) x sample axes of the material cost
+    scrap_rate = scrap_rate.reshape((len(assy_yield), 1) + scrap_rate.shape[1:] + (1,) * (step_mat_cost.ndim - scrap_rate.ndim - 1))
+    return list((step_mat_cost * scrap_rate).sum(axis=0))
 
 
 def calculate_cost(input, colName, years=5):
@@ -149,8 +181,7 @@ def calculate_misc_cost(input, years=5):
     misc_costs = []
     substrate_row = get_substrate_row(input)
     for year in range(1, years + 1):
-        package_assy_cost = float(
-            input[0][f'PackageAssemblyCostYr{year}($)'] or '0')
+        package_assy_cost = get_value(input[0][f'PackageAssemblyCostYr{year}($)'], 0.0)
         forecast_demand = substrate_row[f'ForecastDemandYr{year}']
         misc_costs.append(forecast_demand * package_assy_cost)
 
@@ -162,8 +193,8 @@ def calculate_total_cost(input, years, misc_costs, assy_scraps, total_mat_costs,
     total_costs = []
     
     for i in range(0, years):
-        fpty = float(input[0][f'FinalPackageTestYieldYr{i + 1}'])
-        slt = float(input[0][f'SLTYieldYr{i + 1}'])
+        fpty = get_value(input[0][f'FinalPackageTestYieldYr{i + 1}'])
+        slt = get_value(input[0][f'SLTYieldYr{i + 1}'])
         total_cost = misc_costs[i] + test_costs[i] + mask_costs[i] + assy_scraps[i] + (
                 total_mat_costs[i] + subs_costs[i]) * (1 + (1 - fpty) + (1 - slt) * fpty) + total_op_costs[i] + total_quality_costs[i] + total_ip_interface_costs[i] + nre[i]
         total_costs.append(total_cost)
@@ -219,26 +250,48 @@ def calculate_asp(input, numOfYears):
     asps = []
     for year in range(1, numOfYears + 1):
         asp = input[0][f'AspYr{year}($)']
-        asps.append(asp.mean())
+        asps.append(np.mean(asp))
 
     return asps
 
 def calculate_nre_cost(input, numOfYears):
     nre = [0] * numOfYears
-    nre[0] = sum(list(map(lambda row: float(row['NRE($)'] or '0'), input)))
+    nre[0] = sum(list(map(lambda row: get_value(row['NRE($)'], 0.0), input)))
     return nre
 
+def find_scalar_mean(lst):
+    # one off costs are constants unless their inputs are stochastic
+    return [np.mean(cost) if isinstance(cost, np.ndarray) else cost for cost in lst]
+
 def find_xy_mean(lst):
-    return np.average(find_x_mean(lst), axis = 1)
+    return np.array(list(map(lambda arr: np.mean(arr), find_x_mean(lst))))
 
 def find_y_mean(lst):
-    return list(map(lambda arr: arr.mean(axis = 1), lst))
+    return list(map(lambda arr: np.atleast_2d(arr).mean(axis = 1), lst))
 
 def find_x_mean(lst):
-    return list(map(lambda arr: arr.mean(axis = 0), lst))
+    # scalar values come from the deterministic evaluation path
+    return list(map(lambda arr: np.atleast_2d(arr).mean(axis = 0), lst))
+
+
+def find_unit_cost_diff_distribution(summary_from, summary_to):
+    # per year and simulation mean over the steps of the unit cost difference
+    # (to - from), computed per option so memory mapped samples are streamed
+    return [np.broadcast_to(mean_to - mean_from, np.broadcast_shapes(mean_from.shape, mean_to.shape))
+            for (mean_from, mean_to) in zip(find_x_mean(summary_from['total_unit_cost_arr']), find_x_mean(summary_to['total_unit_cost_arr']))]
+
+
+def calculate_unit_cost_diff(summary_from, summary_to):
+    # per year difference of the sampled total unit costs (to - from), scalar
+    # summaries of deterministic runs broadcast against sampled ones
+    return [cost_to - cost_from for (cost_from, cost_to) in zip(summary_from['total_unit_cost_arr'], summary_to['total_unit_cost_arr'])]
 
 
 def write_summary(summaryA, summaryB, years):
+    write_to_file(create_summary(summaryA, summaryB, years), years)
+
+
+def create_summary(summaryA, summaryB, years):
 
     material_costsA = summaryA['material_costs']
     material_costsB = summaryB['material_costs']
@@ -330,8 +383,8 @@ def write_summary(summaryA, summaryB, years):
     summary.append(create_row('Gross Margin(%)', calculate_gross_margin_percent(
         gross_marginsA, aspA), calculate_gross_margin_percent(gross_marginsB, aspB), years))
     
-    total_unit_cost_diff = np.array(summaryB['total_unit_cost_arr']) - np.array(summaryA['total_unit_cost_arr'])
-    # print(find_xy_mean(total_unit_cost_diff))
-    summary.append(create_row('Cost Difference(Option2 - Option1)', find_xy_mean(total_unit_cost_diff), [
+    # the mean of the difference is the difference of the means
+    total_unit_cost_diff = np.array(total_unit_costB) - np.array(total_unit_costA)
+    summary.append(create_row('Cost Difference(Option2 - Option1)', total_unit_cost_diff, [
                    ''] * years, years))
-    write_to_file(summary, years)
\ No newline at end of file
+    return summary
\ No newline at end of file
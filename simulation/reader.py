@@ -15,11 +15,157 @@
  """
 
 import csv
+import re
+
+from assembly import read_assembly_tree
+from distributions import compile_value, is_distribution
+from preprocessor import ASSEMBLY_TREE_COLUMN, STEP_COLUMNS, TEXT_COLUMNS, column_year, is_constant_column
+
+# Long format columns, one line per SN, attribute and year or assembly step
+LONG_SN = 'SN'
+LONG_ATTRIBUTE = 'Attribute'
+LONG_YEAR = 'Year'
+LONG_STEP = 'Step'
+LONG_VALUE = 'Value'
+LONG_COLUMNS = [LONG_SN, LONG_ATTRIBUTE, LONG_YEAR, LONG_STEP, LONG_VALUE]
+
+STEP_PATTERN = re.compile('({})(\\d+)$'.format('|'.join(col.replace('{step}', '') for col in STEP_COLUMNS)))
 
 def readFile(fileName):
     input = []
     with open('inputs/' + fileName) as file:
         reader = csv.DictReader(file)
+        if is_long_format(reader.fieldnames):
+            return read_long_format(reader)
         for row in reader:
-            input.append(row)
+            input.append(compile_row(row))
     return input
+
+
+def assembly_tree_files(fileName):
+    # assembly tree files named by the metadata of an input file, which reading it also reads
+    with open('inputs/' + fileName) as file:
+        reader = csv.DictReader(file)
+        if is_long_format(reader.fieldnames):
+            values = [record[LONG_VALUE] for record in reader if record[LONG_ATTRIBUTE] == ASSEMBLY_TREE_COLUMN]
+        else:
+            values = [row.get(ASSEMBLY_TREE_COLUMN) for row in reader]
+    return sorted(set(value for value in values if value))
+
+
+def is_long_format(fieldnames):
+    return fieldnames is not None and LONG_ATTRIBUTE in fieldnames and LONG_VALUE in fieldnames
+
+
+def year_column(attribute, year):
+    # 'WaferPrice($)' and year 2 is the wide column 'WaferPriceYr2($)'
+    unit = attribute.find('(')
+    return f'{attribute}Yr{year}' if unit < 0 else f'{attribute[:unit]}Yr{year}{attribute[unit:]}'
+
+
+def long_column(record):
+    attribute = record[LONG_ATTRIBUTE]
+    if record.get(LONG_YEAR):
+        return year_column(attribute, int(record[LONG_YEAR]))
+    if record.get(LONG_STEP):
+        return f'{attribute}{int(record[LONG_STEP])}'
+    return attribute
+
+
+def read_long_format(records):
+    """Build the rows from long format records in a single pass.
+
+    Rows are keyed by SN, the metadata row (blank SN) comes first and the
+    dies follow in the order of their first record. Cells which are not given are blank: a per year (per step) attribute
+    has the columns for all years (steps) up to the largest one given, and
+    an attribute which is blank for every row only needs a single line with
+    an empty Value. Attributes not given at all are reported by validate.
+    """
+    rows = {}
+    year_attributes = set()
+    step_attributes = set()
+    years = 0
+    steps = 0
+    for record in records:
+        sn = record[LONG_SN] or ''
+        col = long_column(record)
+        row = rows.setdefault(sn, {'SN': sn, 'DeviceType': ''})
+        if record.get(LONG_YEAR):
+            year_attributes.add(record[LONG_ATTRIBUTE])
+            years = max(years, int(record[LONG_YEAR]))
+        elif record.get(LONG_STEP):
+            step_attributes.add(record[LONG_ATTRIBUTE])
+            steps = max(steps, int(record[LONG_STEP]))
+        if row.get(col) and col not in ('SN', 'DeviceType'):
+            raise Exception(f'Duplicate value for SN {sn or "(metadata)"}: {col}')
+        row[col] = record[LONG_VALUE]
+
+    # the metadata row is input[0] wherever its records are in the file
+    rows = [rows[sn] for sn in sorted(rows, key=lambda sn: sn != '')]
+    columns = {}
+    for row in rows:
+        columns.update(dict.fromkeys(row))
+    columns.update(dict.fromkeys(year_column(attribute, year) for attribute in year_attributes for year in range(1, years + 1)))
+    columns.update(dict.fromkeys(f'{attribute}{step}' for attribute in step_attributes for step in range(1, steps + 1)))
+    return [compile_row({col: row.get(col, '') for col in columns}) for row in rows]
+
+
+def to_long_format(read):
+    """Long format records of raw wide rows.
+
+    Blank cells are left out, except for a single blank record of a column
+    which is blank for every row, so that the column is kept.
+    """
+    records = []
+    blank_columns = None
+    for row in read:
+        if blank_columns is None:
+            blank_columns = {col: row['SN'] for col in row if col != 'SN'}
+        for (col, val) in row.items():
+            if col == 'SN' or val == '':
+                continue
+            blank_columns.pop(col, None)
+            records.append(long_record(row['SN'], col, val))
+
+    records.extend(long_record(sn, col, '') for (col, sn) in (blank_columns or {}).items())
+    return records
+
+
+def long_record(sn, col, val):
+    record = {LONG_SN: sn, LONG_ATTRIBUTE: col, LONG_YEAR: '', LONG_STEP: '', LONG_VALUE: val}
+    year = column_year(col)
+    step = STEP_PATTERN.match(col)
+    if year:
+        record[LONG_ATTRIBUTE] = col.replace(f'Yr{year}', '', 1)
+        record[LONG_YEAR] = year
+    elif step:
+        record[LONG_ATTRIBUTE] = step.group(1)
+        record[LONG_STEP] = int(step.group(2))
+    return record
+
+
+def convert_to_long_format(fileName, longFileName):
+    # rewrites a wide input file of the inputs folder in the long format
+    with open('inputs/' + fileName) as file:
+        records = to_long_format(csv.DictReader(file))
+    with open('inputs/' + longFileName, 'w') as file:
+        writer = csv.DictWriter(file, LONG_COLUMNS)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def compile_row(row):
+    # cells are compiled once on read, later stages never parse the raw text
+    compiled = {}
+    for (col, val) in row.items():
+        if col in TEXT_COLUMNS:
+            compiled[col] = val
+            continue
+        if col == ASSEMBLY_TREE_COLUMN:
+            compiled[col] = read_assembly_tree(val) if val else None
+            continue
+
+        compiled[col] = compile_value(val)
+        if is_distribution(compiled[col]) and is_constant_column(col):
+            raise Exception(f"Column {col} can't be stochastic, SN {row.get('SN')}: {val}")
+    return compiled
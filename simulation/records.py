@@ -0,0 +1,55 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+# Row key of the record compiled from the row by cleanse
+RECORD = 'Record'
+
+
+class Record(object):
+    """Fixed set of typed fields, unset fields are None."""
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        if fields:
+            raise Exception(f'Unknown {type(self).__name__} fields: {sorted(fields)}')
+
+    def __repr__(self):
+        return f'{type(self).__name__}({", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)})'
+
+
+class Metadata(Record):
+    """Structure and test parameters of the metadata row.
+
+    Numbers are floats, or sample matrices for the stochastic test parameters.
+    """
+
+    __slots__ = ('yield_model', 'cluster_parameter', 'rec_baseline', 'rec_spares', 'rec_area', 'assembly_steps',
+                 'ws_a', 'ws_h', 'ws_ci', 'ws_di', 'ws_xi', 'ws_ri',
+                 'ft_a', 'ft_h', 'ft_xi', 'ft_di', 'ft_ri', 'ft_ci',
+                 'slt_a', 'slt_h', 'slt_di')
+
+
+class Die(Record):
+    """Geometry and the per run constants of a die row."""
+
+    __slots__ = ('sn', 'device_type', 'dimension_x', 'dimension_y', 'saw_street', 'wafer_size', 'critical_layers',
+                 'eff_area', 'gdpw', 'probe_cost')
+
+    def assembled(self):
+        return self.dimension_x > 0 and self.dimension_y > 0
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import argparse
+import csv
+import json
+import os
+import time
+import traceback
+from multiprocessing import Pool
+
+from cost_analyzer import INPUT_FILE_A, INPUT_FILE_B, check_options, create_parser, main
+from writer import OUTPUT_DIRECTORY, set_output_directory
+
+# Status report of a batch, in the default output directory
+STATUS_FILE = 'jobs_status.csv'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# Parsed inputs and seeded summaries shared by the jobs run in this process
+cache = {}
+
+
+def read_manifest(file):
+    """Jobs of a manifest, a JSON object with a list of `jobs`.
+
+    A job has an optional `name`, the `option1` and `option2` files of the
+    inputs folder, `params` overriding values of params.csv, a `seed`, the
+    `output` directory (outputs/<name> by default) and `args`, further
+    cost_analyzer.py arguments. The arguments of every job are checked
+    before any job runs.
+    """
+    with open(file) as f:
+        manifest = json.load(f)
+
+    parser = create_parser()
+    return [parse_job(parser, job, f'job{n}') for (n, job) in enumerate(manifest['jobs'], 1)]
+
+
+def parse_job(parser, job, default_name):
+    # job of the manifest with its parsed and checked arguments
+    name = job.get('name', default_name)
+    args = [str(arg) for arg in job.get('args', [])]
+    if job.get('seed') is not None:
+        args += ['--seed', str(job['seed'])]
+    options = parser.parse_args(args)
+    check_options(parser, options)
+    if options.resummarize:
+        parser.error(f'Job {name}: --resummarize is not supported in a batch')
+    return {'name': name, 'files': (job.get('option1', INPUT_FILE_A), job.get('option2', INPUT_FILE_B)),
+            'overrides': job.get('params', {}), 'output': job.get('output', os.path.join(OUTPUT_DIRECTORY, name)),
+            'options': options}
+
+
+def run_job(job):
+    # runs in the batch process or a pool process, both keep their cache between jobs
+    print(f"=== {job['name']} ===")
+    start = time.time()
+    status = {'name': job['name'], 'status': STATUS_DONE, 'seconds': None, 'output': job['output'], 'error': '', 'results': None}
+    try:
+        set_output_directory(job['output'])
+        # tidy result tables and run metadata
+        status['results'] = main(job['options'], job['files'], job['overrides'], cache)
+    except Exception as e:
+        traceback.print_exc()
+        status['status'] = STATUS_FAILED
+        status['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        set_output_directory(OUTPUT_DIRECTORY)
+    status['seconds'] = round(time.time() - start, 2)
+    return status
+
+
+def run_jobs(jobs, processes=1):
+    """Status of every job, run in this process or spread over a pool of `processes`."""
+    if processes <= 1:
+        return [run_job(job) for job in jobs]
+    if any(job['options'].workers or job['options'].listen for job in jobs):
+        # pool processes can't start the worker processes of a distributed run
+        raise Exception('--workers and --listen jobs can only run with a single process')
+    with Pool(processes) as pool:
+        return pool.map(run_job, jobs, chunksize=1)
+
+
+def write_status(statuses):
+    with open(os.path.join(OUTPUT_DIRECTORY, STATUS_FILE), 'w') as file:
+        writer = csv.DictWriter(file, ['name', 'status', 'seconds', 'output', 'error'], extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(statuses)
+
+
+def print_status(statuses):
+    print()
+    width = max(len(status['name']) for status in statuses)
+    for status in statuses:
+        print(f"{status['name']:<{width}}  {status['status']:<6}  {status['seconds']:>8.1f}sec  {status['output']}  {status['error']}")
+    failed = sum(status['status'] == STATUS_FAILED for status in statuses)
+    print(f'{len(statuses) - failed} of {len(statuses)} jobs done, {failed} failed')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the cost_analyzer.py jobs of a manifest in one process or a pool')
+    parser.add_argument('manifest', help='JSON file with the list of jobs')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='Run the jobs on a pool of this many processes, each reusing its parsed inputs and summaries')
+    options = parser.parse_args()
+    jobs = read_manifest(options.manifest)
+    statuses = run_jobs(jobs, options.processes)
+    write_status(statuses)
+    print_status(statuses)
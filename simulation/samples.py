@@ -0,0 +1,85 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import json
+import os
+
+import numpy as np
+from processor import SAMPLE_CATEGORIES, summarize_samples
+
+MANIFEST_FILE = 'manifest.json'
+OPTIONS = ['option1', 'option2']
+
+
+def sample_file(option, category, year):
+    return os.path.join(option, f'{category}_yr{year}.npy')
+
+
+def to_json_list(values):
+    return [value.item() if isinstance(value, np.generic) else value for value in values]
+
+
+def save_samples(summaryA, summaryB, years, directory):
+    """Persist the per option, category and year sample arrays as .npy files.
+
+    The manifest records the layout together with the scalar outputs (mask
+    set cost, NRE, ASP) needed to rebuild the summaries with load_samples.
+    """
+    manifest = {'years': years, 'categories': SAMPLE_CATEGORIES, 'options': {}}
+    for (option, summary) in zip(OPTIONS, [summaryA, summaryB]):
+        os.makedirs(os.path.join(directory, option), exist_ok=True)
+        files = {}
+        for category in SAMPLE_CATEGORIES:
+            files[category] = []
+            for year in range(1, years + 1):
+                file = sample_file(option, category, year)
+                np.save(os.path.join(directory, file), np.asarray(summary['samples'][category][year - 1]))
+                files[category].append(file)
+
+        manifest['options'][option] = {
+            'files': files,
+            'mask_costs': to_json_list(summary['mask_costs']),
+            'nre': to_json_list(summary['nre']),
+            'asp': to_json_list(summary['asp'])
+        }
+
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+
+def load_samples(directory):
+    """Rebuild both summaries from the files written by save_samples.
+
+    The sample arrays are memory mapped read-only, they are streamed from disk
+    when the means and distributions are computed instead of being loaded.
+    Returns (summaryA, summaryB, years).
+    """
+    with open(os.path.join(directory, MANIFEST_FILE)) as file:
+        manifest = json.load(file)
+
+    summaries = []
+    for option in OPTIONS:
+        entry = manifest['options'][option]
+        samples = {}
+        for (category, files) in entry['files'].items():
+            samples[category] = [np.load(os.path.join(directory, file), mmap_mode='r') for file in files]
+        summaries.append(summarize_samples(samples, entry['mask_costs'], entry['nre'], entry['asp']))
+
+    return summaries[0], summaries[1], manifest['years']
+
+
+def sampled(summary):
+    return any(np.size(cost) > 1 for cost in summary['total_unit_cost_arr'])
@@ -0,0 +1,91 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import numpy as np
+from distributions import is_distribution
+from preprocessor import params, stochastic_cells
+
+# Correlations input columns, SN '*' applies the correlation to every row
+CORRELATION_SN = 'SN'
+CORRELATION_COLUMN_A = 'ColumnA'
+CORRELATION_COLUMN_B = 'ColumnB'
+CORRELATION = 'Correlation'
+ALL_ROWS = '*'
+
+
+class SamplingPlan(object):
+    """All distribution cells of an option, drawn together as one block.
+
+    A draw is a single standard normal block of shape (cells,) + size, which
+    is correlated with the Cholesky factor of the optional correlation
+    matrix and then transformed to the distribution of each cell.
+    """
+
+    def __init__(self, read, years, correlations=None):
+        self.cells = [(i, col) for (i, col) in stochastic_cells(read, years) if is_distribution(read[i][col])]
+        self.distributions = [read[i][col] for (i, col) in self.cells]
+        self.cholesky = correlation_cholesky(read, self.cells, correlations) if correlations else None
+
+    def __len__(self):
+        return len(self.cells)
+
+    def draw(self, size=None, rng=None):
+        """Standard normal block (cells,) + size, correlated if requested, from `rng` or the generator of the run."""
+        size = size or (params.num_of_steps, params.num_of_simulations)
+        z = (rng or params.rng or np.random).standard_normal((len(self.cells),) + tuple(size))
+        if self.cholesky is not None:
+            z = np.tensordot(self.cholesky, z, axes=1)
+        return z
+
+    def samples(self, z):
+        """Transform a standard normal block in place, {(row index, column): slice of the block}."""
+        for (k, distribution) in enumerate(self.distributions):
+            z[k] = distribution.from_standard_normal(z[k])
+        return {cell: z[k] for (k, cell) in enumerate(self.cells)}
+
+
+def correlation_cholesky(read, cells, correlations):
+    index = {cell: k for (k, cell) in enumerate(cells)}
+    matrix = np.identity(len(cells))
+    for correlation in correlations:
+        sn = correlation[CORRELATION_SN]
+        for (i, row) in enumerate(read):
+            if sn != ALL_ROWS and row['SN'] != sn:
+                continue
+            a = index.get((i, correlation[CORRELATION_COLUMN_A]))
+            b = index.get((i, correlation[CORRELATION_COLUMN_B]))
+            # only correlations between two stochastic cells apply
+            if a is None or b is None or a == b:
+                continue
+            matrix[a, b] = matrix[b, a] = float(correlation[CORRELATION])
+
+    try:
+        return np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        raise Exception('Correlation matrix of the stochastic inputs is not positive definite, please check the correlations input')
+
+
+def draw_ranged_inputs(input, years, correlations=None):
+    """Replace every distribution cell by its samples, drawn as one block.
+
+    Returns the draws as {(row index, column): samples} so they can be kept
+    alongside the outputs computed from them.
+    """
+    plan = SamplingPlan(input, years, correlations)
+    draws = plan.samples(plan.draw())
+    for ((i, col), samples) in draws.items():
+        input[i][col] = samples
+    return draws
@@ -0,0 +1,103 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+from collections import ChainMap
+from types import MappingProxyType
+
+
+class Scenario(object):
+    """Read-only input rows of one option, shared by every run on it.
+
+    Runs never get the base rows themselves, see `rows()`. Perturbed inputs
+    (tornado, sweeps, what-if runs) are overlays which only record the
+    changed cells.
+    """
+
+    def __init__(self, rows):
+        self._rows = tuple(MappingProxyType(dict(row)) for row in rows)
+        # values the model derives from the rows alone, e.g. the compiled records, see `compiled()`
+        self._compiled = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, i):
+        return self._rows[i]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def overlay(self, changes=None):
+        """View of the scenario with `changes` {(row index, column): value} applied."""
+        return ScenarioView(self, changes or {})
+
+    def compiled(self, key, columns, compile):
+        """`compile(rows)` of the scenario rows, computed once per `key`."""
+        if key not in self._compiled:
+            self._compiled[key] = compile(self)
+        return self._compiled[key]
+
+    def rows(self):
+        return self.overlay().rows()
+
+
+class ScenarioView(object):
+    def __init__(self, scenario, changes):
+        self.scenario = scenario
+        self.changes = changes
+        self._row_changes = {}
+        for ((i, col), value) in changes.items():
+            self._row_changes.setdefault(i, {})[col] = value
+
+    def __len__(self):
+        return len(self.scenario)
+
+    def __getitem__(self, i):
+        return ChainMap(self._row_changes.get(i, {}), self.scenario[i])
+
+    def __iter__(self):
+        return (self[i] for i in range(0, len(self)))
+
+    def overlay(self, changes):
+        return ScenarioView(self.scenario, {**self.changes, **changes})
+
+    def compiled(self, key, columns, compile):
+        """`compile(rows)` of the view, the one of the scenario unless a change is in one of the `columns` it reads."""
+        if any(col in columns for (i, col) in self.changes):
+            return compile(list(self))
+        return self.scenario.compiled(key, columns, compile)
+
+    def rows(self):
+        """Rows for a single run.
+
+        Every row gets its own empty top layer which takes all writes of the
+        run (cleanse stores derived values and samples in the rows), so the
+        shared base rows and the recorded changes are never copied nor
+        modified.
+        """
+        return ScenarioRows([ChainMap({}, self._row_changes.get(i, {}), self.scenario[i]) for i in range(0, len(self.scenario))], self)
+
+
+class ScenarioRows(list):
+    """Rows of a single run, with the view they come from."""
+
+    def __init__(self, rows, view):
+        super().__init__(rows)
+        self.view = view
+
+
+def as_scenario(read):
+    return read if isinstance(read, (Scenario, ScenarioView)) else Scenario(read)
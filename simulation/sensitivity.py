@@ -0,0 +1,164 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import numpy as np
+
+from preprocessor import column_template, stochastic_cells
+from processor import calculate_summary, calculate_unit_cost_diff
+from sampling import SamplingPlan
+from scenario import as_scenario
+
+# Grouping of the stochastic cells into inputs for the sensitivity analysis
+GROUP_BY_COLUMN = 'column'  # one input per option and column, e.g. Option1 ForecastDemand
+GROUP_BY_CELL = 'cell'      # one input per option, die and column
+
+OPTION_NAMES = ['Option1', 'Option2']
+
+# Maximum number of samples used to fit the tornado regression surrogate
+TORNADO_SURROGATE_SAMPLES = 20000
+
+def find_ranged_cells(read, years):
+    """Return (row index, column template, column) for every stochastic cell."""
+    return [(i, column_template(col), col) for (i, col) in stochastic_cells(read, years)]
+
+
+def group_name(option, read, cell, group_by):
+    (i, template, col) = cell
+    if group_by == GROUP_BY_CELL:
+        return f'{option} SN{read[i]["SN"]} {col}'
+    return f'{option} {template.replace("{year}", "")}'
+
+
+def group_cells(option, read, cells, group_by):
+    groups = {}
+    for cell in cells:
+        groups.setdefault(group_name(option, read, cell, group_by), []).append(cell)
+    return groups
+
+
+def draw_base_samples(read, years, n):
+    # two independent base blocks (A and B of the Saltelli design) per cell,
+    # the inputs are kept independent as the estimators assume
+    plan = SamplingPlan(read, years)
+    return plan.samples(plan.draw((2, n)))
+
+
+def evaluate_blocks(read, groups, draws, n, years, model=None):
+    """Evaluate the option on the blocks [A, B, AB_1, ... AB_m] in one run.
+
+    AB_g takes the B block for the cells of group g and the A block for all
+    other cells. All blocks are stacked on the simulation axis so the model is
+    run once with n * (m + 2) samples. Returns an array (years, m + 2, n).
+    """
+    blocks = 2 + len(groups)
+    cell_group = {}
+    for (g, cells) in enumerate(groups.values()):
+        for (i, _, col) in cells:
+            cell_group[(i, col)] = g
+
+    changes = {}
+    for ((i, col), draw) in draws.items():
+        samples = [draw[0], draw[1]] + [draw[1] if cell_group[(i, col)] == g else draw[0] for g in range(0, len(groups))]
+        changes[(i, col)] = np.concatenate(samples).reshape(1, blocks * n)
+
+    summary = calculate_summary(as_scenario(read).overlay(changes).rows(), dict(model or {}, years=years, steps=1, simulations=blocks * n))
+    return np.array([np.broadcast_to(cost, (1, blocks * n)).reshape(blocks, n) for cost in summary['total_unit_cost_arr']])
+
+
+def calculate_sobol_indices(readA, readB, years, n, group_by=GROUP_BY_COLUMN, model=None):
+    """First order and total Sobol indices of the unit cost difference (Option2 - Option1).
+
+    Uses the Saltelli design with the Saltelli (2010) first order and Jansen
+    total effect estimators. The A and B blocks are shared by all inputs of
+    both options, the unit costs of an option are only re-evaluated for the
+    blocks in which one of its own inputs changes.
+
+    Returns a list per year of {'name', 'first_order', 'total'} ranked by the
+    total effect.
+    """
+    cellsA = find_ranged_cells(readA, years)
+    cellsB = find_ranged_cells(readB, years)
+    groupsA = group_cells(OPTION_NAMES[0], readA, cellsA, group_by)
+    groupsB = group_cells(OPTION_NAMES[1], readB, cellsB, group_by)
+
+    unit_costA = evaluate_blocks(readA, groupsA, draw_base_samples(readA, years, n), n, years, model)
+    unit_costB = evaluate_blocks(readB, groupsB, draw_base_samples(readB, years, n), n, years, model)
+
+    indices = []
+    for year in range(0, years):
+        uA = unit_costA[year]
+        uB = unit_costB[year]
+        yA = uB[0] - uA[0]
+        yB = uB[1] - uA[1]
+        variance = np.var(np.concatenate([yA, yB]))
+
+        year_indices = []
+        ab_blocks = [uB[0] - uA[2 + j] for j in range(0, len(groupsA))] + [uB[2 + j] - uA[0] for j in range(0, len(groupsB))]
+        for (name, yAB) in zip(list(groupsA) + list(groupsB), ab_blocks):
+            first_order = np.mean(yB * (yAB - yA)) / variance if variance > 0 else 0.0
+            total = 0.5 * np.mean((yA - yAB) ** 2) / variance if variance > 0 else 0.0
+            year_indices.append({'name': name, 'first_order': first_order, 'total': total})
+
+        year_indices.sort(reverse=True, key=lambda index: index['total'])
+        indices.append(year_indices)
+
+    return indices
+
+
+def estimate_tornado_input(readA, readB, summaryA, summaryB, years, cols, max_samples=TORNADO_SURROGATE_SAMPLES):
+    """Estimate the tornado high/low swings from the samples of the main run.
+
+    create_tornado_input re-runs the model with all cells of a column set to
+    the first (high) or second (low) of their bounds. Here the same
+    swings are predicted by a linear regression surrogate of the unit cost
+    difference (Option1 - Option2), fitted per year on the draws of that
+    year's ranged cells kept in the summaries. Returns the same per year
+    structure as create_tornado_input.
+    """
+    diffs = calculate_unit_cost_diff(summaryB, summaryA)
+    shape = np.broadcast_shapes(*[np.shape(diff) for diff in diffs])
+    n = min(int(np.prod(shape)), max_samples)
+    reads = [readA, readB]
+    draws = [summaryA['input_draws'], summaryB['input_draws']]
+
+    tornado_input = []
+    for year in range(1, years + 1):
+        y = np.broadcast_to(diffs[year - 1], shape).ravel()[:n]
+        col_names = {col.replace('{year}', f'Yr{year}'): col for col in cols}
+        cells = [(option, i, col_names[name]) for option in range(0, 2) for (i, name) in draws[option] if name in col_names]
+
+        x = np.column_stack([np.ravel(draws[option][(i, col.replace('{year}', f'Yr{year}'))])[:n] for (option, i, col) in cells] or [np.zeros(n)])
+        x_mean = x.mean(axis=0)
+        x_std = x.std(axis=0)
+        x_std[x_std == 0] = 1
+        coef = np.linalg.lstsq(np.column_stack([np.ones(n), (x - x_mean) / x_std]), y, rcond=None)[0]
+        slopes = coef[1:] / x_std
+
+        swings = {}
+        for (j, (option, i, col)) in enumerate(cells):
+            first, second = reads[option][i][col.replace('{year}', f'Yr{year}')].bounds
+            high, low = swings.get((option, col), (0.0, 0.0))
+            swings[(option, col)] = (high + slopes[j] * (first - x_mean[j]), low + slopes[j] * (second - x_mean[j]))
+
+        baseline = y.mean()
+        year_input = []
+        for option in range(0, 2):
+            for col in cols:
+                high, low = swings.get((option, col), (0.0, 0.0))
+                year_input.append({'name': f'{OPTION_NAMES[option]} {col}', 'high': baseline + high, 'low': baseline + low})
+        tornado_input.append(year_input)
+
+    return tornado_input
@@ -0,0 +1,184 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import pickle
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import batch_rng, batch_sizes
+from processor import SAMPLE_CATEGORIES
+from sampling import SamplingPlan
+from scenario import Scenario
+
+# Shared memory segments of the batches of an option
+BUFFERS = ['rows', 'samples', 'normals', 'draws']
+
+
+class SharedArray(object):
+    """NumPy array in a shared memory segment, which other local processes attach by its descriptor.
+
+    The creating process owns the segment, `release` frees it once all
+    views of the array are gone.
+    """
+
+    def __init__(self, shape, dtype=np.float64):
+        dtype = np.dtype(dtype)
+        self.memory = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        self.array = np.ndarray(shape, dtype, buffer=self.memory.buf)
+        self.descriptor = {'name': self.memory.name, 'shape': tuple(shape), 'dtype': dtype.str}
+
+    def release(self):
+        del self.array
+        self.memory.close()
+        self.memory.unlink()
+
+
+class SharedObject(object):
+    """Pickled object in a shared memory segment, e.g. the input rows of an option."""
+
+    def __init__(self, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.memory = shared_memory.SharedMemory(create=True, size=len(data))
+        self.memory.buf[:len(data)] = data
+        self.descriptor = {'name': self.memory.name, 'size': len(data)}
+
+    def release(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+class SharedBatches(object):
+    """Shared inputs and result buffers of the batches of both options.
+
+    The rows of every option are placed in shared memory once. The standard
+    normal blocks of all batches are drawn up front from the random stream
+    of each (option, batch) into the `normals` buffer, and the samples of the
+    ranged cells (the cells of its SamplingPlan) go to the `draws` buffer.
+    Work units then only carry the descriptors instead of pickled rows and
+    arrays, a worker unpickles the rows once per run and evaluates the
+    model on views of the draws of its columns, see `shared_rows`. The
+    samples it computed are copied into the `samples` buffer, which the
+    coordinator reads as views until combine_batches copies them out.
+    """
+
+    def __init__(self, reads, args, seed, batch_size):
+        years = args['years']
+        shape = (args['steps'], args['simulations'])
+        self.options = []
+        try:
+            for (option, read) in enumerate(reads):
+                rows = [dict(row) for row in read()]
+                plan = SamplingPlan(rows, years, args.get('correlations'))
+                buffers = {'rows': SharedObject(rows), 'cells': plan.cells,
+                           'samples': SharedArray((len(SAMPLE_CATEGORIES), years) + shape),
+                           'normals': SharedArray((len(plan),) + shape), 'draws': SharedArray((len(plan),) + shape)}
+                self.options.append(buffers)
+                offset = 0
+                for (batch, simulations) in enumerate(batch_sizes(args['simulations'], batch_size)):
+                    buffers['normals'].array[:, :, offset:offset + simulations] = plan.draw((args['steps'], simulations),
+                                                                                           batch_rng(seed, option, batch))
+                    offset += simulations
+        except Exception:
+            self.release()
+            raise
+
+    def unit_buffers(self, option, offset, simulations):
+        buffers = self.options[option]
+        return dict({key: buffers[key].descriptor for key in BUFFERS}, cells=buffers['cells'], offset=offset, simulations=simulations)
+
+    def batch(self, option, offset, result):
+        """The batch `result` of a worker with its samples and draws as views of the buffers."""
+        buffers = self.options[option]
+        columns = slice(offset, offset + result['simulations'])
+        samples = {category: [buffers['samples'].array[k, year, :, columns] if value is None else value
+                              for (year, value) in enumerate(result['samples'][category])]
+                   for (k, category) in enumerate(SAMPLE_CATEGORIES)}
+        draws = {cell: buffers['draws'].array[k, :, columns] for (k, cell) in enumerate(buffers['cells'])}
+        return dict(result, samples=samples, input_draws=draws)
+
+    def release(self):
+        for buffers in self.options:
+            for key in BUFFERS:
+                if key in buffers:
+                    buffers[key].release()
+        self.options = []
+
+
+# Segments attached by this worker process, by name
+attached = {}
+# Scenarios of the unpickled rows by segment name
+attached_scenarios = {}
+
+
+def attach(descriptor):
+    if descriptor['name'] not in attached:
+        attached[descriptor['name']] = shared_memory.SharedMemory(name=descriptor['name'])
+    return attached[descriptor['name']]
+
+
+def detach_others(buffers):
+    # segments of earlier runs are closed once a unit of another run arrives
+    names = {buffers[key]['name'] for key in BUFFERS}
+    for name in [name for name in attached if name not in names]:
+        attached_scenarios.pop(name, None)
+        attached.pop(name).close()
+
+
+def shared_rows(buffers):
+    """Rows of a unit, with its ranged cells replaced by views of their samples in the shared draws.
+
+    The rows are unpickled once per worker and run, a unit only overlays
+    them. The samples of its columns are transformed from the pre-drawn
+    standard normal block, which is left as is, so a unit reissued to
+    another worker gets the same samples.
+    """
+    detach_others(buffers)
+    descriptor = buffers['rows']
+    if descriptor['name'] not in attached_scenarios:
+        with attach(descriptor).buf[:descriptor['size']] as data:
+            attached_scenarios[descriptor['name']] = Scenario(pickle.loads(data))
+    scenario = attached_scenarios[descriptor['name']]
+
+    columns = slice(buffers['offset'], buffers['offset'] + buffers['simulations'])
+    normals = shared_view(buffers['normals'])
+    draws = shared_view(buffers['draws'])
+    changes = {}
+    for (k, (i, col)) in enumerate(buffers['cells']):
+        draws[k, :, columns] = scenario[i][col].from_standard_normal(normals[k, :, columns])
+        changes[(i, col)] = draws[k, :, columns]
+    return scenario.overlay(changes).rows()
+
+
+def shared_view(descriptor):
+    return np.ndarray(descriptor['shape'], np.dtype(descriptor['dtype']), buffer=attach(descriptor).buf)
+
+
+def write_batch(result, buffers):
+    """Write the samples of a batch into the shared buffer, its input draws are there already.
+
+    Returns the result without them, a sample which is a scalar (the
+    category does not depend on a ranged input) is kept in the result.
+    """
+    columns = slice(buffers['offset'], buffers['offset'] + result['simulations'])
+    samples = shared_view(buffers['samples'])
+    for (k, category) in enumerate(SAMPLE_CATEGORIES):
+        for (year, value) in enumerate(result['samples'][category]):
+            samples[k, year, :, columns] = value
+    del samples
+
+    scalars = {category: [value if np.ndim(value) == 0 else None for value in values] for (category, values) in result['samples'].items()}
+    return dict(result, samples=scalars, input_draws=None)
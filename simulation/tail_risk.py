@@ -0,0 +1,198 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import numpy as np
+
+from preprocessor import column_year
+from processor import calculate_summary
+from sampling import SamplingPlan
+from scenario import as_scenario
+
+# Defaults of the cross-entropy tuning of the proposal
+CE_SAMPLES = 1000
+CE_ELITE_FRACTION = 0.1
+CE_MAX_ITERATIONS = 10
+# change of the length of the proposal mean at which the tuning stops
+CE_TOLERANCE = 0.05
+
+
+def evaluate_cost_diff(readA, readB, plans, z, years, model=None):
+    """Unit cost difference (Option2 - Option1) per year for every column of `z`.
+
+    `z` holds the independent standard normals of the cells of both options
+    (cells of Option1 first) for n samples, shape (cells, n). They are
+    correlated and transformed by the sampling plan of each option, and the
+    model is run once per option with the n samples on the simulation axis.
+    `model` are the model options of the run (see
+    preprocessor.model_options). Returns an array (years, n).
+    """
+    n = z.shape[1]
+    unit_costs = []
+    offset = 0
+    for (read, plan) in zip([readA, readB], plans):
+        block = z[offset:offset + len(plan)].reshape((len(plan), 1, n))
+        offset += len(plan)
+        if plan.cholesky is not None:
+            block = np.tensordot(plan.cholesky, block, axes=1)
+        changes = plan.samples(block.copy())
+        summary = calculate_summary(as_scenario(read).overlay(changes).rows(), dict(model or {}, years=years, steps=1, simulations=n))
+        unit_costs.append(np.array([np.broadcast_to(cost, (1, n))[0] for cost in summary['total_unit_cost_arr']]))
+    return unit_costs[1] - unit_costs[0]
+
+
+def likelihood_ratio(z, mean):
+    # nominal N(0, I) over the mean shifted proposal N(mean, I), per column of z
+    return np.exp(-mean @ z + 0.5 * mean @ mean)
+
+
+def weighted_tail_quantile(y, weights, tail_probability):
+    # smallest y whose weighted upper tail probability is at most `tail_probability`
+    order = np.argsort(y)[::-1]
+    tail = np.cumsum(weights[order]) / len(y)
+    k = np.searchsorted(tail, tail_probability, side='right')
+    return y[order[max(k - 1, 0)]]
+
+
+def year_mask(plans, year):
+    # cells the costs of `year` can depend on, a blank wafer price is discounted from the previous year
+    return np.array([column_year(col) is None or column_year(col) <= year for plan in plans for (_, col) in plan.cells])
+
+
+def tune_proposals(evaluate, masks, tail_probability, thresholds, rng, samples=CE_SAMPLES, elite_fraction=CE_ELITE_FRACTION,
+                   max_iterations=CE_MAX_ITERATIONS):
+    """Cross-entropy tuning of the mean of a N(mean, I) proposal towards the upper tail of every year of `evaluate`.
+
+    `evaluate` maps z (cells, n) to the outputs of all years (years, n),
+    `masks` are the cells every year can depend on. There are hundreds of
+    ranged cells, a free mean would pick up noise in every one of them and
+    the likelihood ratios would degenerate. The mean of a year is therefore
+    kept on the direction of its linear sensitivities of the first (nominal)
+    iteration, cov(z_k, y) over the cells in its mask, and only its length
+    is tuned: every iteration moves it to the projection of the likelihood
+    ratio weighted mean of the elite samples (the top `elite_fraction`),
+    until the elite level reaches the year's threshold, or, without
+    thresholds, until its probability under the nominal distribution is
+    below `tail_probability`.
+
+    All years are tuned together: the nominal samples are shared and every
+    later iteration evaluates the samples of the years still being tuned in
+    a single run of the model. Returns (means (years, cells), iterations per
+    year).
+    """
+    (years, cells) = masks.shape
+    means = np.zeros((years, cells))
+    directions = np.zeros((years, cells))
+    iterations = np.zeros(years, dtype=int)
+    tuning = list(range(0, years))
+    for iteration in range(1, max_iterations + 1):
+        if iteration == 1:
+            z = rng.standard_normal((cells, samples))
+            y = evaluate(z)
+            blocks = {year: (z, y[year]) for year in tuning}
+        else:
+            z = np.concatenate([means[year][:, None] + rng.standard_normal((cells, samples)) for year in tuning], axis=1)
+            y = evaluate(z)
+            blocks = {year: (z[:, k * samples:(k + 1) * samples], y[year, k * samples:(k + 1) * samples]) for (k, year) in enumerate(tuning)}
+
+        for (year, (z, y)) in blocks.items():
+            iterations[year] = iteration
+            weights = likelihood_ratio(z, means[year])
+            if iteration == 1:
+                direction = np.where(masks[year], z @ (y - y.mean()), 0.0)
+                norm = np.linalg.norm(direction)
+                if norm == 0:
+                    # the cost difference does not depend on the ranged inputs
+                    tuning.remove(year)
+                    continue
+                directions[year] = direction / norm
+
+            level = np.quantile(y, 1 - elite_fraction)
+            threshold = thresholds[year] if thresholds is not None else None
+            if threshold is not None:
+                level = min(level, threshold)
+            elite = y >= level
+            shift = directions[year] @ (z[:, elite] @ weights[elite]) / weights[elite].sum()
+            converged = abs(shift - directions[year] @ means[year]) < CE_TOLERANCE
+            means[year] = directions[year] * shift
+
+            reached = level >= threshold if threshold is not None else np.sum(weights[elite]) / samples <= tail_probability
+            if reached or converged:
+                tuning.remove(year)
+        if len(tuning) == 0:
+            break
+    return means, iterations
+
+
+def importance_sample(evaluate, masks, tail_probability, thresholds, samples, rng):
+    """Outputs and likelihood ratios of the samples of the tuned proposal of every year, and the tuning iterations.
+
+    The samples of all years are evaluated by a single run of the model.
+    Returns lists per year of the outputs and likelihood ratios, and the
+    number of tuning iterations per year.
+    """
+    means, iterations = tune_proposals(evaluate, masks, tail_probability, thresholds, rng)
+    z = [mean[:, None] + rng.standard_normal((masks.shape[1], samples)) for mean in means]
+    y = evaluate(np.concatenate(z, axis=1))
+    return ([y[year, year * samples:(year + 1) * samples] for year in range(0, len(z))],
+            [likelihood_ratio(z[year], means[year]) for year in range(0, len(z))], iterations)
+
+
+def effective_sample_size(weights):
+    return np.sum(weights) ** 2 / np.sum(weights ** 2) if len(weights) > 0 else 0.0
+
+
+def estimate_tail_risk(readA, readB, years, level=0.99, threshold=None, lower=False, samples=2000, correlations=None, rng=None, model=None):
+    """Extreme quantile and exceedance probability of CostDiffYr{n} by importance sampling.
+
+    For every year the ranged inputs of both options are drawn from a
+    standard normal proposal whose mean is tuned by the cross-entropy method
+    towards the tail, and the estimates are weighted by the likelihood
+    ratio. `level` is the quantile level of the upper tail (e.g. P99), with
+    `lower` the lower tail is used instead (P1 for 0.99). `threshold` is
+    the CostDiff whose exceedance probability is estimated (below it for
+    the lower tail), e.g. 0 for the probability that Option2 costs more
+    than Option1. The quantile and the probability get a proposal each. All
+    years are tuned and sampled together, each model run covers all of them.
+
+    Returns a list per year of {'name', 'level', 'quantile', 'threshold',
+    'probability', 'ess', 'probability_ess', 'samples'}. The effective
+    sample size (ESS) is (sum w)^2 / sum w^2 of the likelihood ratios w of
+    the samples in the tail (beyond the quantile or the threshold), plain
+    Monte Carlo has (1 - level) * samples of them beyond the quantile.
+    """
+    rng = rng or np.random.default_rng()
+    plans = [SamplingPlan(readA, years, correlations), SamplingPlan(readB, years, correlations)]
+    sign = -1 if lower else 1
+
+    evaluate = lambda z: sign * evaluate_cost_diff(readA, readB, plans, z, years, model)
+    masks = np.array([year_mask(plans, year) for year in range(1, years + 1)])
+
+    (ys, weights, iterations) = importance_sample(evaluate, masks, 1 - level, None, samples, rng)
+    estimates = []
+    for year in range(0, years):
+        quantile = weighted_tail_quantile(ys[year], weights[year], 1 - level)
+        estimates.append({'name': f'CostDiffYr{year + 1}', 'level': level, 'quantile': sign * quantile, 'threshold': threshold,
+                          'probability': None, 'ess': effective_sample_size(weights[year][ys[year] >= quantile]), 'probability_ess': None,
+                          'samples': samples + iterations[year] * CE_SAMPLES})
+
+    if threshold is not None:
+        (ys, weights, iterations) = importance_sample(evaluate, masks, None, [sign * threshold] * years, samples, rng)
+        for (year, estimate) in enumerate(estimates):
+            tail_weights = weights[year][ys[year] >= sign * threshold]
+            estimate['probability'] = np.sum(tail_weights) / samples
+            estimate['probability_ess'] = effective_sample_size(tail_weights)
+            estimate['samples'] += samples + iterations[year] * CE_SAMPLES
+    return estimates
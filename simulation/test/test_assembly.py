@@ -0,0 +1,75 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import unittest
+import numpy as np
+
+from assembly import AssemblyTree
+from processor import calculate_assy_scrap
+from records import RECORD, Die, Metadata
+
+
+def node(name, parent, node_yield, dies):
+    return {'Node': name, 'Parent': parent, 'Yield': node_yield, 'Dies': dies}
+
+
+class TestAssembly(unittest.TestCase):
+    # HBM stack on an interposer on the substrate
+    tree = AssemblyTree([
+        node('Substrate', '', '0.98', '0'),
+        node('Interposer', 'Substrate', '0.99', '1'),
+        node('Stack', 'Interposer', '0.95', '2 3'),
+    ])
+
+    def create_input(self, mat_costs, dimensions=None):
+        input = [{'DeviceType': '', 'AssemblySteps': '0', 'AssemblyTree': self.tree, RECORD: Metadata(assembly_steps=0)}]
+        for (k, mat_cost) in enumerate(mat_costs):
+            dimension = dimensions[k] if dimensions else 10.0
+            input.append({'SN': str(k), 'DeviceType': 'Active', 'DimensionX': str(dimension), 'DimensionY': '10', 'MatCostYr1': mat_cost,
+                          RECORD: Die(sn=str(k), device_type='Active', dimension_x=dimension, dimension_y=10.0)})
+        return input
+
+    def test_closure_incidence(self):
+        incidence, yields = self.tree.incidence(['0', '1', '2', '3'])
+
+        np.testing.assert_array_equal([[1, 1, 1, 1], [0, 1, 1, 1], [0, 0, 1, 1]], incidence)
+        self.assertEqual([0.98, 0.99, 0.95], yields)
+
+    def test_assy_scrap_cost(self):
+        mat_costs = [np.full((2, 3), 100.0), 200.0, 300.0, 400.0]
+
+        assy_scrap = calculate_assy_scrap(self.create_input(mat_costs), 1)
+
+        expected = 0.02 * 1000 + 0.01 * 900 + 0.05 * 700
+        np.testing.assert_allclose(np.full((2, 3), expected), assy_scrap[0])
+
+    def test_dimensionless_die_not_assembled(self):
+        assy_scrap = calculate_assy_scrap(self.create_input([100.0, 200.0, 300.0, 400.0], [10.0, 10.0, 0.0, 10.0]), 1)
+
+        # die 2 of the stack has no dimension, it is not charged scrap
+        self.assertAlmostEqual(0.02 * 700 + 0.01 * 600 + 0.05 * 400, assy_scrap[0])
+
+    def test_invalid_tree(self):
+        with self.assertRaises(Exception):
+            AssemblyTree([node('A', 'B', '0.9', '1'), node('B', 'A', '0.9', '2')])
+        with self.assertRaises(Exception):
+            self.tree.incidence(['0', '1', '2'])
+        with self.assertRaisesRegex(Exception, 'ranged assembly tree yields are not supported'):
+            AssemblyTree([node('A', '', 'Uniform(0.9, 0.95)', '1')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+
+from breakeven import calculate_break_even, solve_break_even
+from distributions import is_distribution
+from gdpw import GDPW_EXACT, GdpwCache
+from preprocessor import params
+from processor import calculate_summary
+from reader import readFile
+from scenario import Scenario
+
+
+class TestBreakEven(unittest.TestCase):
+    def test_solve_break_even(self):
+        targets = np.array([0.5, 2.0, 3.5, 10.0])
+        roots, found = solve_break_even(lambda x: x ** 3 - targets ** 3, np.zeros(4), np.full(4, 4.0))
+
+        np.testing.assert_array_equal([True, True, True, False], found)
+        np.testing.assert_allclose(targets[:3], roots[:3], rtol=1e-6)
+        self.assertTrue(np.isnan(roots[3]))
+
+    def midpoint_reads(self):
+        # deterministic inputs, every ranged cell at the middle of its bounds
+        reads = [Scenario([{col: np.mean(value.bounds) if is_distribution(value) else value for (col, value) in row.items()}
+                           for row in readFile(fileName)]) for fileName in ['data_option1.csv', 'data_option2.csv']]
+        # Option1 costs less per unit at a high volume once it pays for a larger NRE
+        reads[0] = reads[0].overlay({(1, 'NRE($)'): 1e8})
+        return reads
+
+    def assert_break_even(self, reads, year, args):
+        # both options cost the same per unit at the break-even demand
+        unit_costs = []
+        for read in reads:
+            changes = {(i, 'ForecastDemandYr1'): year['values'][0] for i in range(1, len(read)) if read[i]['ForecastDemandYr1']}
+            summary = calculate_summary(read.overlay(changes).rows(), dict(args, years=1, steps=1, simulations=1))
+            unit_costs.append(summary['total_unit_cost_arr'][0])
+        self.assertAlmostEqual(unit_costs[0], unit_costs[1], delta=1e-6 * unit_costs[0])
+
+    def test_break_even_demand(self):
+        reads = self.midpoint_reads()
+        (year, option2) = calculate_break_even(reads[0], reads[1], 1, bracket=1e4)
+        self.assertEqual(('ForecastDemandYr1', 'Option1', '0'), (year['name'], year['option'], year['sn']))
+        self.assertEqual(1.0, year['found'])
+        self.assert_break_even(reads, year, {})
+        self.assertEqual('Option2', option2['option'])
+        np.testing.assert_allclose(year['values'], option2['values'])
+
+    def test_break_even_sampled_demand(self):
+        # the break-even demand of every sample is its scale times the sampled demand of each option,
+        # the legacy ranges are normal with the bounds at the 5th and 95th percentile
+        reads = [Scenario(readFile(fileName)) for fileName in ['data_option1.csv', 'data_option2.csv']]
+        reads[0] = reads[0].overlay({(1, 'NRE($)'): 1e8})
+        results = calculate_break_even(reads[0], reads[1], 2, n=8, bracket=1e4, rng=np.random.default_rng(5))
+        self.assertEqual([('ForecastDemandYr1', 'Option1'), ('ForecastDemandYr1', 'Option2'),
+                          ('ForecastDemandYr2', 'Option1'), ('ForecastDemandYr2', 'Option2')],
+                         [(result['name'], result['option']) for result in results])
+        for result in results[:2]:
+            demands = (result['values'] / result['scales'])[~np.isnan(result['values'])]
+            self.assertTrue(demands.size and np.all((60000 <= demands) & (demands <= 140000)))
+        self.assertFalse(np.allclose(results[0]['values'], results[1]['values']))
+
+    def test_break_even_exact_gdpw(self):
+        # the unit price of die SN 1 from its wafer price and gross die per wafer
+        reads = [read.overlay({(2, 'ForecastUnitPriceYr1($)'): ''}) for read in self.midpoint_reads()]
+        with tempfile.TemporaryDirectory() as directory:
+            with mock.patch('preprocessor.gdpw_cache', GdpwCache(os.path.join(directory, 'gdpw_cache.json'))):
+                year = calculate_break_even(reads[0], reads[1], 1, bracket=1e4, model={'gdpw': GDPW_EXACT})[0]
+                self.assertEqual(GDPW_EXACT, params.gdpw)
+                self.assert_break_even(reads, year, {'gdpw': GDPW_EXACT})
+
+        approximate = calculate_break_even(reads[0], reads[1], 1, bracket=1e4)[0]
+        self.assertNotAlmostEqual(approximate['values'][0], year['values'][0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import os
+import time
+import unittest
+from multiprocessing import Process
+from multiprocessing.connection import Client
+import numpy as np
+
+from distributed import Coordinator, calculate_distributed_summaries, start_local_workers
+from engine import calculate_batched_summaries
+from reader import readFile
+from scenario import Scenario
+
+
+def dying_worker(address, authkey):
+    # takes a unit and dies without a result
+    connection = Client(address, authkey=authkey)
+    connection.recv()
+    os._exit(1)
+
+
+class TestDistributed(unittest.TestCase):
+    def test_distributed_run_with_dying_worker(self):
+        readA = Scenario(readFile('data_option1.csv'))
+        readB = Scenario(readFile('data_option2.csv'))
+        reads = [readA.rows, readB.rows]
+        args = {'years': 2, 'steps': 3, 'simulations': 25}
+        expectedA, expectedB = calculate_batched_summaries(reads, args, 11, 10)
+
+        coordinator = Coordinator()
+        try:
+            dying = Process(target=dying_worker, args=(coordinator.address, coordinator.authkey))
+            dying.start()
+            while coordinator.workers == 0:
+                time.sleep(0.01)
+            start_local_workers(coordinator.address, coordinator.authkey, 2)
+
+            summaryA, summaryB = calculate_distributed_summaries(reads, args, 11, coordinator, 10)
+            dying.join()
+            self.assertEqual(1, dying.exitcode)
+        finally:
+            coordinator.close()
+
+        for (expected, summary) in [(expectedA, summaryA), (expectedB, summaryB)]:
+            np.testing.assert_array_equal(expected['total_unit_costs'], summary['total_unit_costs'])
+            for year in range(0, 2):
+                np.testing.assert_array_equal(expected['total_unit_cost_arr'][year], summary['total_unit_cost_arr'][year])
+
+    def test_run_without_workers(self):
+        coordinator = Coordinator(timeout=0.5)
+        try:
+            with self.assertRaisesRegex(Exception, '2 of 2 units pending'):
+                coordinator.run([{}, {}])
+        finally:
+            coordinator.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import unittest
+import numpy as np
+
+from distributions import Distribution, LogNormal, Normal, Pert, Triangular, Uniform, compile_value
+from processor import calculate_summary
+from reader import compile_row, readFile
+from scenario import Scenario
+
+
+class TestDistributions(unittest.TestCase):
+    def test_compile_value(self):
+        self.assertIsNone(compile_value(''))
+        self.assertEqual(-5.0, compile_value('-5'))
+        self.assertEqual(1e-05, compile_value('1e-5'))
+        self.assertEqual('Bose Einstein', compile_value('Bose Einstein'))
+        self.assertEqual(Normal(100000.0, 10000.0, (90000.0, 110000.0)), compile_value('90000 -110000'))
+        self.assertEqual((-10.0, -5.0), compile_value('-10--5').bounds)
+        self.assertEqual(Triangular(0.05, 0.07, 0.1), compile_value('triangular(0.05, 0.07, 0.1)'))
+        self.assertEqual(Pert(1.0, 2.0, 4.0), compile_value('PERT(1, 2, 4)'))
+
+    def test_invalid_distribution(self):
+        with self.assertRaises(Exception):
+            compile_value('Uniform(1)')
+        with self.assertRaises(Exception):
+            compile_value('Uniform(2, 1)')
+        with self.assertRaises(Exception):
+            compile_row({'SN': '1', 'DimensionX': 'Normal(10, 1)'})
+        # a family has to map the standard normal samples
+        with self.assertRaises(TypeError):
+            Distribution()
+
+    def test_from_standard_normal(self):
+        z = np.random.default_rng(5).standard_normal(200000)
+
+        self.assertAlmostEqual(1.5, np.mean(Uniform(1, 2).from_standard_normal(z)), delta=0.01)
+        self.assertAlmostEqual(7 / 3, np.mean(Triangular(1, 2, 4).from_standard_normal(z)), delta=0.01)
+        self.assertAlmostEqual(13 / 6, np.mean(Pert(1, 2, 4).from_standard_normal(z)), delta=0.01)
+        self.assertAlmostEqual(np.exp(1), np.median(LogNormal(1, 0.5).from_standard_normal(z)), delta=0.02)
+        pert = Pert(1, 2, 4).from_standard_normal(z)
+        self.assertTrue(np.all((pert >= 1) & (pert <= 4)))
+
+    def test_stochastic_test_cell_rate(self):
+        np.random.seed(3)
+        read = Scenario(readFile('data_option1.csv'))
+        args = {'years': 1, 'steps': 4, 'simulations': 50}
+
+        summary = calculate_summary(read.overlay({(0, 'WSxi'): Uniform(0.7, 0.9)}).rows(), args)
+
+        self.assertIn((0, 'WSxi'), summary['input_draws'])
+        self.assertEqual((4, 50), np.shape(summary['input_draws'][(0, 'WSxi')]))
+        self.assertTrue(np.isfinite(summary['total_unit_costs'][0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import tempfile
+import unittest
+import numpy as np
+
+import engine
+from engine import Checkpoint, calculate_batched_summaries
+from reader import readFile
+from scenario import Scenario
+
+
+class TestEngine(unittest.TestCase):
+    readA = Scenario(readFile('data_option1.csv'))
+    readB = Scenario(readFile('data_option2.csv'))
+    args = {'years': 2, 'steps': 3, 'simulations': 25}
+    config = {'seed': 7, 'batch_size': 10}
+
+    def calculate(self, checkpoint=None):
+        return calculate_batched_summaries([self.readA.rows, self.readB.rows], self.args, 7, 10, checkpoint)
+
+    def assert_same_summary(self, expected, actual):
+        np.testing.assert_array_equal(expected['total_unit_costs'], actual['total_unit_costs'])
+        np.testing.assert_array_equal(expected['assy_scraps'], actual['assy_scraps'])
+        for year in range(0, self.args['years']):
+            np.testing.assert_array_equal(expected['total_unit_cost_arr'][year], actual['total_unit_cost_arr'][year])
+        self.assertEqual(expected['nre'], actual['nre'])
+        for cell in expected['input_draws']:
+            np.testing.assert_array_equal(expected['input_draws'][cell], actual['input_draws'][cell])
+
+    def test_batches_are_reproducible(self):
+        summaryA, summaryB = self.calculate()
+        againA, againB = self.calculate()
+
+        self.assertEqual((3, 25), np.shape(summaryA['total_unit_cost_arr'][0]))
+        self.assert_same_summary(summaryA, againA)
+        self.assert_same_summary(summaryB, againB)
+
+    def test_progress_and_cancel(self):
+        events = []
+        summaryA, summaryB = calculate_batched_summaries([self.readA.rows, self.readB.rows], self.args, 7, 10,
+                                                         progress=events.append, cancelled=lambda: len(events) == 2)
+
+        self.assertEqual([10, 20], [event['done'] for event in events])
+        self.assertEqual(20, summaryA['simulations'])
+        self.assertEqual((3, 20), np.shape(summaryB['total_unit_cost_arr'][1]))
+        estimate = events[-1]['cost_diff'][0]
+        self.assertEqual('CostDiffYr1', estimate['name'])
+        self.assertLess(estimate['low'], estimate['mean'])
+        self.assertLess(estimate['mean'], estimate['high'])
+        self.assertGreaterEqual(events[-1]['eta'], 0)
+
+    def test_resume_interrupted_run(self):
+        expectedA, expectedB = self.calculate()
+
+        with tempfile.TemporaryDirectory() as directory:
+            # interrupt the run after the first batch of option 2
+            run_batch = engine.run_batch
+            def interrupted(read, args, seed, option, batch, simulations):
+                if batch == 1:
+                    raise KeyboardInterrupt
+                return run_batch(read, args, seed, option, batch, simulations)
+
+            engine.run_batch = interrupted
+            try:
+                with self.assertRaises(KeyboardInterrupt):
+                    self.calculate(Checkpoint(directory, self.config))
+            finally:
+                engine.run_batch = run_batch
+
+            checkpoint = Checkpoint(directory, self.config, resume=True)
+            self.assertTrue(checkpoint.completed(1, 0))
+            self.assertFalse(checkpoint.completed(0, 1))
+            summaryA, summaryB = self.calculate(checkpoint)
+
+            self.assert_same_summary(expectedA, summaryA)
+            self.assert_same_summary(expectedB, summaryB)
+            with self.assertRaises(Exception):
+                Checkpoint(directory, dict(self.config, seed=8), resume=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import os
+import tempfile
+import unittest
+
+from gdpw import GdpwCache, count_gross_dies
+
+
+class TestGdpw(unittest.TestCase):
+    def test_count_gross_dies(self):
+        # 7 x 7 mm within a 20 mm usable circle: a 2 x 2 block centred on a street corner
+        self.assertEqual(4, count_gross_dies(7, 7, 26))
+        # the pitch of a die centred on the wafer only fits one
+        self.assertEqual(1, count_gross_dies(14, 14, 26))
+        self.assertEqual(0, count_gross_dies(21, 5, 26))
+        # elongated dies lose more of the edge than the approximation gives
+        self.assertEqual(110, count_gross_dies(5.1, 40.1, 200))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, 'gdpw_cache.json')
+            cache = GdpwCache(file)
+            self.assertEqual(612, cache.get(10, 10, 0.1, 300, 10.1 * 10.1))
+            # written on the flush only
+            self.assertFalse(os.path.exists(file))
+            cache.flush()
+
+            cached = GdpwCache(file)
+            cached.load()
+            self.assertEqual([612], list(cached.counts.values()))
+            self.assertEqual(612, cached.get(10, 10, 0.1, 300, 10.1 * 10.1))
+
+            # a run sharing the file keeps the counts the other run wrote since its load
+            cached.get(5.1, 40.1, 0.1, 200, 5.2 * 40.2)
+            cache.get(7, 7, 0.1, 26, 7.1 * 7.1)
+            cache.flush()
+            cached.flush()
+            merged = GdpwCache(file)
+            merged.load()
+            self.assertEqual(3, len(merged.counts))
+            self.assertEqual([os.path.basename(file)], os.listdir(directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
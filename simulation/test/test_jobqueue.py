@@ -0,0 +1,102 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import jobqueue
+from jobqueue import STATUS_QUEUED, STATUS_RUNNING, claim, connect, job_key, submit, work
+from cost_analyzer import create_parser
+from runner import STATUS_DONE, STATUS_FAILED, parse_job
+
+
+class TestJobQueue(unittest.TestCase):
+    def test_submit_and_work(self):
+        params = {'NumOfYears': 1, 'NumOfSteps': 1, 'NumOfSimulation': 20}
+        jobs = [{'name': 'first', 'seed': 5, 'params': params},
+                {'name': 'same', 'seed': 5, 'params': params, 'output': 'elsewhere'},
+                {'name': 'other', 'seed': 6, 'params': params},
+                {'name': 'missing', 'seed': 7, 'option1': 'missing.csv'}]
+
+        with tempfile.TemporaryDirectory() as directory:
+            connection = connect(os.path.join(directory, 'jobs.sqlite'))
+            submitted = submit(connection, jobs)
+            self.assertEqual([(1, STATUS_QUEUED, True), (1, STATUS_QUEUED, False), (2, STATUS_QUEUED, True), (3, STATUS_QUEUED, True)],
+                             submitted)
+
+            # the tornado labels need a locale with a currency format
+            with mock.patch.object(jobqueue, 'QUEUE_OUTPUT_DIRECTORY', directory), \
+                 mock.patch('locale.currency', lambda value, grouping=True: f'${value:,.2f}'):
+                self.assertEqual(3, work(connection))
+
+            statuses = connection.execute('SELECT id, status FROM jobs ORDER BY id').fetchall()
+            self.assertEqual([(1, STATUS_DONE), (2, STATUS_DONE), (3, STATUS_FAILED)], statuses)
+            self.assertTrue(os.path.exists(os.path.join(directory, '1', 'summary_output.csv')))
+
+            # a repeated request returns the stored results, a failed one is queued again
+            self.assertEqual([(1, STATUS_DONE, False), (3, STATUS_QUEUED, True)], submit(connection, [jobs[0], jobs[3]]))
+            # the seed of the job or of its arguments is the same request, every unseeded request is a new run
+            self.assertEqual([(1, STATUS_DONE, False), (4, STATUS_QUEUED, True), (5, STATUS_QUEUED, True)],
+                             submit(connection, [{'params': params, 'args': ['--seed', '5']}, {'params': params}, {'params': params}]))
+            rows = connection.execute("SELECT job_id, COUNT(*) FROM distributions WHERE distribution = 'CostDiff' GROUP BY job_id").fetchall()
+            self.assertEqual([(1, 1), (2, 1)], rows)
+            self.assertGreater(connection.execute('SELECT COUNT(*) FROM summary WHERE job_id = 1').fetchone()[0], 0)
+            connection.close()
+
+    def test_stale_running_job(self):
+        params = {'NumOfYears': 1, 'NumOfSteps': 1, 'NumOfSimulation': 20}
+        with tempfile.TemporaryDirectory() as directory:
+            connection = connect(os.path.join(directory, 'jobs.sqlite'))
+            submit(connection, [{'name': 'first', 'seed': 5, 'params': params}])
+            self.assertEqual([1], [id for (id, spec) in claim(connection, 1, 100)])
+            # running on a live worker
+            self.assertEqual([], claim(connection, 1, 200))
+
+            # the worker stopped sending heartbeats, its job is run again and its late results are not stored
+            connection.execute('UPDATE jobs SET heartbeat = ?', (time.time() - 1000,))
+            with mock.patch.object(jobqueue, 'QUEUE_OUTPUT_DIRECTORY', directory), \
+                 mock.patch('locale.currency', lambda value, grouping=True: f'${value:,.2f}'):
+                self.assertEqual(1, work(connection))
+            self.assertEqual((STATUS_DONE, os.getpid()), connection.execute('SELECT status, worker FROM jobs').fetchone())
+            self.assertFalse(jobqueue.store(connection, 1, {}, 100))
+            self.assertNotEqual(STATUS_RUNNING, connection.execute('SELECT status FROM jobs').fetchone()[0])
+            connection.close()
+
+    def test_key_includes_assembly_tree(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copytree(os.path.join(cwd, 'inputs'), os.path.join(directory, 'inputs'))
+            os.chdir(directory)
+            try:
+                with open('inputs/tree_option.csv', 'w') as f:
+                    f.write('SN,DeviceType,AssemblyTree\n,,tree.csv\n1,Active,\n')
+                with open('inputs/tree.csv', 'w') as f:
+                    f.write('Node,Parent,Yield,Dies\nSubstrate,,0.98,1\n')
+                job = {'option1': 'tree_option.csv', 'seed': 5}
+                key = job_key(job, parse_job(create_parser(), job, 'tree')['options'])
+                with open('inputs/tree.csv', 'w') as f:
+                    f.write('Node,Parent,Yield,Dies\nSubstrate,,0.95,1\n')
+                self.assertNotEqual(key, job_key(job, parse_job(create_parser(), job, 'tree')['options']))
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    unittest.main()
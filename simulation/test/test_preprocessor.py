@@ -15,49 +15,115 @@
  """
 
 import unittest
+import numpy as np
 
-from preprocessor import calculate_bose_einstein_yield, calculate_rec_yield, wafer_sort_test_cost, slt_test_cost, final_test_cost
+from preprocessor import calculate_bose_einstein_yield, calculate_murphy_yield, calculate_rec_yield, wafer_sort_test_cost, slt_test_cost, final_test_cost
+from preprocessor import compile_die, compile_metadata, update_params
+from processor import calculate_summary
+from reader import readFile
+from records import RECORD, Die, Metadata
+from scenario import Scenario
+from yield_models import calculate_model_yield
 
 
 class TestReader(unittest.TestCase):
     def test_bose_einstein_yield(self):
-        row = {'EffA': 378.14, 'N': '2'}
+        die = Die(eff_area=378.14, critical_layers=2.0)
 
-        yield_yr = calculate_bose_einstein_yield(row, 0.1)
+        yield_yr = calculate_bose_einstein_yield(die, 0.1)
 
         self.assertEqual(52.65, round(yield_yr * 100, 2))
 
+    def test_murphy_yield_with_sampled_defect_density(self):
+        die = Die(eff_area=378.14)
+        defect_density = np.array([[0.0, 0.1], [0.1, 0.2]])
+
+        yield_yr = calculate_murphy_yield(die, defect_density)
+
+        self.assertEqual((2, 2), yield_yr.shape)
+        self.assertEqual(1.0, yield_yr[0][0])
+        self.assertEqual(69.33, round(yield_yr[0][1] * 100, 2))
+        self.assertEqual(yield_yr[0][1], yield_yr[1][0])
+
+    def test_model_yield_batched_geometry(self):
+        defect_density = np.full((2, 3, 4), 0.1)
+        eff_area = np.reshape([378.14, 100.0], (2, 1, 1))
+
+        expected = {'Poisson': 68.51, 'Seeds': 54.07, 'Negative Binomial': 70.73}
+        for model, expected_yield in expected.items():
+            yield_yr = calculate_model_yield(model, defect_density, eff_area)
+
+            self.assertEqual((2, 3, 4), yield_yr.shape)
+            self.assertEqual(expected_yield, round(yield_yr[0][2][3] * 100, 2))
+            self.assertTrue(np.all(yield_yr[1] > yield_yr[0]))
+
+    def test_unknown_yield_model(self):
+        with self.assertRaises(Exception):
+            calculate_model_yield('Unknown', 0.1, 378.14)
+
     def test_calculate_rec_yield(self):
-        metadata = {'RecBaseline': '32', 'RecSpares': '0', 'RecArea': '10'}
+        metadata = Metadata(rec_baseline=32, rec_spares=0, rec_area=10)
         
         rec_yield = calculate_rec_yield(metadata, 0.1)
 
         self.assertEqual(0.72498, round(rec_yield, 6))
 
     def test_wafer_sort_test_cost(self):
-        input = [{'WSa($/hr)':'150', 'WSh($/hr)': '50', 'WSci': '2', 'WSdi': '15', 'WSxi': '0.8', 'WSri': '2'}]
+        metadata = Metadata(ws_a=150.0, ws_h=50.0, ws_ci=2.0, ws_di=15.0, ws_xi=0.8, ws_ri=2.0)
         yield_i = 0.7
 
-        cost = wafer_sort_test_cost(input, yield_i)
+        cost = wafer_sort_test_cost(metadata, yield_i)
 
         self.assertEqual(2.400, round(cost, 3))
     
     def test_final_test_cost(self):
-        input = [{'FTa($/hr)':'250', 'FTh($/hr)': '250', 'FTdi': '25', 'FTxi': '0.9', 'WSxi': '0.8', 'FTri': '0', 'FTci': '1'}]
+        metadata = Metadata(ft_a=250.0, ft_h=250.0, ft_di=25.0, ft_xi=0.9, ws_xi=0.8, ft_ri=0.0, ft_ci=1.0)
         yield_i = 0.8
 
-        cost = final_test_cost(input, yield_i)
+        cost = final_test_cost(metadata, yield_i)
 
         self.assertEqual(3.472, round(cost, 3))
     
     def test_slt_test_cost(self):
-        input = [{'SLTa($/hr)':'30', 'SLTh($/hr)': '80', 'SLTdi': '360', 'FTxi': '0.9'}]
+        metadata = Metadata(slt_a=30.0, slt_h=80.0, slt_di=360.0, ft_xi=0.9)
         yield_i = 0.8
 
-        cost = slt_test_cost(input, yield_i)
+        cost = slt_test_cost(metadata, yield_i)
 
         self.assertEqual(9.020, round(cost, 3))
 
+    def test_compile_records(self):
+        update_params({'steps': 1, 'simulations': 1, 'deterministic': True})
+        read = readFile('data_option1.csv')
+
+        metadata = compile_metadata(read[0])
+        die = compile_die(metadata, read[2])
+
+        self.assertIsInstance(metadata.ws_xi, float)
+        self.assertIsInstance(metadata.rec_spares, int)
+        self.assertEqual(read[2]['SN'], die.sn)
+        self.assertGreater(die.gdpw, 0)
+        self.assertFalse(hasattr(die, '__dict__'))
+        with self.assertRaises(AttributeError):
+            die.wafer_price = 1.0
+
+    def test_records_compiled_once_per_scenario(self):
+        read = Scenario(readFile('data_option1.csv'))
+        args = {'years': 1, 'steps': 1, 'simulations': 1}
+        rows = read.rows()
+        calculate_summary(rows, args)
+        demand = read.overlay({(2, 'ForecastDemandYr1'): 1000.0}).rows()
+        calculate_summary(demand, args)
+        self.assertTrue(all(a[RECORD] is b[RECORD] for (a, b) in zip(rows, demand)))
+        # the base rows don't get the records of the runs
+        self.assertNotIn(RECORD, read[2])
+
+        # a change of a record column is compiled for its view
+        larger = read.overlay({(2, 'DimensionX'): 20.0}).rows()
+        calculate_summary(larger, args)
+        self.assertEqual(20.0, larger[2][RECORD].dimension_x)
+        self.assertIsNot(rows[3][RECORD], larger[3][RECORD])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -18,6 +18,15 @@ import unittest
 import numpy as np
 
 from processor import calculate_assy_scrap
+from records import RECORD, Die, Metadata
+
+
+def with_records(input):
+    # the assembly fields of the records cleanse compiles from the rows
+    input[0][RECORD] = Metadata(assembly_steps=int(input[0]['AssemblySteps']))
+    for row in input[1:]:
+        row[RECORD] = Die(dimension_x=float(row['DimensionX']), dimension_y=float(row['DimensionY']))
+    return input
 
 
 class TestReader(unittest.TestCase):
@@ -78,11 +87,35 @@ class TestReader(unittest.TestCase):
         ]
         expected_assy_scrap = [16396933.299825005, 20723484.082275007, 25660024.35067501, 75897290.06535003, 62651511.15990003]
 
-        assy_scrap = calculate_assy_scrap(input, 5)
+        assy_scrap = calculate_assy_scrap(with_records(input), 5)
         print(assy_scrap)
 
         self.assertAlmostEqual(assy_scrap, expected_assy_scrap)
 
+    def test_assy_scrap_cost_many_dies_and_steps(self):
+        rng = np.random.default_rng(11)
+        dies, steps, years = 60, 24, 3
+        sequence = rng.integers(0, 2, (steps, dies))
+        metadata = {'DeviceType': '', 'AssemblySteps': str(steps)}
+        for i in range(1, steps + 1):
+            metadata[f'AssyPerStepYield{i}'] = '0.999'
+            metadata[f'AssyYield{i}'] = ''
+        input = [metadata]
+        for k in range(0, dies):
+            row = {'DeviceType': 'Active', 'DimensionX': '5', 'DimensionY': '0' if k == 0 else '5'}
+            row.update({f'AssemblySeq{i}': str(sequence[i - 1][k]) for i in range(1, steps + 1)})
+            row.update({f'MatCostYr{year}': rng.uniform(1e5, 1e6, (4, 50)) for year in range(1, years + 1)})
+            input.append(row)
+
+        assy_scrap = calculate_assy_scrap(with_records(input), years)
+
+        # the die without dimension is not assembled
+        sequence[:, 0] = 0
+        for year in range(1, years + 1):
+            expected = sum(sum(input[k + 1][f'MatCostYr{year}'] * sequence[i][k] for k in range(0, dies)) * (1 - 0.999 ** sequence[i].sum())
+                           for i in range(0, steps))
+            np.testing.assert_allclose(expected, assy_scrap[year - 1])
+
 
 if __name__ == '__main__':
     unittest.main()
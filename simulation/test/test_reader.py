@@ -0,0 +1,78 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import csv
+import random
+import unittest
+
+from preprocessor import validate
+from processor import calculate_summary
+from reader import read_long_format, readFile, to_long_format, year_column
+
+
+class TestReader(unittest.TestCase):
+    def test_year_column(self):
+        self.assertEqual('WaferPriceYr2($)', year_column('WaferPrice($)', 2))
+        self.assertEqual('DefectDensityYr12(Defects/cm^2)', year_column('DefectDensity(Defects/cm^2)', 12))
+        self.assertEqual('ForecastDemandYr1', year_column('ForecastDemand', 1))
+
+    def test_long_format_matches_wide(self):
+        with open('inputs/data_option1.csv') as file:
+            records = to_long_format(csv.DictReader(file))
+
+        self.assertIn({'SN': '1', 'Attribute': 'WaferPrice($)', 'Year': 3, 'Step': '', 'Value': '16888 -17088'}, records)
+        self.assertIn({'SN': '', 'Attribute': 'AssyPerStepYield', 'Year': '', 'Step': 7, 'Value': '0.95'}, records)
+
+        records = [{col: str(val) for (col, val) in record.items()} for record in records]
+        wide = readFile('data_option1.csv')
+        long = read_long_format(records)
+        self.assertEqual([row['SN'] for row in wide], [row['SN'] for row in long])
+        for (wide_row, long_row) in zip(wide, long):
+            self.assertEqual(wide_row, long_row)
+
+    def test_shuffled_long_format(self):
+        with open('inputs/data_option1.csv') as file:
+            records = [{col: str(val) for (col, val) in record.items()} for record in to_long_format(csv.DictReader(file))]
+        random.Random(3).shuffle(records)
+
+        long = read_long_format(records)
+        first_records = list(dict.fromkeys(record['SN'] for record in records if record['SN']))
+        self.assertEqual([''] + first_records, [row['SN'] for row in long])
+        wide = {row['SN']: row for row in readFile('data_option1.csv')}
+        for row in long:
+            self.assertEqual(wide[row['SN']], row)
+        validate(long, readFile('input_template.csv'), 5)
+        calculate_summary(long, {'years': 5, 'steps': 1, 'simulations': 10})
+
+    def test_duplicate_long_value(self):
+        records = [{'SN': '1', 'Attribute': 'WaferYield', 'Year': '1', 'Step': '', 'Value': '0.9'},
+                   {'SN': '1', 'Attribute': 'WaferYield', 'Year': '1', 'Step': '', 'Value': '0.8'}]
+
+        with self.assertRaises(Exception):
+            read_long_format(records)
+
+    def test_validate_horizon(self):
+        read = readFile('data_option1.csv')
+        template = readFile('input_template.csv')
+
+        validate(read, template, 5)
+        with self.assertRaises(Exception) as context:
+            validate(read, template, 6)
+        self.assertIn('WaferYieldYr6', str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import filecmp
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import pandas as pd
+
+import runner
+from cost_analyzer import create_parser
+from runner import STATUS_DONE, STATUS_FAILED, parse_job, read_manifest, run_jobs
+
+
+class TestRunner(unittest.TestCase):
+    def test_run_jobs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            params = {'NumOfYears': 1, 'NumOfSteps': 1, 'NumOfSimulation': 20}
+            manifest = {'jobs': [
+                {'name': 'first', 'seed': 5, 'params': params, 'output': os.path.join(directory, 'first')},
+                {'name': 'second', 'seed': 5, 'params': params, 'output': os.path.join(directory, 'second')},
+                {'name': 'missing', 'option1': 'missing.csv', 'output': os.path.join(directory, 'missing')}
+            ]}
+            file = os.path.join(directory, 'manifest.json')
+            with open(file, 'w') as f:
+                json.dump(manifest, f)
+
+            runner.cache.clear()
+            # the tornado labels need a locale with a currency format
+            with mock.patch('locale.currency', lambda value, grouping=True: f'${value:,.2f}'):
+                statuses = run_jobs(read_manifest(file))
+
+            self.assertEqual([STATUS_DONE, STATUS_DONE, STATUS_FAILED], [status['status'] for status in statuses])
+            self.assertIn('missing.csv', statuses[2]['error'])
+            # the second job reuses the parsed inputs and the summaries of the first
+            self.assertEqual(1, sum(key[0] == 'summaries' for key in runner.cache))
+            self.assertTrue(filecmp.cmp(os.path.join(directory, 'first', 'stochastic_analysis.csv'),
+                                        os.path.join(directory, 'second', 'stochastic_analysis.csv'), shallow=False))
+
+    def test_unseeded_batched_parquet(self):
+        with tempfile.TemporaryDirectory() as directory:
+            params = {'NumOfYears': 1, 'NumOfSteps': 1, 'NumOfSimulation': 20}
+            jobs = [parse_job(create_parser(), {'params': params, 'output': directory,
+                                                'args': ['--batch-size', '10', '--results-format', 'parquet']}, 'unseeded')]
+
+            with mock.patch('locale.currency', lambda value, grouping=True: f'${value:,.2f}'):
+                statuses = run_jobs(jobs)
+
+            self.assertEqual(STATUS_DONE, statuses[0]['status'], statuses[0]['error'])
+            seed = pd.read_parquet(os.path.join(directory, 'runs.parquet'))['seed'][0]
+            self.assertTrue(0 <= seed < 2**63)
+
+    def test_correlations_change_the_run(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            shutil.copytree(os.path.join(cwd, 'inputs'), os.path.join(directory, 'inputs'))
+            os.chdir(directory)
+            try:
+                params = {'NumOfYears': 2, 'NumOfSteps': 1, 'NumOfSimulation': 20}
+                job = {'seed': 5, 'params': params, 'args': ['--results-format', 'jsonl']}
+                runner.cache.clear()
+                with mock.patch('locale.currency', lambda value, grouping=True: f'${value:,.2f}'):
+                    first = run_jobs([parse_job(create_parser(), dict(job, output='first'), 'first')])[0]
+                    with open('inputs/correlations.csv', 'w') as f:
+                        f.write('SN,ColumnA,ColumnB,Correlation\n*,ForecastDemandYr1,ForecastDemandYr2,0.8\n')
+                    second = run_jobs([parse_job(create_parser(), dict(job, output='second'), 'second')])[0]
+
+                self.assertEqual([STATUS_DONE, STATUS_DONE], [first['status'], second['status']], second['error'])
+                # the correlated run is simulated again rather than reusing the summaries of the first
+                self.assertEqual(2, sum(key[0] == 'summaries' for key in runner.cache))
+                runs = [pd.read_json(os.path.join(name, 'runs.jsonl'), lines=True) for name in ['first', 'second']]
+                self.assertEqual([True, False], [run['correlations_sha256'].isna()[0] for run in runs])
+                self.assertEqual(runs[0]['option1_sha256'][0], runs[1]['option1_sha256'][0])
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import tempfile
+import unittest
+import numpy as np
+
+from processor import SAMPLE_CATEGORIES, summarize_samples
+from samples import load_samples, sampled, save_samples
+
+
+class TestSamples(unittest.TestCase):
+    def test_save_and_load_samples(self):
+        rng = np.random.default_rng(3)
+        sampled_summary = summarize_samples({category: [rng.normal(100, 10, (4, 50)) for year in range(0, 2)] for category in SAMPLE_CATEGORIES},
+                                            [1000.0, 0.0], [500, 0], [np.float64(900.0), np.float64(950.0)])
+        scalar_summary = summarize_samples({category: [120.0, 110.0] for category in SAMPLE_CATEGORIES}, [0.0, 0.0], [0, 0], [900.0, 950.0])
+
+        with tempfile.TemporaryDirectory() as directory:
+            save_samples(sampled_summary, scalar_summary, 2, directory)
+            summaryA, summaryB, years = load_samples(directory)
+
+            self.assertEqual(2, years)
+            self.assertIsInstance(summaryA['total_unit_cost_arr'][0], np.memmap)
+            np.testing.assert_array_equal(sampled_summary['total_unit_cost_arr'][1], summaryA['total_unit_cost_arr'][1])
+            np.testing.assert_allclose(sampled_summary['total_costs'], summaryA['total_costs'])
+            self.assertEqual([500, 0], summaryA['nre'])
+            self.assertEqual([120.0, 110.0], list(summaryB['total_unit_costs']))
+            self.assertTrue(sampled(summaryA))
+            self.assertFalse(sampled(summaryB))
+
+
+if __name__ == '__main__':
+    unittest.main()
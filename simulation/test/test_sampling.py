@@ -0,0 +1,70 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import unittest
+import numpy as np
+
+from preprocessor import update_params
+from reader import compile_row
+from sampling import SamplingPlan, draw_ranged_inputs
+
+
+class TestSampling(unittest.TestCase):
+    read = [compile_row(row) for row in [
+        {'SN': '', 'DeviceType': '', 'AspYr1($)': '800-1000', 'AspYr2($)': '900', 'DefectDensityYr1(Defects/cm^2)': '',
+         'DefectDensityYr2(Defects/cm^2)': '', 'WaferYieldYr1': '', 'WaferYieldYr2': '', 'WaferPriceYr1($)': '',
+         'WaferPriceYr2($)': '', 'ForecastDemandYr1': '', 'ForecastDemandYr2': ''},
+        {'SN': '1', 'DeviceType': 'Active', 'DefectDensityYr1(Defects/cm^2)': '0.05-0.1', 'DefectDensityYr2(Defects/cm^2)': '0.05-0.1',
+         'WaferYieldYr1': '', 'WaferYieldYr2': '', 'WaferPriceYr1($)': '1000', 'WaferPriceYr2($)': '',
+         'ForecastDemandYr1': '90000-110000', 'ForecastDemandYr2': '140000-160000'}
+    ]]
+
+    def test_draw_ranged_inputs(self):
+        np.random.seed(1)
+        update_params({'steps': 2, 'simulations': 3})
+        read = [dict(row) for row in self.read]
+
+        draws = draw_ranged_inputs(read, 2)
+
+        self.assertEqual({(0, 'AspYr1($)'), (1, 'DefectDensityYr1(Defects/cm^2)'), (1, 'DefectDensityYr2(Defects/cm^2)'),
+                          (1, 'ForecastDemandYr1'), (1, 'ForecastDemandYr2')}, set(draws))
+        self.assertEqual(900.0, read[0]['AspYr2($)'])
+        self.assertEqual((2, 3), np.shape(read[1]['ForecastDemandYr2']))
+        self.assertIs(draws[(1, 'ForecastDemandYr2')], read[1]['ForecastDemandYr2'])
+
+    def test_correlated_draw(self):
+        np.random.seed(1)
+        correlations = [{'SN': '*', 'ColumnA': 'ForecastDemandYr1', 'ColumnB': 'ForecastDemandYr2', 'Correlation': '0.8'}]
+        plan = SamplingPlan(self.read, 2, correlations)
+
+        draws = plan.samples(plan.draw((10, 2000)))
+
+        demand = np.corrcoef(draws[(1, 'ForecastDemandYr1')].ravel(), draws[(1, 'ForecastDemandYr2')].ravel())[0, 1]
+        defect_density = np.corrcoef(draws[(1, 'DefectDensityYr1(Defects/cm^2)')].ravel(), draws[(1, 'DefectDensityYr2(Defects/cm^2)')].ravel())[0, 1]
+        self.assertAlmostEqual(0.8, demand, delta=0.02)
+        self.assertAlmostEqual(0.0, defect_density, delta=0.02)
+        self.assertAlmostEqual(150000, np.mean(draws[(1, 'ForecastDemandYr2')]), delta=300)
+        self.assertAlmostEqual(15000, np.std(draws[(1, 'ForecastDemandYr2')]), delta=300)
+
+    def test_invalid_correlations(self):
+        correlations = [{'SN': '1', 'ColumnA': 'ForecastDemandYr1', 'ColumnB': 'ForecastDemandYr2', 'Correlation': '1.5'}]
+
+        with self.assertRaises(Exception):
+            SamplingPlan(self.read, 2, correlations)
+
+
+if __name__ == '__main__':
+    unittest.main()
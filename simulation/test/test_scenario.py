@@ -0,0 +1,55 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import unittest
+
+from cost_analyzer import take_read
+from reader import compile_row
+from scenario import Scenario
+
+
+class TestScenario(unittest.TestCase):
+    def setUp(self):
+        self.scenario = Scenario([compile_row(row) for row in [
+            {'DeviceType': '', 'AspYr1($)': '800-1000', 'AspYr2($)': '900'},
+            {'DeviceType': 'Active', 'AspYr1($)': '', 'AspYr2($)': ''},
+        ]])
+
+    def test_run_rows_do_not_modify_base(self):
+        rows = self.scenario.rows()
+        rows[0]['AspYr1($)'] = 900.0
+        rows[1]['EffA'] = 10.0
+
+        self.assertEqual((800.0, 1000.0), self.scenario[0]['AspYr1($)'].bounds)
+        self.assertNotIn('EffA', self.scenario[1])
+        with self.assertRaises(TypeError):
+            self.scenario[0]['AspYr1($)'] = 0.0
+
+    def test_overlay_records_only_changes(self):
+        view = take_read(self.scenario, 'Asp{year}($)', 2, 'High')
+
+        self.assertEqual({(0, 'AspYr1($)'): 800.0}, view.changes)
+        self.assertEqual(800.0, view.rows()[0]['AspYr1($)'])
+        self.assertEqual(900.0, view.rows()[0]['AspYr2($)'])
+
+        chained = view.overlay({(0, 'AspYr2($)'): 950.0})
+        self.assertEqual(800.0, chained[0]['AspYr1($)'])
+        self.assertEqual(950.0, chained[0]['AspYr2($)'])
+        self.assertEqual(900.0, view[0]['AspYr2($)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
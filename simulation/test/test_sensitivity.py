@@ -0,0 +1,71 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import unittest
+import numpy as np
+
+from copy import deepcopy
+from processor import calculate_summary
+from reader import readFile
+from sensitivity import calculate_sobol_indices, estimate_tornado_input, find_ranged_cells
+
+
+class TestSensitivity(unittest.TestCase):
+    def test_find_ranged_cells(self):
+        read = readFile('data_option1.csv')
+
+        cells = find_ranged_cells(read, 1)
+
+        self.assertIn((0, 'Asp{year}($)', 'AspYr1($)'), cells)
+        self.assertIn((1, 'ForecastDemand{year}', 'ForecastDemandYr1'), cells)
+        self.assertNotIn((0, 'ForecastDemand{year}', 'ForecastDemandYr1'), cells)
+
+    def test_sobol_indices(self):
+        np.random.seed(7)
+        readA = readFile('data_option1.csv')
+        readB = readFile('data_option2.csv')
+
+        indices = calculate_sobol_indices(readA, readB, 2, 500)
+
+        self.assertEqual(2, len(indices))
+        for year_indices in indices:
+            # demand of either option drives the unit cost difference
+            self.assertEqual({'Option1 ForecastDemand', 'Option2 ForecastDemand'}, {index['name'] for index in year_indices[:2]})
+            self.assertTrue(all(index['total'] >= 0 for index in year_indices))
+            self.assertGreater(sum(index['total'] for index in year_indices), 0.8)
+
+    def test_estimate_tornado_input(self):
+        np.random.seed(7)
+        readA = readFile('data_option1.csv')
+        readB = readFile('data_option2.csv')
+        args = {'years': 2, 'steps': 10, 'simulations': 500}
+        summaryA = calculate_summary(deepcopy(readA), args)
+        summaryB = calculate_summary(deepcopy(readB), args)
+
+        tornado_input = estimate_tornado_input(readA, readB, summaryA, summaryB, 2, ['ForecastDemand{year}', 'WaferPrice{year}($)'])
+
+        self.assertEqual(2, len(tornado_input))
+        self.assertEqual(['Option1 ForecastDemand{year}', 'Option1 WaferPrice{year}($)', 'Option2 ForecastDemand{year}', 'Option2 WaferPrice{year}($)'],
+                         [value['name'] for value in tornado_input[0]])
+        demand = tornado_input[0][0]
+        # the high setting is the lower demand of the range, which makes option 1 more expensive
+        self.assertGreater(demand['high'], demand['low'])
+        wafer_price = tornado_input[0][1]
+        self.assertLess(abs(wafer_price['high'] - wafer_price['low']), abs(demand['high'] - demand['low']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import unittest
+from multiprocessing import shared_memory
+import numpy as np
+
+import shared
+from distributed import Coordinator, calculate_distributed_summaries, create_units, start_local_workers
+from engine import calculate_batched_summaries
+from reader import readFile
+from scenario import Scenario
+from shared import BUFFERS, SharedBatches, shared_rows
+
+
+class TestShared(unittest.TestCase):
+    def test_shared_memory_run(self):
+        readA = Scenario(readFile('data_option1.csv'))
+        readB = Scenario(readFile('data_option2.csv'))
+        reads = [readA.rows, readB.rows]
+        args = {'years': 2, 'steps': 3, 'simulations': 25}
+        expectedA, expectedB = calculate_batched_summaries(reads, args, 11, 10)
+
+        coordinator = Coordinator()
+        try:
+            start_local_workers(coordinator.address, coordinator.authkey, 2)
+            summaryA, summaryB = calculate_distributed_summaries(reads, args, 11, coordinator, 10, shared_memory=True)
+        finally:
+            coordinator.close()
+
+        for (expected, summary) in [(expectedA, summaryA), (expectedB, summaryB)]:
+            np.testing.assert_array_equal(expected['total_unit_costs'], summary['total_unit_costs'])
+            for year in range(0, 2):
+                np.testing.assert_array_equal(expected['total_unit_cost_arr'][year], summary['total_unit_cost_arr'][year])
+            self.assertEqual(list(expected['input_draws']), list(summary['input_draws']))
+            for (cell, draws) in expected['input_draws'].items():
+                np.testing.assert_array_equal(draws, summary['input_draws'][cell])
+
+    def test_units_carry_descriptors(self):
+        readA = Scenario(readFile('data_option1.csv'))
+        args = {'years': 2, 'steps': 3, 'simulations': 25}
+        batches = SharedBatches([readA.rows, readA.rows], args, 11, 10)
+        try:
+            units = create_units([readA.rows, readA.rows], args, 11, 10, batches)
+            self.assertNotIn('rows', units[2])
+            draws = batches.options[0]['draws'].array
+            (i, col) = batches.options[0]['cells'][0]
+            for n in range(0, 2):
+                # a reissued unit transforms the same pre-drawn block into the same samples
+                rows = shared_rows(units[2]['buffers'])
+                self.assertTrue(np.shares_memory(rows[i][col], shared.shared_view(units[2]['buffers']['draws'])))
+                np.testing.assert_array_equal(readA[i][col].from_standard_normal(batches.options[0]['normals'].array[0, :, 10:20]),
+                                              draws[0, :, 10:20])
+                del rows
+            self.assertFalse(np.any(draws[:, :, 0:10]))
+        finally:
+            for name in list(shared.attached):
+                shared.attached_scenarios.pop(name, None)
+                shared.attached.pop(name).close()
+            batches.release()
+
+    def test_release(self):
+        readA = Scenario(readFile('data_option1.csv'))
+        shared = SharedBatches([readA.rows, readA.rows], {'years': 1, 'steps': 2, 'simulations': 5}, 3, 2)
+        names = [buffers[key].memory.name for buffers in shared.options for key in BUFFERS]
+        shared.release()
+        for name in names:
+            with self.assertRaises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import unittest
+import numpy as np
+
+from reader import readFile
+from sampling import SamplingPlan
+from scenario import Scenario
+from tail_risk import estimate_tail_risk, evaluate_cost_diff, weighted_tail_quantile
+
+
+class TestTailRisk(unittest.TestCase):
+    readA = Scenario(readFile('data_option1.csv'))
+    readB = Scenario(readFile('data_option2.csv'))
+
+    def test_weighted_tail_quantile(self):
+        y = np.arange(1.0, 11.0)
+
+        self.assertEqual(9.0, weighted_tail_quantile(y, np.ones(10), 0.2))
+        self.assertEqual(10.0, weighted_tail_quantile(y, np.full(10, 2.0), 0.2))
+
+    def test_matches_plain_monte_carlo(self):
+        plans = [SamplingPlan(self.readA, 1), SamplingPlan(self.readB, 1)]
+        z = np.random.default_rng(1).standard_normal((len(plans[0]) + len(plans[1]), 40000))
+        cost_diff = evaluate_cost_diff(self.readA, self.readB, plans, z, 1)[0]
+
+        upper = estimate_tail_risk(self.readA, self.readB, 1, level=0.99, threshold=np.quantile(cost_diff, 0.99),
+                                   rng=np.random.default_rng(2))[0]
+        lower = estimate_tail_risk(self.readA, self.readB, 1, level=0.99, threshold=0.0, lower=True, rng=np.random.default_rng(3))[0]
+
+        self.assertAlmostEqual(np.quantile(cost_diff, 0.99), upper['quantile'], delta=0.05 * np.quantile(cost_diff, 0.99))
+        self.assertAlmostEqual(0.01, upper['probability'], delta=0.003)
+        self.assertAlmostEqual(np.quantile(cost_diff, 0.01), lower['quantile'], delta=0.05 * abs(np.quantile(cost_diff, 0.01)))
+        self.assertAlmostEqual(np.mean(cost_diff < 0), lower['probability'], delta=0.02)
+
+    def test_quantile_error_at_fixed_budget(self):
+        plans = [SamplingPlan(self.readA, 1), SamplingPlan(self.readB, 1)]
+        cells = len(plans[0]) + len(plans[1])
+        z = np.random.default_rng(1).standard_normal((cells, 200000))
+        reference = np.quantile(evaluate_cost_diff(self.readA, self.readB, plans, z, 1)[0], 0.999)
+
+        # relative errors of the P99.9 against plain Monte Carlo with as many model samples as the importance sampling took
+        errors = []
+        for seed in range(0, 5):
+            estimate = estimate_tail_risk(self.readA, self.readB, 1, level=0.999, samples=1000, rng=np.random.default_rng(seed))[0]
+            z = np.random.default_rng(100 + seed).standard_normal((cells, estimate['samples']))
+            plain = np.quantile(evaluate_cost_diff(self.readA, self.readB, plans, z, 1)[0], 0.999)
+            errors.append([estimate['quantile'] / reference - 1, plain / reference - 1])
+        (error, plain_error) = np.sqrt(np.mean(np.square(errors), axis=0))
+
+        self.assertLess(error, 0.03)
+        self.assertLess(error, 0.5 * plain_error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+
+from writer import create_row, tidy_distributions, tidy_summary, write_results
+
+
+class TestWriter(unittest.TestCase):
+    def test_tidy_summary(self):
+        summary = [create_row('Total($)', [10.0, 20.0], [30.0, 40.0], 2), create_row('Cost Difference(Option2 - Option1)', [1.5, 2.5], ['', ''], 2)]
+
+        records = tidy_summary(summary, 2, 'run')
+
+        self.assertEqual(6, len(records))
+        self.assertEqual({'run_id': 'run', 'category': 'Total($)', 'option': 'Option2', 'year': 2, 'value': 40.0}, records[3])
+        self.assertEqual(['Option1', 'Option1'], [record['option'] for record in records[4:]])
+
+    def test_tidy_distributions(self):
+        samples = np.arange(1, 101, dtype=float)
+
+        records = tidy_distributions({'CostDiff': [samples]}, 'run')
+
+        self.assertEqual(1, len(records))
+        self.assertEqual(100, records[0]['count'])
+        self.assertEqual(50.5, records[0]['p50'])
+        self.assertAlmostEqual(pd.Series(samples).describe(percentiles=[0.05])['5%'], records[0]['p5'])
+
+    def test_write_results_jsonl(self):
+        with tempfile.TemporaryDirectory() as directory:
+            write_results({'summary': [{'run_id': 'run', 'value': 1.0}]}, {'run_id': 'run', 'years': 5}, ['jsonl'], directory)
+
+            self.assertEqual(['runs.jsonl', 'summary.jsonl'], sorted(os.listdir(directory)))
+            self.assertEqual(5, pd.read_json(os.path.join(directory, 'runs.jsonl'), lines=True)['years'][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
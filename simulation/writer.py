@@ -15,6 +15,41 @@
  """
 
 import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Tidy result formats, one record per run, category, option and year, parquet only with pyarrow installed
+FORMAT_JSONL = 'jsonl'
+FORMAT_PARQUET = 'parquet'
+RESULT_FORMATS = [FORMAT_JSONL] + ([FORMAT_PARQUET] if pyarrow is not None else [])
+
+# Summary output column prefix of each option
+OPTION_COLUMNS = {'Option1': 'ChipletYr', 'Option2': '2SocChipsYr'}
+
+# Statistics of the per year distributions, as in stochastic_analysis.csv
+PERCENTILES = [5, 50, 95]
+
+# Directory of the output files, the batch runner sets one per job
+OUTPUT_DIRECTORY = 'outputs'
+output_directory = OUTPUT_DIRECTORY
+
+
+def set_output_directory(directory):
+    global output_directory
+    os.makedirs(directory, exist_ok=True)
+    output_directory = directory
+
+
+def output_path(file_name):
+    return os.path.join(output_directory, file_name)
+
 
 def create_row(category, option1, option2, numOfYr):
     row = {'CostCategory': category}
@@ -31,7 +66,7 @@ def create_row(category, option1, option2, numOfYr):
 
 
 def write_to_file(summary, years):
-    with open('outputs/summary_output.csv', 'w') as file:
+    with open(output_path('summary_output.csv'), 'w') as file:
 
         field_names = ['CostCategory']
         
@@ -46,3 +81,96 @@ def write_to_file(summary, years):
         writer = csv.DictWriter(file, field_names)
         writer.writeheader()
         writer.writerows(summary)
+
+
+def write_sobol_indices(indices):
+    with open(output_path('sobol_indices.csv'), 'w') as file:
+        writer = csv.DictWriter(file, ['Year', 'Rank', 'Input', 'FirstOrder', 'Total'])
+        writer.writeheader()
+        for year in range(1, len(indices) + 1):
+            for (rank, index) in enumerate(indices[year - 1]):
+                writer.writerow({'Year': year, 'Rank': rank + 1, 'Input': index['name'],
+                                 'FirstOrder': round(index['first_order'], 4), 'Total': round(index['total'], 4)})
+
+
+def write_tail_risk(estimates):
+    with open(output_path('tail_risk.csv'), 'w') as file:
+        writer = csv.DictWriter(file, ['Name', 'Level', 'Quantile', 'Threshold', 'Probability', 'ESS', 'ProbabilityESS', 'Samples'])
+        writer.writeheader()
+        for estimate in estimates:
+            writer.writerow({'Name': estimate['name'], 'Level': estimate['level'], 'Quantile': round(estimate['quantile'], 2),
+                             'Threshold': estimate['threshold'],
+                             'Probability': round(estimate['probability'], 6) if estimate['probability'] is not None else None,
+                             'ESS': round(estimate['ess'], 1),
+                             'ProbabilityESS': round(estimate['probability_ess'], 1) if estimate['probability_ess'] is not None else None,
+                             'Samples': estimate['samples']})
+
+def write_break_even(results):
+    with open(output_path('break_even.csv'), 'w') as file:
+        writer = csv.DictWriter(file, ['Name', 'Option', 'SN', 'Found', 'Mean'] + [f'P{p}' for p in PERCENTILES] + ['MedianScale'])
+        writer.writeheader()
+        for result in results:
+            found = result['found'] > 0
+            row = {'Name': result['name'], 'Option': result['option'], 'SN': result['sn'], 'Found': round(result['found'], 4),
+                   'Mean': round(np.nanmean(result['values']), 2) if found else None,
+                   'MedianScale': round(np.nanmedian(result['scales']), 4) if found else None}
+            for p in PERCENTILES:
+                row[f'P{p}'] = round(np.nanpercentile(result['values'], p), 2) if found else None
+            writer.writerow(row)
+
+
+def tidy_summary(summary, years, run_id):
+    records = []
+    for row in summary:
+        for (option, prefix) in OPTION_COLUMNS.items():
+            for year in range(1, years + 1):
+                value = row[f'{prefix}{year}']
+                if value == '':
+                    continue
+                records.append({'run_id': run_id, 'category': row['CostCategory'], 'option': option, 'year': year, 'value': float(value)})
+    return records
+
+
+def tidy_distributions(distributions, run_id):
+    """Statistics of the per year samples, `distributions` is {name: [samples per year]}."""
+    records = []
+    for (name, samples) in distributions.items():
+        for (year, values) in enumerate(samples, 1):
+            values = np.ravel(values)
+            statistics = {'count': values.size, 'mean': np.mean(values), 'std': np.std(values, ddof=1) if values.size > 1 else np.nan,
+                          'min': np.min(values), 'max': np.max(values)}
+            for (percentile, value) in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                statistics[f'p{percentile}'] = value
+            records.append({'run_id': run_id, 'distribution': name, 'year': year, **{key: float(value) for (key, value) in statistics.items()}})
+    return records
+
+
+def tidy_tornado(tornado_input, run_id):
+    return [{'run_id': run_id, 'year': year, 'input': value['name'], 'high': float(value['high']), 'low': float(value['low'])}
+            for (year, values) in enumerate(tornado_input, 1) for value in values]
+
+
+def tidy_sobol_indices(indices, run_id):
+    return [{'run_id': run_id, 'year': year, 'rank': rank, 'input': index['name'],
+             'first_order': float(index['first_order']), 'total': float(index['total'])}
+            for (year, year_indices) in enumerate(indices, 1) for (rank, index) in enumerate(year_indices, 1)]
+
+
+def write_results(tables, run, formats, directory=None):
+    """Write each table {name: records} and the run metadata in every format.
+
+    Every record carries the run_id, the run metadata itself is written to
+    the `runs` table, so results of many runs can be concatenated and joined.
+    """
+    tables = dict(tables, runs=[run])
+    directory = directory or output_directory
+    for (name, records) in tables.items():
+        df = pd.DataFrame.from_records(records)
+        for results_format in formats:
+            file = os.path.join(directory, f'{name}.{results_format}')
+            if results_format == FORMAT_JSONL:
+                df.to_json(file, orient='records', lines=True)
+            elif results_format == FORMAT_PARQUET and results_format in RESULT_FORMATS:
+                df.to_parquet(file, index=False)
+            else:
+                raise Exception(f'Results format should be one of {", ".join(RESULT_FORMATS)} (parquet requires pip3 install pyarrow)')
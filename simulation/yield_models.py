@@ -0,0 +1,100 @@
+"""
+ Copyright 2022 Google LLC
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+      https://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.
+ """
+
+import math
+
+import numpy as np
+
+# Yield model names
+POISSON_MODEL = 'Poisson'
+MURPHY_MODEL = 'Murphy'
+SEEDS_MODEL = 'Seeds'
+BOSE_EINSTEIN_MODEL = 'Bose Einstein'
+NEGATIVE_BINOMIAL_MODEL = 'Negative Binomial'
+
+# Default defect clustering parameter (alpha) for the negative binomial model
+DEFAULT_CLUSTER_PARAMETER = 2.0
+
+# Defect density is in Defects/cm^2 and die area in mm^2
+AREA_TO_CM2 = 0.01
+
+# All kernels take the expected number of defects per die
+# x = D0 * A as a numpy array (or scalar) of any shape, together with the
+# number of critical layers `n` and the clustering parameter `alpha`
+# broadcastable to the same shape, and return the die yield element-wise.
+
+def poisson_yield(x, n, alpha):
+    return np.exp(-x)
+
+
+def murphy_yield(x, n, alpha):
+    # ((1 - e^-x) / x)^2, which tends to 1 as x tends to 0
+    x = np.asarray(x, dtype=float)
+    safe_x = np.where(x > 0, x, 1.0)
+    return np.where(x > 0, (-np.expm1(-safe_x) / safe_x) ** 2, 1.0)
+
+
+def seeds_yield(x, n, alpha):
+    return np.exp(-np.sqrt(x))
+
+
+def bose_einstein_yield(x, n, alpha):
+    return (1.0 / (1 + x)) ** n
+
+
+def negative_binomial_yield(x, n, alpha):
+    return (1 + x / alpha) ** -alpha
+
+
+YIELD_MODELS = {
+    POISSON_MODEL: poisson_yield,
+    MURPHY_MODEL: murphy_yield,
+    SEEDS_MODEL: seeds_yield,
+    BOSE_EINSTEIN_MODEL: bose_einstein_yield,
+    NEGATIVE_BINOMIAL_MODEL: negative_binomial_yield,
+}
+
+
+def register_yield_model(name, kernel):
+    """Plug in an additional yield model, `kernel(x, n, alpha)`."""
+    YIELD_MODELS[name] = kernel
+
+
+def get_yield_kernel(model):
+    if model not in YIELD_MODELS:
+        raise Exception(f'Yield model should be one of {", ".join(YIELD_MODELS)}')
+
+    return YIELD_MODELS[model]
+
+
+def calculate_model_yield(model, defect_density, eff_area, n=1, alpha=DEFAULT_CLUSTER_PARAMETER):
+    """Evaluate `model` for every element of the broadcast inputs at once.
+
+    `defect_density` may hold all dies, years and samples stacked together
+    (for example shape (dies, steps, simulations)) with `eff_area` and `n`
+    shaped to broadcast against it (for example (dies, 1, 1)).
+    """
+    x = np.multiply(defect_density, eff_area) * AREA_TO_CM2
+    return get_yield_kernel(model)(x, n, alpha)
+
+
+def calculate_redundancy_yield(defect_density, baseline, spares, area):
+    # probability that exactly `spares` of `baseline + spares` redundant
+    # blocks are defective: C(n, k) * p^k * (1 - p)^(n - k)
+    k = spares
+    n = baseline + spares
+    p = area / 100 * np.asarray(defect_density)
+    return math.comb(n, k) * p**k * (1 - p)**(n - k)